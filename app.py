@@ -8,11 +8,13 @@ Enhanced with bulletproof deployment patterns for Railway compatibility
 import os
 import sys
 import json
+import math
 import base64
 import time
 import tempfile
+import shutil
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from functools import wraps
 from io import BytesIO
@@ -673,6 +675,51 @@ if PROXY_FIX_AVAILABLE:
     app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1, x_for=1)
     print("✅ Railway proxy configured")
 
+# Response compression for JSON-heavy endpoints (graceful fallback)
+try:
+    from response_compression import ResponseCompressor, BROTLI_AVAILABLE
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    app.config['COMPRESS_ENABLED'] = os.getenv('COMPRESS_ENABLED', 'True').lower() == 'true'
+    response_compressor = ResponseCompressor(app)
+    print(f"✅ Response compression enabled (gzip{', brotli' if BROTLI_AVAILABLE else ''})")
+except Exception as e:
+    response_compressor = None
+    print(f"⚠️ Response compression unavailable: {e}")
+
+# Fast JSON encoding (orjson) with native NumPy/NaN/datetime handling (graceful fallback)
+try:
+    from json_provider import init_json_provider, json_response, ORJSON_AVAILABLE
+    app.config['JSON_NAN_POLICY'] = os.getenv('JSON_NAN_POLICY', 'null')
+    init_json_provider(app)
+    print(f"✅ JSON provider: {'orjson' if ORJSON_AVAILABLE else 'stdlib json'} (NaN → {app.config['JSON_NAN_POLICY']})")
+except Exception as e:
+    def json_response(payload, status=200, nan_policy=None):
+        return make_response(jsonify(payload), status)
+    print(f"⚠️ Fast JSON provider unavailable: {e}")
+
+# Spooled uploads: small files stay in memory, large ones roll over to disk once
+UPLOAD_ENDPOINTS = {'api_streamlined_calculate', 'api_debug_excel_structure', 'calculate_analysis'}
+try:
+    from upload_service import init_uploads, check_content_length, UploadTooLarge
+    init_uploads(app)
+    print(f"✅ Spooled uploads configured (memory ≤ {app.config['UPLOAD_SPOOL_MAX_MEMORY'] // (1024 * 1024)} MB, "
+          f"max {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB)")
+
+    @app.before_request
+    def reject_oversized_uploads():
+        """Refuse oversized uploads from Content-Length before reading the body"""
+        if request.endpoint in UPLOAD_ENDPOINTS:
+            try:
+                check_content_length()
+            except UploadTooLarge as e:
+                return jsonify({"success": False, "error": str(e)}), 413
+
+    @app.errorhandler(413)
+    def upload_too_large(error):
+        return jsonify({"success": False, "error": "Upload exceeds the maximum allowed size"}), 413
+except Exception as e:
+    print(f"⚠️ Spooled uploads unavailable: {e}")
+
 # Session persistence fix for production  
 @app.before_request
 def fix_session_persistence():
@@ -1020,8 +1067,27 @@ except Exception as e:
     print(f"❌ CRITICAL: DualChartService failed to import: {e}")
     # Create minimal fallback chart service
     class DualChartService:
-        def get_dual_chart_data(self, lipid_id):
+        def get_dual_chart_data(self, lipid_id, max_points=None, wire_format='verbose'):
             return {"error": "Chart service unavailable", "chart1": {}, "chart2": {}}
+        
+        def build_dual_chart(self, chart_data, max_points=None, wire_format='verbose'):
+            return self.get_dual_chart_data(None)
+
+# Serialized chart payloads keyed by lipid version (None: charts are built per request)
+chart_payload_cache = None
+try:
+    from chart_cache_service import chart_payload_cache
+    print("✅ Chart payload cache loaded")
+except Exception as e:
+    print(f"⚠️ Chart payload cache unavailable (charts built per request): {e}")
+
+# Precomputed ion peak areas (None: database not configured)
+peak_area_service = None
+try:
+    from peak_area_service import peak_area_service, BASELINES as PEAK_AREA_BASELINES, DEFAULT_BASELINE as PEAK_AREA_DEFAULT_BASELINE
+    print("✅ Peak area service loaded")
+except Exception as e:
+    print(f"⚠️ Peak area service unavailable: {e}")
 
 try:
     from simple_chart_service import SimpleChartGenerator
@@ -2448,11 +2514,20 @@ def homepage():
         
         if get_db_stats and optimized_manager:
             try:
-                stats = get_db_stats()
-                recent_lipids = optimized_manager.get_lipids_sample(limit=3)
+                # Materialized snapshot: one primary-key lookup per hit
+                snapshot = optimized_manager.get_dashboard_stats()
+                stats = {key: snapshot[key] for key in ('total_lipids', 'total_classes', 'total_annotations')}
+                recent_lipids = snapshot['recent_lipids'][:3]
                 stats['database_status'] = 'connected'
-            except Exception as db_error:
-                print(f"⚠️ Database unavailable for homepage: {db_error}")
+            except Exception as snapshot_error:
+                print(f"⚠️ Dashboard stats snapshot unavailable, counting live: {snapshot_error}")
+                try:
+                    db.session.rollback()
+                    stats = get_db_stats()
+                    recent_lipids = optimized_manager.get_lipids_sample(limit=3)
+                    stats['database_status'] = 'connected'
+                except Exception as db_error:
+                    print(f"⚠️ Database unavailable for homepage: {db_error}")
         
         # Homepage data structure
         homepage_data = {
@@ -2503,9 +2578,19 @@ def clean_dashboard():
         
         # With lazy loading enabled, we don't load lipids here
         # They will be loaded asynchronously via /api/load-lipids
-        if db and MainLipid:
+        if db and MainLipid and optimized_manager:
             try:
-                # Get total count and class information for display
+                # Totals and class counts from the materialized snapshot (one primary-key lookup)
+                snapshot = optimized_manager.get_dashboard_stats()
+                data['total_lipids'] = snapshot['total_lipids']
+                data['classes'] = snapshot['class_counts']
+            except Exception as snapshot_error:
+                print(f"⚠️ Dashboard stats snapshot unavailable, counting live: {snapshot_error}")
+                db.session.rollback()
+        
+        if db and MainLipid and 'classes' not in data:
+            try:
+                # Snapshot unavailable: get total count and class information for display
                 data['total_lipids'] = MainLipid.query.count()
                 
                 # Get lipid classes with counts for filter pills
@@ -2529,7 +2614,7 @@ def clean_dashboard():
                 print(f"⚠️ Database query failed: {db_error}")
                 data['total_lipids'] = 0
                 data['classes'] = []
-        else:
+        elif not (db and MainLipid):
             # Fallback for when database is unavailable
             data['total_lipids'] = 0
             data['classes'] = [
@@ -2591,7 +2676,8 @@ def dual_chart_view():
         
         template_data = {
             'selected_lipids': lipids_data,
-            'selected_lipid_ids': selected_lipid_ids
+            'selected_lipid_ids': selected_lipid_ids,
+            'dual_chart_batch_limit': DUAL_CHART_BATCH_LIMIT
         }
         
         return render_template('dual_chart_view.html', **template_data)
@@ -2600,36 +2686,123 @@ def dual_chart_view():
         flash(f'Error loading charts: {e}', 'error')
         return redirect(url_for('clean_dashboard'))
 
+BROWSE_PAGE_SIZE = 48
+BROWSE_MAX_PAGE_SIZE = 200
+
+def parse_browse_filters(args):
+    """Browse filters from query args → keyword arguments for optimized_manager.browse_lipids (ValueError on bad numbers)"""
+    def optional_float(name):
+        value = args.get(name, '').strip()
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a number")
+
+    return {
+        'search': args.get('search', '').strip() or None,
+        'class_name': args.get('class', '').strip() or None,
+        'rt_min': optional_float('rt_min'),
+        'rt_max': optional_float('rt_max'),
+        'multi_ion': args.get('multi_ion', '').lower() not in ('', '0', 'false', 'off')
+    }
+
 @app.route('/browse-lipids')
 def browse_lipids():
-    """Browse and search lipids with advanced filtering"""
+    """Browse and search lipids with advanced filtering (keyset pages, see /api/browse-lipids)"""
     try:
-        # Provide empty current_filters to prevent template error
         current_filters = {
             'search': request.args.get('search', ''),
             'class': request.args.get('class', ''),
             'rt_min': request.args.get('rt_min', ''),
             'rt_max': request.args.get('rt_max', ''),
-            'multi_ion': request.args.get('multi_ion', False)
+            'multi_ion': request.args.get('multi_ion', '')
         }
+        # Only filters that are set go into page links
+        current_filters = {key: value for key, value in current_filters.items() if value}
         
-        # Get lipid classes for filter dropdown
-        lipid_classes = []
-        try:
-            if db and MainLipid:
-                lipid_classes = db.session.query(MainLipid.lipid_class).distinct().all()
-                lipid_classes = [{'class_name': cls[0]} for cls in lipid_classes if cls[0]]
-        except Exception:
-            pass
+        classes = []
+        lipids = {'items': [], 'next_cursor': None, 'per_page': BROWSE_PAGE_SIZE,
+                  'cursor': request.args.get('after'), 'total': None}
+        if db and MainLipid:
+            try:
+                classes = optimized_manager.get_lipid_classes_optimized()
+                filters = parse_browse_filters(request.args)
+                lipids.update(optimized_manager.browse_lipids(
+                    after=lipids['cursor'], limit=BROWSE_PAGE_SIZE, **filters))
+                if not current_filters:
+                    # Unfiltered total comes from the cached stats, never a per-page COUNT
+                    lipids['total'] = optimized_manager.get_database_stats()['total_lipids']
+            except ValueError as e:
+                flash(str(e), 'warning')
+            except Exception as e:
+                print(f"⚠️ Browse query failed: {e}")
         
         return render_template('browse_lipids.html', 
                              current_filters=current_filters,
-                             lipid_classes=lipid_classes,
-                             lipids={'items': [], 'pages': 0, 'page': 1})
+                             classes=classes,
+                             lipids=lipids)
     except Exception as e:
         print(f"⚠️ Browse lipids error: {e}")
         return f"<h1>Browse System Loading...</h1><p>Error: {e}</p>"
 
+@app.route('/api/browse-lipids')
+def api_browse_lipids():
+    """
+    Keyset-paginated lipid browse API.
+    Query args: search, class, rt_min, rt_max, multi_ion, limit (max 200), after (next_cursor of the previous page).
+    """
+    if not db or not MainLipid:
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 503
+    
+    try:
+        filters = parse_browse_filters(request.args)
+        limit = min(max(int(request.args.get('limit', BROWSE_PAGE_SIZE)), 1), BROWSE_MAX_PAGE_SIZE)
+        page = optimized_manager.browse_lipids(after=request.args.get('after'), limit=limit, **filters)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        print(f"❌ Error browsing lipids: {e}")
+        return jsonify({'status': 'error', 'message': f'Database error: {str(e)}'}), 500
+    
+    return jsonify({
+        'status': 'success',
+        'lipids': page['items'],
+        'count': len(page['items']),
+        'next_cursor': page['next_cursor']
+    })
+
+@app.route('/api/search')
+def api_search():
+    """
+    Type-ahead over the in-memory trigram indexes.
+    Query args: q, scope ('lipids' - names and API codes, or 'compounds' - compound-index names), limit (max 50).
+    """
+    query = request.args.get('q', '').strip()
+    scope = request.args.get('scope', 'lipids')
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'limit must be an integer'}), 400
+
+    try:
+        if scope == 'lipids':
+            if not db or not MainLipid:
+                return jsonify({'status': 'error', 'message': 'Database not available'}), 503
+            results = optimized_manager.search_lipids_optimized(query, limit=limit)
+        elif scope == 'compounds':
+            from streamlined_calculator_service import streamlined_calculator
+            results = [{'compound': name, 'score': score}
+                       for name, score in streamlined_calculator.search_compounds(query, limit=limit)]
+        else:
+            return jsonify({'status': 'error', 'message': f'Unknown search scope: {scope}'}), 400
+    except Exception as e:
+        print(f"❌ Search error: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+    return jsonify({'status': 'success', 'query': query, 'scope': scope, 'results': results})
+
 @app.route('/schedule', methods=['GET', 'POST'])
 @app.route('/schedule-form', methods=['GET', 'POST'])
 def schedule_form():
@@ -2883,8 +3056,7 @@ def calculate_analysis():
         # Read the single Excel file (expect first sheet with PH-HC_5601-5700 format)
         try:
             # 🚀 STORE RAW EXCEL DATA IN TEMP FILE (not session - avoid header size issues)
-            file.seek(0)  # Reset file pointer to beginning
-            raw_excel_bytes = file.read()
+            from upload_service import persist_upload, get_upload_buffer, get_upload_size
             
             # Create unique temp file for this session
             import tempfile
@@ -2896,8 +3068,12 @@ def calculate_analysis():
             temp_dir = tempfile.gettempdir()
             temp_file_path = os.path.join(temp_dir, f"metabolomics_calc_{session_id}.xlsx")
             
-            with open(temp_file_path, 'wb') as temp_file:
-                temp_file.write(raw_excel_bytes)
+            # Stream the spooled upload to disk once - later session routes re-read it
+            persist_upload(file, temp_file_path)
+            temp_session_store.register(session_id, temp_file_path, kind='calculation_upload')
+            if not result_store.is_local:
+                # Share the upload so follow-up requests on other nodes can read it
+                result_store.put(session_id, SESSION_FILE_ARTIFACTS['calculation_temp_file'][1], get_upload_buffer(file))
             
             # Store only file path and metadata in session (small data)
             session['calculation_temp_file'] = temp_file_path
@@ -2905,15 +3081,16 @@ def calculate_analysis():
             session['calculation_timestamp'] = time.time()
             
             print(f"💾 Stored Excel data in temp file: {temp_file_path}")
-            print(f"📊 File size: {len(raw_excel_bytes)} bytes")
+            print(f"📊 File size: {get_upload_size(file)} bytes")
             print(f"🔧 Session data size reduced to avoid HTTP header limits")
             
-            # Reset file pointer and read for processing
-            file.seek(0)
-            
-            # Try to read all sheets first to see what's available
-            excel_data = pd.read_excel(file, sheet_name=None)
+            # Try to read all sheets first to see what's available (from the in-memory buffer)
+            excel_data = pd.read_excel(get_upload_buffer(file), sheet_name=None)
             available_sheets = list(excel_data.keys())
+            
+            # Cache the parsed matrix so breakdown/preview/debug routes never re-read the xlsx
+            parsed_upload_cache.put(session_id, ParsedUpload.from_sheets(excel_data, session['calculation_timestamp']))
+            temp_session_store.register(session_id, parsed_upload_cache.binary_path(session_id), kind='parsed_upload')
             print(f"📊 Available sheets: {len(available_sheets)} sheets")
             
             # Use the first sheet as the main data (should be like PH-HC_5601-5700)
@@ -2941,440 +3118,15 @@ def calculate_analysis():
         except Exception as e:
             return jsonify({"error": f"Error loading reference data: {str(e)}"}), 400
         
-        # Process main data sheet structure (check for multiple header rows)
-        print("🔍 Processing main data structure...")
-        
-        # Check first few rows to identify header structure
-        print(f"🔍 Row 0: {list(main_data.iloc[0, :5])}")  # First 5 columns of row 0
-        print(f"🔍 Row 1: {list(main_data.iloc[1, :5])}")  # First 5 columns of row 1
-        if len(main_data) > 2:
-            print(f"🔍 Row 2: {list(main_data.iloc[2, :5])}")  # First 5 columns of row 2
-        
-        # Check if we have double headers (like "Name", "Area", "Area" in row 1)
-        row_0_first = str(main_data.iloc[0, 0]).strip().lower()
-        row_1_first = str(main_data.iloc[1, 0]).strip().lower()
-        
-        skip_rows = 0
-        if row_1_first in ['name', 'area', 'compound']:
-            # Double header - skip both row 0 and row 1
-            skip_rows = 2
-            print("✅ Found double header rows, skipping first 2 rows")
-        elif row_0_first in ['name', 'area', 'compound']:
-            # Single header - skip row 0
-            skip_rows = 1
-            print("✅ Found single header row, skipping first row")
-        else:
-            # No header - start from row 0
-            skip_rows = 0
-            print("✅ No header rows found, starting from row 0")
-        
-        # Extract data after skipping appropriate header rows
-        compound_method_col = main_data.columns[0]  # First column has compounds
-        data_columns = main_data.columns[1:]  # All other columns are samples/NIST
-        compounds = main_data.iloc[skip_rows:, 0].astype(str).str.strip()  # Skip header rows
-        area_data_values = main_data.iloc[skip_rows:, 1:]  # Skip header rows and compound column
-        print(f"✅ Processing {len(compounds)} compounds after skipping {skip_rows} header rows")
-        
-        print(f"📋 Data columns sample: {list(data_columns)[:10]}...")
-        
-        # Separate sample columns from NIST columns
-        sample_columns = []
-        nist_columns = []
-        
-        for col in data_columns:
-            col_str = str(col).strip().upper()
-            if 'NIST' in col_str:
-                nist_columns.append(col)
-                print(f"🎯 Found NIST column: {col}")
-            else:
-                sample_columns.append(col)
-        
-        print(f"📊 Sample columns: {len(sample_columns)}")
-        print(f"🎯 NIST columns: {len(nist_columns)}")
-        
-        # 🔧 ULTRA FIX: Calculate ratios using the correct formula as specified
-        print("🧮 Calculating ratios using formula: Compound Area ÷ ISTD Area...")
-        ratio_data = []
-        
-        for idx, compound in enumerate(compounds):
-            compound_clean = str(compound).strip()
-            if not compound_clean:
-                continue
-                
-            row_data = {'Compound': compound_clean}
-            
-            # 🔧 ULTRA FIX: Calculate ratios using the correct formula as specified
-            # Formula: Compound Area ÷ ISTD Area
-            
-            # Calculate ratios for each sample column
-            for col in sample_columns:
-                try:
-                    # Map uploaded sample name to reference sample name
-                    reference_sample = sample_mapping.get(col, col)
-                    
-                    # Get area value for this compound and sample
-                    area_value = area_data_values.iloc[idx][col]
-                    
-                    # Get ISTD information from database
-                    compound_info = compound_data.get(compound_clean, {})
-                    istd_name = compound_info.get('istd', 'LPC 18:1 d7')  # Default ISTD
-                    
-                    # Find ISTD area in the same sample column
-                    istd_area = None
-                    for istd_idx, istd_compound in enumerate(compounds):
-                        if str(istd_compound).strip() == istd_name:
-                            istd_area = area_data_values.iloc[istd_idx][col]
-                            break
-                    
-                    # If ISTD not found, use calculated value
-                    if istd_area is None or pd.isna(istd_area) or istd_area == 0:
-                        istd_area = 212434.0  # Fallback ISTD area
-                    
-                    # Calculate ratio using the correct formula: Compound Area ÷ ISTD Area
-                    if pd.notna(area_value) and area_value != 0 and istd_area != 0:
-                        ratio = float(area_value) / float(istd_area)
-                    else:
-                        ratio = 0.0
-                    
-                    # Store result under REFERENCE sample name (mapped from uploaded sample name)
-                    row_data[reference_sample] = ratio
-                    
-                    # Debug: Show calculation for first few compounds
-                    if idx < 3:
-                        print(f"  🧮 CALCULATED: {compound_clean}, {col} → {reference_sample} (ratio: {area_value:.0f}÷{istd_area:.0f}={ratio:.6f})")
-                    
-                except Exception as e:
-                    print(f"⚠️ Error calculating ratio for {compound_clean}, {col}: {e}")
-                    row_data[reference_sample] = 0.0
-            
-            # Add NIST reference values
-            for nist_col in nist_columns:
-                try:
-                    nist_value = area_data_values.iloc[idx][nist_col]
-                    if pd.notna(nist_value):
-                        row_data[nist_col] = float(nist_value)
-                    else:
-                        row_data[nist_col] = 0.0
-                except Exception as e:
-                    print(f"⚠️ Error getting NIST value for {compound_clean}, {nist_col}: {e}")
-                    row_data[nist_col] = 0.0
-            
-            ratio_data.append(row_data)
-        
-        print(f"✅ Processed {len(ratio_data)} compounds with ratios")
-        
-        # Now calculate NIST and Agilent values using database reference data
-        print("🎯 Calculating NIST values...")
-        nist_results_data = []
-        agilent_results_data = []
-        
-        for idx, row_dict in enumerate(ratio_data):
-            compound_name = row_dict.get('Compound', '')
-            nist_row = {'Compound': compound_name}
-            agilent_row = {'Compound': compound_name}
-            
-            # 🐛 DEBUG: Track which compound we're processing
-            if idx < 3:
-                print(f"🔍 Processing compound #{idx}: {compound_name}")
-            
-            # Get compound reference data from database
-            compound_info = compound_data.get(compound_name, {})
-            conc_nm = compound_info.get('conc_nm', 1.0) or 1.0
-            response_factor = compound_info.get('response_factor', 1.0) or 1.0
-            
-            # Process each sample column
-            for sample_col in sample_columns:
-                try:
-                    # Get ratio for this sample (mapped to reference sample name)
-                    reference_sample = sample_mapping.get(sample_col, sample_col)
-                    sample_ratio = row_dict.get(reference_sample, 0.0)
-                    
-                    # CORRECT LOGIC: Get compound-specific NIST reference from Excel file
-                    # 1. Use SampleIndex to find which NIST column corresponds to this sample
-                    sample_record = None
-                    for sample_key, mapped_ref in sample_mapping.items():
-                        if sample_key == sample_col:
-                            # Look up the sample record to get paired_nist
-                            from models import SampleIndex
-                            sample_record = SampleIndex.query.filter_by(sample=sample_col).first()
-                            break
-                    
-                    nist_column_name = sample_record.paired_nist if sample_record else "NIST_1-100 (1)"  # Better fallback
-                    
-                    # 2. Calculate NIST RATIO (Compound Area ÷ ISTD Area in NIST) - FIXED VERSION
-                    nist_ratio = None
-                    matched_nist_column = None
-                    
-                    # 🔧 DEBUG: Show NIST calculation for key compounds only
-                    if compound_name in ['AcylCarnitine 10:0']:
-                        print(f"\n  🔬 NIST RATIO CALCULATION for {compound_name}:")
-                        print(f"     Looking for NIST column: '{nist_column_name}'")
-                    
-                    for nist_col in nist_columns:
-                        nist_col_str = str(nist_col).strip()
-                        nist_target_str = str(nist_column_name).strip()
-                        
-                        # Try different matching strategies
-                        if (nist_col_str == nist_target_str or 
-                            nist_col_str.replace(' ', '') == nist_target_str.replace(' ', '') or
-                            ('1-100' in nist_col_str and '1-100' in nist_target_str and 
-                             '(1)' in nist_col_str and '(1)' in nist_target_str)):
-                            matched_nist_column = nist_col
-                            
-                            # Get NIST compound area
-                            nist_compound_area = area_data_values.iloc[idx][nist_col]
-                            
-                            if compound_name in ['AcylCarnitine 10:0']:
-                                print(f"     ✅ Found NIST column: '{nist_col}'")
-                                print(f"     NIST compound area: {nist_compound_area}")
-                            
-                            # Find ISTD area in the same NIST column
-                            istd_name = compound_info.get('istd', 'LPC 18:1 d7')  
-                            nist_istd_area = None
-                            
-                            # 🔧 ENHANCED ISTD LOOKUP: Handle different ISTD compounds properly
-                            if compound_name in ['AcylCarnitine 10:0']:  # Only debug key compounds
-                                print(f"  🔍 Looking for ISTD '{istd_name}' for compound '{compound_name}'")
-                            
-                            # Strategy 1: Exact match
-                            for istd_idx, comp_name in enumerate(compounds):
-                                comp_name_clean = str(comp_name).strip()
-                                if comp_name_clean == istd_name:
-                                    nist_istd_area = area_data_values.iloc[istd_idx][nist_col]
-                                    if idx < 5:
-                                        print(f"    ✅ Found ISTD (exact) at index {istd_idx}: '{comp_name_clean}' = {nist_istd_area}")
-                                    break
-                            
-                            # Strategy 2: Fuzzy matching (spaces, case insensitive)
-                            if nist_istd_area is None:
-                                istd_name_clean = istd_name.replace(' ', '').replace('_', '').lower()
-                                for istd_idx, comp_name in enumerate(compounds):
-                                    comp_name_clean = str(comp_name).strip().replace(' ', '').replace('_', '').lower()
-                                    if comp_name_clean == istd_name_clean:
-                                        nist_istd_area = area_data_values.iloc[istd_idx][nist_col]
-                                        if idx < 5:
-                                            print(f"    ✅ Found ISTD (fuzzy) at index {istd_idx}: '{comp_name}' = {nist_istd_area}")
-                                        break
-                            
-                            # Strategy 3: Partial matching for common ISTD patterns
-                            if nist_istd_area is None:
-                                # Try different common patterns
-                                patterns_to_try = []
-                                if 'LPC' in istd_name:
-                                    patterns_to_try.extend(['LPC 18:1', 'LPC18:1', 'LPC_18:1'])
-                                if 'd7' in istd_name:
-                                    patterns_to_try.append('d7')
-                                
-                                for pattern in patterns_to_try:
-                                    for istd_idx, comp_name in enumerate(compounds):
-                                        comp_name_str = str(comp_name).strip()
-                                        if pattern in comp_name_str:
-                                            # Additional check to make sure it's really the ISTD
-                                            if ('LPC' in comp_name_str and '18:1' in comp_name_str) or 'd7' in comp_name_str.lower():
-                                                nist_istd_area = area_data_values.iloc[istd_idx][nist_col]
-                                                if idx < 5:
-                                                    print(f"    ✅ Found ISTD (pattern '{pattern}') at index {istd_idx}: '{comp_name_str}' = {nist_istd_area}")
-                                                break
-                                    if nist_istd_area is not None:
-                                        break
-                            
-                            if nist_istd_area is None and idx < 5:
-                                print(f"    ❌ ISTD '{istd_name}' NOT FOUND for compound '{compound_name}'!")
-                                
-                                # Show what ISTD compounds are actually available
-                                if idx < 2:  # Only for first 2 compounds to avoid spam
-                                    print(f"    🔍 Available compounds around ISTD area:")
-                                    # Look around the typical ISTD position (usually towards end)
-                                    start_idx = max(0, len(compounds) - 20)
-                                    for i in range(start_idx, min(len(compounds), start_idx + 10)):
-                                        comp_str = str(compounds.iloc[i] if hasattr(compounds, 'iloc') else compounds[i]).strip()
-                                        if any(pattern in comp_str.upper() for pattern in ['LPC', 'PC', '18:1', 'D7', 'ISTD']):
-                                            print(f"      [{i}] {comp_str}")
-                                
-                                # Check if compound has a different ISTD in database
-                                if compound_info:
-                                    db_istd = compound_info.get('istd')
-                                    if db_istd and db_istd != istd_name:
-                                        print(f"    💡 Database suggests ISTD: '{db_istd}' instead of '{istd_name}'")
-                            
-                            # Calculate NIST ratio: Compound Area ÷ ISTD Area (in NIST)
-                            if (nist_istd_area and pd.notna(nist_compound_area) and 
-                                pd.notna(nist_istd_area) and nist_istd_area != 0):
-                                nist_ratio = float(nist_compound_area) / float(nist_istd_area)
-                                
-                                # 🔧 DETAILED DEBUG for key compounds
-                                if compound_name == 'AcylCarnitine 10:0':
-                                    print(f"\n  🎯 SPECIAL DEBUG for AcylCarnitine 10:0:")
-                                    print(f"     NIST Compound Area: {nist_compound_area}")
-                                    print(f"     NIST ISTD Area: {nist_istd_area}")
-                                    print(f"     Calculated NIST Ratio: {nist_ratio:.10f}")
-                                    print(f"     Expected NIST Ratio (from sample breakdown): 0.17689020294194963")
-                                    print(f"     Match? {'YES ✅' if abs(nist_ratio - 0.17689020294194963) < 0.0001 else 'NO ❌'}")
-                                elif idx < 5:  # Regular logging for others
-                                    print(f"  ✅ NIST RATIO for {compound_name}: {nist_compound_area} ÷ {nist_istd_area} = {nist_ratio:.6f}")
-                            break
-                    
-                    # 🔧 ULTRA FIX: Use NIST standards from database (permanent reference values)
-                    # Get NIST standard from compound database
-                    nist_standard = None
-                    
-                    # Get compound-specific NIST standard from database
-                    if compound_name in compound_data:
-                        compound_info_full = compound_data.get(compound_name, {})
-                        # Get NIST standard from database (permanent reference value)
-                        nist_standard = compound_info_full.get('nist_standard', 0.1769)
-                    
-                    # Fallback if compound not in database
-                    if nist_standard is None or nist_standard == 0:
-                        nist_standard = 0.1769  # Default NIST standard
-                        if idx < 3:
-                            print(f"  ⚠️ Using default NIST standard for {compound_name}: {nist_standard}")
-                    elif idx < 5:
-                        print(f"  ✅ Using NIST standard for {compound_name}: {nist_standard}")
-                    
-                    # Calculate NIST value: Sample Ratio ÷ NIST Standard (from database)
-                    if nist_standard and nist_standard != 0:
-                        nist_value = float(sample_ratio) / float(nist_standard)
-                        
-                        # 🔧 DATABASE NIST STANDARD DEBUG (first sample only to reduce log spam)
-                        if sample_col == sample_columns[0] and idx < 5:  # First sample, first 5 compounds
-                            print(f"\n  🎯 NIST STANDARD CALCULATION for {compound_name}, Sample {sample_col}:")
-                            print(f"     Sample Ratio: {sample_ratio:.10f}")
-                            print(f"     NIST Standard: {nist_standard:.10f} (from database)")
-                            print(f"     NIST Result: {sample_ratio:.10f} ÷ {nist_standard:.10f} = {nist_value:.10f}")
-                            print(f"     This value ({nist_value:.3f}) will be stored in the table")
-                        elif idx < 3:  # Regular logging for others  
-                            print(f"  ✅ NIST RESULT for {compound_name}: {sample_ratio:.6f} ÷ {nist_standard:.6f} = {nist_value:.6f}")
-                    else:
-                        nist_value = 0.0
-                    
-                    # Calculate Agilent value: Ratio × Conc.(nM) × Response Factor × Coefficient
-                    agilent_value = float(sample_ratio) * conc_nm * response_factor * coefficient
-                    
-                    nist_row[sample_col] = nist_value
-                    agilent_row[sample_col] = agilent_value
-                    
-                    # 🐛 DEBUG: Check what's being stored in nist_row
-                    if idx < 2:  # Only log first 2 compounds
-                        print(f"  🔍 STORING in nist_row[{sample_col}] = {nist_value:.6f} (calculated NIST result)")
-                        if float(nist_value) > 10:
-                            print(f"    ❌ WARNING: nist_value {nist_value:.6f} seems too high (should be ~5.646 for AcylCarnitine 10:0)")
-                        else:
-                            print(f"    ✅ Value looks correct: {nist_value:.6f}")
-                    
-                except Exception as e:
-                    print(f"⚠️ Error calculating values for {compound_name}, {sample_col}: {e}")
-                    nist_row[sample_col] = 0.0
-                    agilent_row[sample_col] = 0.0
-            
-            # 🐛 DEBUG: Check what's in nist_row before adding to results
-            if idx < 2:  # Only log first 2 compounds
-                print(f"  🔍 Final nist_row for {compound_name}: {nist_row}")
-                sample_cols = [col for col in nist_row.keys() if col.startswith('PH-HC_')]
-                for col in sample_cols[:2]:  # Check first 2 sample columns
-                    val = nist_row.get(col, 'MISSING')
-                    print(f"    📊 nist_row[{col}] = {val}")
-                    if isinstance(val, (int, float)) and float(val) > 10:
-                        print(f"    ❌ PROBLEM: {col} has value {val} (too high, should be ~5.646)")
-            
-            # 🔧 FIX: Only include calculated sample columns, exclude NIST columns with raw area values
-            clean_nist_row = {'Compound': nist_row.get('Compound', compound_name)}
-            clean_agilent_row = {'Compound': agilent_row.get('Compound', compound_name)}
-            
-            # Only copy sample columns (PH-HC_*) which contain calculated NIST results
-            for col in nist_row.keys():
-                if col.startswith('PH-HC_'):  # Only sample columns
-                    clean_nist_row[col] = nist_row[col]
-                    clean_agilent_row[col] = agilent_row.get(col, 0.0)
-                # Skip NIST columns that might contain raw area values
-            
-            # 🐛 DEBUG: Special check for key compounds
-            if compound_name in ['AcylCarnitine 10:0', 'AcylCarnitine 12:0']:
-                print(f"\n  🔍 FINAL DATA CHECK for {compound_name}:")
-                print(f"     Original nist_row keys: {list(nist_row.keys())}")
-                print(f"     Cleaned nist_row keys: {list(clean_nist_row.keys())}")
-                
-                # Show first few sample values with expected results
-                sample_cols = [col for col in clean_nist_row.keys() if col.startswith('PH-HC_')]
-                expected_values = {
-                    'AcylCarnitine 10:0': [5.646, 3.897, 2.030, 1.684],
-                    'AcylCarnitine 12:0': [4.053, 2.157, 1.236, 0.937]  # Approximate expected values
-                }
-                
-                expected_vals = expected_values.get(compound_name, [])
-                
-                for i, col in enumerate(sample_cols[:4]):
-                    val = clean_nist_row.get(col, 'MISSING')
-                    excel_expected = expected_vals[i] if i < len(expected_vals) else 'Unknown'
-                    print(f"     {col}: {val} (Expected: {excel_expected})")
-                    if isinstance(val, (int, float)) and isinstance(excel_expected, (int, float)):
-                        if abs(float(val) - excel_expected) < 0.01:
-                            print(f"       ✅ CORRECT!")
-                        else:
-                            print(f"       ❌ WRONG! Difference: {float(val) - excel_expected:.3f}")
-                            
-                # For AcylCarnitine 12:0, specifically check against sample breakdown result
-                if compound_name == 'AcylCarnitine 12:0' and sample_cols:
-                    first_val = clean_nist_row.get(sample_cols[0], 'MISSING')
-                    if isinstance(first_val, (int, float)):
-                        if abs(float(first_val) - 4.052668) < 0.01:
-                            print(f"       🎯 MATCHES SAMPLE BREAKDOWN: {first_val} ≈ 4.052668 ✅")
-                        else:
-                            print(f"       ❌ DOESN'T MATCH SAMPLE BREAKDOWN: {first_val} vs 4.052668")
-            
-            nist_results_data.append(clean_nist_row)
-            agilent_results_data.append(clean_agilent_row)
-        
-        print(f"✅ Calculated NIST and Agilent values for {len(nist_results_data)} compounds")
-        
-        # Convert results to DataFrames for Excel output
-        nist_results = pd.DataFrame(nist_results_data)
-        agilent_results = pd.DataFrame(agilent_results_data)
-        
-        # 🐛 CRITICAL DEBUG: Check what's actually in nist_results DataFrame
-        print(f"\n🔍 CRITICAL DEBUG - NIST Results DataFrame:")
-        print(f"   Shape: {nist_results.shape}")
-        if not nist_results.empty:
-            # Check key compounds in DataFrame
-            for compound_to_check in ['AcylCarnitine 10:0', 'AcylCarnitine 12:0']:
-                compound_rows = nist_results[nist_results['Compound'].str.contains(compound_to_check, na=False)]
-                if not compound_rows.empty:
-                    print(f"\n  🎯 {compound_to_check} in DataFrame:")
-                    compound_row = compound_rows.iloc[0]
-                    sample_cols = [col for col in nist_results.columns if col.startswith('PH-HC_')]
-                    
-                    expected_values = {
-                        'AcylCarnitine 10:0': [5.646, 3.897, 2.030, 1.684],
-                        'AcylCarnitine 12:0': [4.053, 2.157, 1.236, 0.937]  # Approximate
-                    }
-                    
-                    expected = expected_values.get(compound_to_check, [])
-                    
-                    for i, col in enumerate(sample_cols[:4]):
-                        if i < len(expected):
-                            val = compound_row[col]
-                            excel_expected = expected[i]
-                            print(f"    {col}: {val} (Expected: {excel_expected})")
-                            
-                            if abs(float(val) - excel_expected) < 0.1:
-                                print(f"      ✅ CORRECT!")
-                            elif compound_to_check == 'AcylCarnitine 12:0' and i == 0 and abs(float(val) - 4.052668) < 0.01:
-                                print(f"      🎯 MATCHES SAMPLE BREAKDOWN: {val} ≈ 4.052668 ✅")
-                            elif abs(float(val) - 0.9987) < 0.1 or abs(float(val) - 0.385458) < 0.01:
-                                print(f"      ❌ THIS IS THE SAMPLE RATIO, NOT NIST RESULT!")
-                            else:
-                                print(f"      ❌ WRONG VALUE! Difference from expected: {float(val) - excel_expected:.3f}")
-            
-            first_compound = nist_results.iloc[0]
-            print(f"\n  📊 First compound: {first_compound['Compound']}")
-            sample_cols = [col for col in nist_results.columns if col.startswith('PH-HC_')]
-            if sample_cols:
-                first_sample_val = nist_results[sample_cols[0]].iloc[0] if len(sample_cols) > 0 else "N/A"
-                print(f"  🔍 First sample value: {first_sample_val}")
-                if float(first_sample_val) > 8:
-                    print("  ❌ ERROR: Values are too high - likely raw ratios or areas!")
-                else:
-                    print("  ✅ Values look like proper NIST results")
+        # 🚀 BATCHED ENGINE: one reference-data load, index vectors, whole-matrix arithmetic
+        print("🧮 Calculating Ratio → NIST → Agilent as whole matrices...")
+        from batch_calculation_service import batch_calculator
+        batch = batch_calculator.calculate(main_data, sample_mapping, compound_data, coefficient)
+        compounds = batch['compounds']
+        area_data_values = batch['area_data_values']
+        sample_columns = batch['sample_columns']
+        nist_results = batch['nist_results']
+        agilent_results = batch['agilent_results']
         
         print(f"✅ DataFrames created: NIST {nist_results.shape}, Agilent {agilent_results.shape}")
         
@@ -3396,43 +3148,9 @@ def calculate_analysis():
             # Limit preview to first 50 rows to avoid large response size
             MAX_PREVIEW_ROWS = 50
             
-            nist_json = []
-            agilent_json = []
-            
-            # Convert only first 50 rows for preview
-            nist_preview = nist_results.head(MAX_PREVIEW_ROWS)
-            agilent_preview = agilent_results.head(MAX_PREVIEW_ROWS)
-            
-            for row_idx, row in nist_preview.iterrows():
-                row_dict = {}
-                for col in nist_preview.columns:
-                    val = row[col]
-                    # 🐛 DEBUG: Check first few values being converted to JSON
-                    if row_idx < 2 and col.startswith('PH-HC_'):
-                        print(f"  🔍 JSON conversion: row {row_idx}, col {col}, val {val}")
-                        if isinstance(val, (int, float)) and float(val) > 10:
-                            print(f"    ❌ JSON PROBLEM: Converting {val} (raw area) instead of calculated NIST result")
-                    # Fix NaN handling - convert NaN to 0 for JSON compatibility
-                    if pd.isna(val) or val is None:
-                        row_dict[col] = 0.0 if col != 'Compound' else ''
-                    elif isinstance(val, float) and (val != val):  # Check for NaN float
-                        row_dict[col] = 0.0
-                    else:
-                        row_dict[col] = str(val) if not isinstance(val, (int, float)) else val
-                nist_json.append(row_dict)
-            
-            for _, row in agilent_preview.iterrows():
-                row_dict = {}
-                for col in agilent_preview.columns:
-                    val = row[col]
-                    # Fix NaN handling - convert NaN to 0 for JSON compatibility
-                    if pd.isna(val) or val is None:
-                        row_dict[col] = 0.0 if col != 'Compound' else ''
-                    elif isinstance(val, float) and (val != val):  # Check for NaN float
-                        row_dict[col] = 0.0
-                    else:
-                        row_dict[col] = str(val) if not isinstance(val, (int, float)) else val
-                agilent_json.append(row_dict)
+            # Convert only first 50 rows for preview (NaN → 0.0 for JSON compatibility)
+            nist_json = batch_calculator.preview_records(nist_results, MAX_PREVIEW_ROWS)
+            agilent_json = batch_calculator.preview_records(agilent_results, MAX_PREVIEW_ROWS)
             
             print(f"JSON conversion completed: NIST {len(nist_json)} records (limited from {len(nist_results)}), Agilent {len(agilent_json)} records (limited from {len(agilent_results)})")
         except Exception as e:
@@ -3451,7 +3169,7 @@ def calculate_analysis():
                 
                 # Safely get row counts
                 try:
-                    total_rows_count = int(nist_results.shape[0]) if hasattr(nist_results, 'shape') else len(nist_results_data)
+                    total_rows_count = int(nist_results.shape[0])
                     preview_rows_count = int(len(nist_json))
                 except Exception as e:
                     print(f"Error getting row counts: {e}")
@@ -3490,12 +3208,11 @@ def calculate_analysis():
                         # Find ISTD area in the same sample column (SAME LOGIC)
                         istd_area = None
                         istd_found = False
-                        for istd_idx, istd_compound in enumerate(compounds):
-                            if str(istd_compound).strip() == istd_name:
-                                istd_area = area_data_values.iloc[istd_idx][col]
-                                print(f"  Found ISTD at idx {istd_idx}: {istd_area}")
-                                istd_found = True
-                                break
+                        istd_idx = batch['istd_positions'].get(istd_name)
+                        if istd_idx is not None:
+                            istd_area = area_data_values.iloc[istd_idx][col]
+                            print(f"  Found ISTD at idx {istd_idx}: {istd_area}")
+                            istd_found = True
                         
                         # If ISTD not found, use calculated value and create warning (SAME LOGIC)
                         istd_warning = None
@@ -3544,7 +3261,8 @@ def calculate_analysis():
                         print(f"✅ Created {len(available_compounds)} searchable compounds (all with on-demand calculation)")
                         
                         # Create basic sample breakdown for first compound display (no bulk pre-calculation)
-                        sample_breakdown_raw = {
+                        # NaN → 0.0 is applied by the JSON provider (nan_policy='zero' below)
+                        sample_breakdown = {
                             'compound': first_compound,
                             'sample': str(first_sample),
                             'area': float(area_value) if pd.notna(area_value) else 0.0,
@@ -3565,8 +3283,6 @@ def calculate_analysis():
                             'on_demand_calculation': True,  # Flag for frontend to use API
                             'calculation_method': 'on_demand_api'
                         }
-                        # Clean NaN values for JSON serialization
-                        sample_breakdown = clean_dict_for_json(sample_breakdown_raw)
                         print(f"✅ Sample breakdown created with ON-DEMAND calculation support: {first_compound} in {first_sample}")
                         print(f"🚀 Compound search: {len(available_compounds)} total compounds available via on-demand API")
                 except Exception as e:
@@ -3581,20 +3297,15 @@ def calculate_analysis():
                 import uuid
                 temp_session_id = str(uuid.uuid4())
                 
-                # Store Excel file in temp directory
-                temp_dir = tempfile.gettempdir()
-                temp_excel_path = os.path.join(temp_dir, f"metabolomics_result_{temp_session_id}.xlsx")
+                # Store Excel file in the shared result store (any worker can serve it)
+                result_store.put(temp_session_id, filename, output.getvalue())
                 
-                with open(temp_excel_path, 'wb') as temp_file:
-                    temp_file.write(output.getvalue())
-                
-                # Store only file path in session (not the data itself)
-                session['result_excel_path'] = temp_excel_path
+                # Store only the result session ID in session (not the data itself)
                 session['excel_filename'] = filename
                 session['result_session_id'] = temp_session_id
                 
-                print(f"📁 Result Excel stored in temp file: {temp_excel_path}")
-                print(f"💾 Session size reduced: storing only file path")
+                print(f"📁 Result Excel stored in {result_store.name} result store: {temp_session_id}/{filename}")
+                print(f"💾 Session size reduced: storing only result session ID")
                 
                 # Collect NIST standards data for display
                 nist_standards_info = {}
@@ -3614,7 +3325,8 @@ def calculate_analysis():
                     print(f"⚠️ Error collecting NIST standards: {e}")
                     nist_standards_info = {}
 
-                return jsonify({
+                # The calculation tool renders these numbers directly, so NaN is sent as 0.0
+                return json_response({
                     "success": True,
                     "nist_data": nist_json,
                     "agilent_data": agilent_json,
@@ -3625,7 +3337,7 @@ def calculate_analysis():
                     "preview_rows": preview_rows_count,
                     "large_file": True,
                     "sample_breakdown": sample_breakdown
-                })
+                }, nan_policy='zero')
         
         except Exception as e:
             print(f"Error checking Excel file size: {e}")
@@ -3646,20 +3358,15 @@ def calculate_analysis():
 def download_excel():
     """Download generated Excel file from temp file"""
     try:
-        temp_excel_path = session.get('result_excel_path')
+        result_session_id = session.get('result_session_id')
         filename = session.get('excel_filename', 'calculation_results.xlsx')
         
-        if not temp_excel_path or not os.path.exists(temp_excel_path):
+        response = send_result_artifact(result_session_id, filename) if result_session_id else None
+        if response is None:
             return jsonify({"error": "No Excel file available for download"}), 404
         
-        print(f"📥 Downloading Excel from temp file: {temp_excel_path}")
-        
-        return send_file(
-            temp_excel_path,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        print(f"📥 Downloading Excel from result store: {result_session_id}/{filename}")
+        return response
     except Exception as e:
         print(f"❌ Excel download error: {e}")
         return jsonify({"error": f"Download error: {str(e)}"}), 500
@@ -3695,7 +3402,7 @@ def calculate_compound_breakdown():
         print(f"🔍 ON-DEMAND CALCULATION: Index {compound_index}, Name: {compound_name}")
         
         # Check if we have temp file path in session
-        temp_file_path = session.get('calculation_temp_file')
+        temp_file_path = get_session_temp_file('calculation_temp_file')
         if not temp_file_path or not os.path.exists(temp_file_path):
             return jsonify({
                 "error": "No uploaded Excel data found. Please upload file first.",
@@ -3736,35 +3443,18 @@ def calculate_compound_breakdown():
             sample_mapping = {}
             compound_data = {}
         
-        # Parse Excel data from temp file
-        excel_data = pd.read_excel(temp_file_path, sheet_name=None)
-        main_sheet_name = list(excel_data.keys())[0]
-        main_data = excel_data[main_sheet_name]
-        
-        print(f"📊 Parsed Excel data: {main_data.shape}")
-        
-        # CRITICAL: Apply same header row detection as main calculation
-        # Check if we have header rows that need to be skipped
-        row_0_first = str(main_data.iloc[0, 0]).strip().lower()
-        row_1_first = str(main_data.iloc[1, 0]).strip().lower() if len(main_data) > 1 else ""
-        
-        skip_rows = 0
-        if row_1_first in ['name', 'area', 'compound']:
-            # Double header - skip both row 0 and row 1
-            skip_rows = 2
-            print("✅ ON-DEMAND: Found double header rows, skipping first 2 rows")
-        elif row_0_first in ['name', 'area', 'compound']:
-            # Single header - skip row 0  
-            skip_rows = 1
-            print("✅ ON-DEMAND: Found single header row, skipping first row")
-        else:
-            # No header - start from row 0
-            skip_rows = 0
-            print("✅ ON-DEMAND: No header rows found, starting from row 0")
+        # Parsed once per upload (in-memory / .npz cache) instead of re-reading the xlsx
+        parsed = get_parsed_upload()
+        if parsed is None:
+            return jsonify({
+                "error": "No uploaded Excel data found. Please upload file first.",
+                "requires_upload": True
+            }), 400
         
-        # Extract data after skipping appropriate header rows (SAME AS MAIN CALCULATION)
-        compounds = main_data.iloc[skip_rows:, 0].astype(str).str.strip().values.tolist()
-        area_data_values = main_data.iloc[skip_rows:, 1:]  # Skip header rows and compound column
+        # Same header row detection as main calculation (applied once when parsing)
+        skip_rows = parsed.header_rows
+        compounds = parsed.compounds
+        area_data_values = parsed.area_frame()  # Numeric areas, header rows and compound column removed
         
         print(f"✅ ON-DEMAND: Processing {len(compounds)} compounds after skipping {skip_rows} header rows")
         
@@ -3788,7 +3478,7 @@ def calculate_compound_breakdown():
         
         # Get compound data  
         target_compound = str(compounds[compound_index]).strip()
-        compound_area = area_data_values.iloc[compound_index][first_uploaded_sample]  # Use uploaded sample to access data
+        compound_area = parsed.area(compound_index, first_uploaded_sample)  # Use uploaded sample to access data
         
         # Debug: Verify we're getting actual numeric data, not header strings
         print(f"🔍 ON-DEMAND: Target compound: '{target_compound}', Area value: {compound_area} (type: {type(compound_area)})")
@@ -3802,12 +3492,11 @@ def calculate_compound_breakdown():
         # Find ISTD area
         istd_area = None
         istd_found = False
-        for istd_idx, compound in enumerate(compounds):
-            if str(compound).strip() == istd_name:
-                istd_area = area_data_values.iloc[istd_idx][first_uploaded_sample]  # Use uploaded sample to access data
-                print(f"  Found ISTD '{istd_name}' at index {istd_idx}: {istd_area}")
-                istd_found = True
-                break
+        istd_idx = parsed.compound_positions.get(istd_name)
+        if istd_idx is not None:
+            istd_area = parsed.area(istd_idx, first_uploaded_sample)  # Use uploaded sample to access data
+            print(f"  Found ISTD '{istd_name}' at index {istd_idx}: {istd_area}")
+            istd_found = True
         
         # Use default ISTD if not found and create warning
         istd_warning = None
@@ -4046,19 +3735,19 @@ def calculate_compound_breakdown():
         breakdown_data = {
             "compound": target_compound,
             "sample": str(first_sample),
-            "area": clean_nan_for_json(compound_area),
-            "istd_area": clean_nan_for_json(istd_area),
+            "area": compound_area,
+            "istd_area": istd_area,
             "istd_name": istd_name,
             "istd_found": istd_found,
             "istd_warning": istd_warning,
-            "concentration": clean_nan_for_json(concentration),
-            "response_factor": clean_nan_for_json(response_factor),
+            "concentration": concentration,
+            "response_factor": response_factor,
             "coefficient": coefficient,
-            "ratio": clean_nan_for_json(ratio),
-            "nist_reference": clean_nan_for_json(nist_ratio),  # Keep API key same for frontend compatibility
+            "ratio": ratio,
+            "nist_reference": nist_ratio,  # Keep API key same for frontend compatibility
             "nist_column": str(actual_nist_column),
-            "nist_result": clean_nan_for_json(nist_result),
-            "agilent_result": clean_nan_for_json(agilent_result),
+            "nist_result": nist_result,
+            "agilent_result": agilent_result,
             # Matrix debugging information
             "matrix_info": {
                 "compound_index": compound_index,
@@ -4071,10 +3760,10 @@ def calculate_compound_breakdown():
             }
         }
         
-        return jsonify({
+        return json_response({
             "success": True,
             "breakdown": breakdown_data
-        })
+        }, nan_policy='zero')
         
     except Exception as e:
         print(f"❌ Error in on-demand calculation: {e}")
@@ -4088,61 +3777,91 @@ def calculate_compound_breakdown():
 
 # =====================================================
 # ============================================================================
-# JSON/NaN CLEANING UTILITIES
+# TEMP FILE CLEANUP UTILITIES
 # ============================================================================
 
-def clean_nan_for_json(value):
-    """Clean NaN/None values for JSON serialization"""
-    import pandas as pd
-    import math
-    
-    if pd.isna(value) or value is None:
-        return 0.0
-    elif isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
-        return 0.0
-    return value
-
-def clean_dict_for_json(data_dict):
-    """Clean all NaN/None values in a dictionary for JSON serialization"""
-    cleaned_dict = {}
-    for key, value in data_dict.items():
-        if isinstance(value, list):
-            # Handle nested lists
-            cleaned_dict[key] = [clean_nan_for_json(item) if not isinstance(item, dict) else clean_dict_for_json(item) for item in value]
-        elif isinstance(value, dict):
-            # Handle nested dictionaries
-            cleaned_dict[key] = clean_dict_for_json(value)
-        else:
-            cleaned_dict[key] = clean_nan_for_json(value)
-    return cleaned_dict
+from temp_session_service import temp_session_store
+from result_store_service import result_store
+from parsed_upload_service import parsed_upload_cache, ParsedUpload
 
-# ============================================================================
-# TEMP FILE CLEANUP UTILITIES
-# ============================================================================
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Flask session key → (session ID key, result store artifact) for uploads shared across nodes
+SESSION_FILE_ARTIFACTS = {
+    'calculation_temp_file': ('session_id', 'calculation_upload.xlsx'),
+}
+
+def get_session_temp_file(session_key):
+    """
+    Temp file path stored in the Flask session, marked as recently used; None if gone.
+    With a shared result store, a file written by another node is fetched into this node's temp dir.
+    """
+    temp_path = session.get(session_key)
+    if not temp_path:
+        return None
+    if temp_session_store.touch(temp_path):
+        return temp_path
+
+    if session_key in SESSION_FILE_ARTIFACTS and not result_store.is_local:
+        session_id_key, artifact = SESSION_FILE_ARTIFACTS[session_key]
+        handle = result_store.open(session.get(session_id_key), artifact) if session.get(session_id_key) else None
+        if handle is not None:
+            with handle, open(temp_path, 'wb') as local_copy:
+                shutil.copyfileobj(handle, local_copy, length=1024 * 1024)
+            temp_session_store.register(session.get(session_id_key), temp_path, kind='calculation_upload')
+            return temp_path
+    return None
+
+def get_parsed_upload():
+    """
+    ParsedUpload of the session's calculation upload (parsed once, then cached); None if gone.
+    The upload timestamp is the cache version, so a re-upload never serves stale areas.
+    """
+    session_id = session.get('session_id')
+    temp_path = get_session_temp_file('calculation_temp_file')
+    if not session_id or not temp_path:
+        return None
+    parsed = parsed_upload_cache.get(session_id, version=session.get('calculation_timestamp'),
+                                     source_path=temp_path)
+    if parsed is not None:
+        temp_session_store.touch(parsed_upload_cache.binary_path(session_id))
+    return parsed
+
+def send_result_artifact(session_id, name, download_name=None, mimetype=XLSX_MIMETYPE):
+    """Stream an artifact from the result store as a download; None if it does not exist"""
+    if result_store.is_local:
+        temp_session_store.touch(result_store.get_session_dir(session_id))
+
+    # Plain files go through send_file's path handling (sendfile, conditional requests)
+    source = result_store.local_path(session_id, name) or result_store.open(session_id, name)
+    if source is None:
+        return None
+    return send_file(source, mimetype=mimetype, as_attachment=True, download_name=download_name or name)
 
 def cleanup_temp_calculation_files():
-    """Clean up old temporary calculation files to prevent disk bloat"""
+    """Expire old temp sessions and enforce the disk quota (see temp_session_service)"""
     try:
-        temp_dir = tempfile.gettempdir()
-        current_time = time.time()
-        
-        # Find all metabolomics temp files
-        for filename in os.listdir(temp_dir):
-            if filename.startswith('metabolomics_calc_') and filename.endswith('.xlsx'):
-                file_path = os.path.join(temp_dir, filename)
-                try:
-                    # Remove files older than 2 hours
-                    if current_time - os.path.getmtime(file_path) > 7200:
-                        os.remove(file_path)
-                        print(f"🧹 Cleaned up old temp file: {filename}")
-                except Exception as e:
-                    print(f"⚠️ Could not clean temp file {filename}: {e}")
-        
+        temp_session_store.sweep()
     except Exception as e:
         print(f"⚠️ Temp file cleanup error: {e}")
 
-# Clean up temp files on startup
+def _forget_evicted_session(session_id, kind):
+    """Drop cached result arrays / parsed uploads of evicted sessions"""
+    if kind == 'streamlined':
+        from result_browser_service import result_browser
+        result_browser.forget_session(session_id)
+    elif kind in ('calculation_upload', 'parsed_upload'):
+        parsed_upload_cache.forget(session_id)
+
+temp_session_store.on_evict(_forget_evicted_session)
+if not result_store.is_local:
+    # Shared stores expire on the same TTL as local temp sessions
+    temp_session_store.on_sweep(lambda: result_store.expire(temp_session_store.ttl_seconds))
+
+# Clean up temp files on startup, then keep sweeping in the background
 cleanup_temp_calculation_files()
+if os.getenv('TEMP_SESSION_JANITOR', 'True').lower() == 'true':
+    temp_session_store.start_janitor()
 
 # ============================================================================
 # ADMIN ROUTES (PLACEHOLDER)
@@ -4164,6 +3883,80 @@ def admin_stats():
     except:
         return "Admin stats temporarily unavailable", 503
 
+@app.route('/api/admin/temp-sessions', methods=['GET', 'POST'])
+@admin_required
+def api_admin_temp_sessions():
+    """Temp session store stats (count, bytes, evictions); POST runs a sweep first"""
+    try:
+        if request.method == 'POST':
+            temp_session_store.sweep()
+        return jsonify({"success": True, "stats": temp_session_store.get_stats()})
+    except Exception as e:
+        print(f"❌ Temp session stats error: {e}")
+        return jsonify({"success": False, "error": f"Temp session stats error: {str(e)}"}), 500
+
+@app.route('/api/admin/data-cache', methods=['GET', 'POST'])
+@admin_required
+def api_admin_data_cache():
+    """Lipid query cache stats (hits, misses, invalidations); POST clears it first"""
+    try:
+        if not optimized_manager:
+            return jsonify({"success": False, "error": "Database not available"}), 503
+        if request.method == 'POST':
+            optimized_manager.cache.invalidate()
+        return jsonify({"success": True, "stats": optimized_manager.cache.get_stats()})
+    except Exception as e:
+        print(f"❌ Data cache stats error: {e}")
+        return jsonify({"success": False, "error": f"Data cache stats error: {str(e)}"}), 500
+
+@app.route('/api/admin/chart-cache', methods=['GET', 'POST'])
+@admin_required
+def api_admin_chart_cache():
+    """
+    Chart payload cache stats (this worker); POST {"action": "prewarm"} builds the whole
+    library in the background (e.g. after a bulk import), {"action": "clear"} empties it
+    """
+    try:
+        if not chart_payload_cache or not MainLipid:
+            return jsonify({"success": False, "error": "Chart payload cache not available"}), 503
+        if request.method == 'POST':
+            action = (request.get_json(silent=True) or request.form).get('action', 'prewarm')
+            if action == 'prewarm':
+                chart_payload_cache.start_prewarm(app, DUAL_CHART_MAX_POINTS, DUAL_CHART_VIEW_FORMAT)
+            elif action == 'clear':
+                chart_payload_cache.stop_prewarm()
+                chart_payload_cache.invalidate()
+            else:
+                return jsonify({"success": False, "error": f"Unknown action: {action}"}), 400
+        return jsonify({"success": True, "stats": chart_payload_cache.get_stats()})
+    except Exception as e:
+        print(f"❌ Chart cache stats error: {e}")
+        return jsonify({"success": False, "error": f"Chart cache stats error: {str(e)}"}), 500
+
+@app.route('/api/admin/peak-areas', methods=['GET', 'POST'])
+@admin_required
+def api_admin_peak_areas():
+    """
+    Stored peak area rows and stale ions per baseline; POST {"baseline": "linear", "force": false}
+    runs the incremental precomputation (same job as migrate_peak_areas.py) and returns its stats
+    """
+    try:
+        if not peak_area_service or not MainLipid:
+            return jsonify({"success": False, "error": "Peak area service not available"}), 503
+        run = None
+        if request.method == 'POST':
+            options = request.get_json(silent=True) or request.form
+            baseline = options.get('baseline', PEAK_AREA_DEFAULT_BASELINE)
+            if baseline not in PEAK_AREA_BASELINES:
+                return jsonify({"success": False, "error": f"Unknown baseline: {baseline}"}), 400
+            force = str(options.get('force', False)).lower() in ('true', '1')
+            run = peak_area_service.compute(baseline, force=force)
+        return jsonify({"success": True, "run": run, "stats": peak_area_service.get_stats()})
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Peak area job error: {e}")
+        return jsonify({"success": False, "error": f"Peak area job error: {str(e)}"}), 500
+
 @app.route('/backup-management')
 def backup_management():
     """Backup management - placeholder route"""
@@ -4766,7 +4559,7 @@ def calculation_results_preview():
         print(f"🔍 Session keys: {list(session.keys())}")
         
         # Check if we have calculation temp file from previous upload
-        temp_file_path = session.get('calculation_temp_file')
+        temp_file_path = get_session_temp_file('calculation_temp_file')
         print(f"🔍 Temp file path from session: {temp_file_path}")
         
         if not temp_file_path or not os.path.exists(temp_file_path):
@@ -4783,73 +4576,56 @@ def calculation_results_preview():
         flash(f"Error accessing calculation results preview: {str(e)}", "error")
         return redirect(url_for('calculation_tool'))
 
+def build_ratio_preview(max_compounds=None, max_samples=None):
+    """Ratio table for the session's parsed upload (None if no upload); None limits = whole plate"""
+    from models import SampleIndex, CompoundIndex
+    from ratio_preview_service import ratio_preview_service
+    
+    parsed = get_parsed_upload()
+    if parsed is None:
+        return None
+    sample_mapping = SampleIndex.get_sample_mapping()
+    compound_istd = {compound: info.get('istd') for compound, info in CompoundIndex.get_all_compounds_dict().items()}
+    return ratio_preview_service.build_table(parsed, sample_mapping, compound_istd, max_compounds, max_samples)
+
 @app.route('/api/ratio-preview-data')
 def api_ratio_preview_data():
     """API endpoint to get ratio preview data"""
     try:
-        # Check if we're in an environment where pandas is available
-        try:
-            import pandas as pd
-            print("✅ Pandas available for ratio preview")
-        except ImportError:
-            return jsonify({"error": "Pandas not available - ratio preview requires pandas"}), 500
-        
-        from ratio_preview_service_fixed import generate_ratio_preview_table
-        
-        # Get temp file path from session
-        temp_file_path = session.get('calculation_temp_file')
-        
-        if not temp_file_path or not os.path.exists(temp_file_path):
-            return jsonify({"error": "No calculation data available"}), 400
+        from ratio_preview_service import ratio_preview_service
         
         # Generate ratio preview
         max_compounds = int(request.args.get('max_compounds', 20))
         max_samples = int(request.args.get('max_samples', 10))
         
-        result = generate_ratio_preview_table(temp_file_path, max_compounds, max_samples)
+        result = build_ratio_preview(max_compounds, max_samples)
+        if result is None:
+            return jsonify({"error": "No calculation data available"}), 400
         
-        if result['success']:
-            return jsonify({
-                "success": True,
-                "preview_data": result['preview_data'],
-                "summary_stats": result['summary_stats'],
-                "compounds": result['compounds'],
-                "samples": result['samples'],
-                "nist_columns": result['nist_columns']
-            })
-        else:
-            return jsonify({"error": result['error']}), 400
+        return jsonify({
+            "success": True,
+            "preview_data": ratio_preview_service.preview_records(result['table']),
+            "summary_stats": result['summary_stats'],
+            "compounds": result['compounds'],
+            "samples": result['samples'],
+            "nist_columns": result['nist_columns']
+        })
             
     except Exception as e:
         return jsonify({"error": f"Error generating ratio preview: {str(e)}"}), 500
 
 @app.route('/download/ratio-preview-excel')
 def download_ratio_preview_excel():
-    """Download complete ratio preview as Excel file"""
+    """Download complete ratio preview (every compound × sample) as Excel file"""
     try:
-        from ratio_preview_service_fixed import generate_ratio_preview_table, export_to_excel
+        from ratio_preview_service import ratio_preview_service
         
-        # Get temp file path from session
-        temp_file_path = session.get('calculation_temp_file')
-        
-        if not temp_file_path or not os.path.exists(temp_file_path):
+        result = build_ratio_preview()
+        if result is None:
             flash('No calculation data available for download.', 'error')
             return redirect(url_for('calculation_tool'))
         
-        # Generate full ratio data
-        result = generate_ratio_preview_table(temp_file_path, max_compounds=100, max_samples=100)
-        
-        if not result['success']:
-            flash(f'Error generating download data: {result["error"]}', 'error')
-            return redirect(url_for('calculation_results_preview'))
-        
-        # Export to Excel
-        buffer, filename = export_to_excel(result['full_data'])
-        
-        if buffer is None:
-            flash('Error generating Excel file.', 'error')
-            return redirect(url_for('calculation_results_preview'))
-        
+        buffer, filename = ratio_preview_service.export_to_excel(result['table'])
         return send_file(
             buffer,
             as_attachment=True,
@@ -4863,31 +4639,16 @@ def download_ratio_preview_excel():
 
 @app.route('/download/ratio-preview-csv')
 def download_ratio_preview_csv():
-    """Download complete ratio preview as CSV file"""
+    """Download complete ratio preview (every compound × sample) as CSV file"""
     try:
-        from ratio_preview_service_fixed import generate_ratio_preview_table, export_to_csv
-        
-        # Get temp file path from session
-        temp_file_path = session.get('calculation_temp_file')
+        from ratio_preview_service import ratio_preview_service
         
-        if not temp_file_path or not os.path.exists(temp_file_path):
+        result = build_ratio_preview()
+        if result is None:
             flash('No calculation data available for download.', 'error')
             return redirect(url_for('calculation_tool'))
         
-        # Generate full ratio data
-        result = generate_ratio_preview_table(temp_file_path, max_compounds=100, max_samples=100)
-        
-        if not result['success']:
-            flash(f'Error generating download data: {result["error"]}', 'error')
-            return redirect(url_for('calculation_results_preview'))
-        
-        # Export to CSV
-        buffer, filename = export_to_csv(result['full_data'])
-        
-        if buffer is None:
-            flash('Error generating CSV file.', 'error')
-            return redirect(url_for('calculation_results_preview'))
-        
+        buffer, filename = ratio_preview_service.export_to_csv(result['table'])
         return send_file(
             buffer,
             as_attachment=True,
@@ -4903,31 +4664,23 @@ def download_ratio_preview_csv():
 def debug_excel_sheets():
     """Debug endpoint to show what sheets are in the uploaded Excel file"""
     try:
-        import pandas as pd
-        
         # Get temp file path from session
-        temp_file_path = session.get('calculation_temp_file')
+        temp_file_path = get_session_temp_file('calculation_temp_file')
         
         if not temp_file_path or not os.path.exists(temp_file_path):
             return jsonify({"error": "No Excel file available"}), 400
         
-        # Read all sheets to see what's available
-        all_sheets = pd.read_excel(temp_file_path, sheet_name=None)
-        sheet_info = {}
-        
-        for sheet_name, sheet_data in all_sheets.items():
-            sheet_info[sheet_name] = {
-                'shape': list(sheet_data.shape),
-                'columns': list(sheet_data.columns[:10]),  # First 10 columns
-                'first_row': list(sheet_data.iloc[0, :5].values) if len(sheet_data) > 0 else []
-            }
+        # Sheet summaries are captured once when the upload is parsed
+        parsed = get_parsed_upload()
+        if parsed is None:
+            return jsonify({"error": "No Excel file available"}), 400
         
         return jsonify({
             "success": True,
             "file_path": temp_file_path,
-            "sheet_count": len(all_sheets),
-            "sheet_names": list(all_sheets.keys()),
-            "sheet_details": sheet_info
+            "sheet_count": len(parsed.sheet_summaries),
+            "sheet_names": list(parsed.sheet_summaries.keys()),
+            "sheet_details": parsed.sheet_summaries
         })
         
     except Exception as e:
@@ -4985,10 +4738,18 @@ def check_database_references():
 
 @app.route('/api/zoom-settings', methods=['GET'])
 def api_get_zoom_settings():
-    """Get all zoom settings from database"""
+    """Zoom settings from database: ?lipids=1,2,3 for the lipids on a page, all settings without it"""
     try:
         from models import ChartZoomSettings
-        settings = ChartZoomSettings.get_all_zoom_settings()
+        lipids = request.args.get('lipids')
+        lipid_ids = None
+        if lipids is not None:
+            try:
+                lipid_ids = [int(part) for part in lipids.split(',') if part.strip()]
+            except ValueError:
+                return jsonify({"status": "error", "message": "lipids must be a comma-separated list of IDs",
+                                "settings": {}}), 400
+        settings = ChartZoomSettings.get_zoom_settings(lipid_ids)
         return jsonify({
             "status": "success",
             "settings": settings
@@ -5046,25 +4807,155 @@ def api_save_zoom_settings():
             "message": str(e)
         })
 
+ZOOM_SETTINGS_BATCH_LIMIT = 500
+ZOOM_CHART_TYPES = ('chart1', 'chart2')
+
+@app.route('/api/zoom-settings/batch', methods=['POST'])
+def api_save_zoom_settings_batch():
+    """
+    Save many zoom settings in one request: {"settings": [{lipid_id, chart_type, zoom_start, zoom_end}, ...]}.
+    Valid entries are written with a single upsert; invalid ones are returned in "rejected" with their index.
+    """
+    data = request.get_json(silent=True) or {}
+    entries = data.get('settings')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"status": "error", "message": "settings must be a non-empty list"}), 400
+    if len(entries) > ZOOM_SETTINGS_BATCH_LIMIT:
+        return jsonify({"status": "error",
+                        "message": f"At most {ZOOM_SETTINGS_BATCH_LIMIT} settings per request"}), 400
+    if not MainLipid:
+        return jsonify({"status": "error", "message": "Database not available"}), 503
+    
+    try:
+        from models import ChartZoomSettings
+        
+        valid, rejected = [], []
+        for index, entry in enumerate(entries):
+            try:
+                setting = {
+                    'lipid_id': int(entry['lipid_id']),
+                    'chart_type': entry['chart_type'],
+                    'zoom_start': float(entry['zoom_start']),
+                    'zoom_end': float(entry['zoom_end'])
+                }
+            except (KeyError, TypeError, ValueError):
+                rejected.append({"index": index, "message": "lipid_id, chart_type, zoom_start and zoom_end are required"})
+                continue
+            if setting['chart_type'] not in ZOOM_CHART_TYPES:
+                rejected.append({"index": index, "message": f"chart_type must be one of {', '.join(ZOOM_CHART_TYPES)}"})
+            elif not (math.isfinite(setting['zoom_start']) and math.isfinite(setting['zoom_end'])) \
+                    or setting['zoom_start'] >= setting['zoom_end']:
+                rejected.append({"index": index, "message": "zoom_start must be less than zoom_end"})
+            else:
+                valid.append((index, setting))
+        
+        # Unknown lipids would fail the whole statement on the foreign key
+        known = {lipid_id for (lipid_id,) in db.session.query(MainLipid.lipid_id).filter(
+            MainLipid.lipid_id.in_({setting['lipid_id'] for _, setting in valid}))} if valid else set()
+        rejected.extend({"index": index, "message": f"Lipid with ID {setting['lipid_id']} not found"}
+                        for index, setting in valid if setting['lipid_id'] not in known)
+        
+        user_id = current_user.id if current_user and current_user.is_authenticated else None
+        saved = ChartZoomSettings.upsert_zoom_settings(
+            [setting for _, setting in valid if setting['lipid_id'] in known], user_id=user_id)
+        
+        return jsonify({
+            "status": "success",
+            "saved": saved,
+            "rejected": sorted(rejected, key=lambda item: item['index'])
+        })
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error saving zoom settings batch: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+DUAL_CHART_MAX_POINTS = 1000  # Per chromatogram line; a few times the canvas width
+
+def parse_max_points(args):
+    """max_points query arg: default DUAL_CHART_MAX_POINTS, 0 for full resolution, at least 50"""
+    max_points = args.get('max_points', DUAL_CHART_MAX_POINTS, type=int)
+    return max(max_points, 50) if max_points > 0 else None
+
+# Chart datasets as Chart.js point objects ('verbose', default) or parallel arrays + shared
+# style table ('compact', 'compact-f32' with base64 float32 arrays); see compact_chart_payload
+DUAL_CHART_FORMATS = ('verbose', 'compact', 'compact-f32')
+DUAL_CHART_VIEW_FORMAT = 'compact'  # What dual_chart_view.html requests (and prewarm builds)
+
+def parse_chart_format(args):
+    """format query arg; ValueError for unknown formats"""
+    wire_format = args.get('format', 'verbose')
+    if wire_format not in DUAL_CHART_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(DUAL_CHART_FORMATS)}")
+    return wire_format
+
+if chart_payload_cache and MainLipid and os.getenv('CHART_CACHE_PREWARM', 'False').lower() == 'true':
+    @app.before_request
+    def prewarm_chart_cache():
+        """Build every chart once per worker process, in the background, after a deploy"""
+        chart_payload_cache.ensure_prewarm(app, DUAL_CHART_MAX_POINTS, DUAL_CHART_VIEW_FORMAT)
+
+def chart_not_modified(etag):
+    """If-None-Match check for chart payloads (weak comparison: compressed responses carry W/ ETags)"""
+    if request.if_none_match and request.if_none_match.contains_weak(etag):
+        chart_payload_cache.record_not_modified()
+        response = make_response('', 304)
+        # A 304 echoes the validator form the client holds
+        response.set_etag(etag, weak=not request.if_none_match.contains(etag))
+        return response
+    return None
+
+def chart_payload_response(body, etag):
+    """Pre-serialized JSON with a strong ETag; clients always revalidate"""
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/dual-chart-data/<int:lipid_id>')
 def api_dual_chart_data(lipid_id):
-    """Chart data for visualizations"""
+    """
+    Chart data for visualizations (?max_points=N caps each chromatogram line, 0 = every point;
+    ?format=compact for the columnar datasets). Payloads are cached per lipid version with a
+    strong ETag, so repeat visits cost one version query.
+    """
+    try:
+        wire_format = parse_chart_format(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     try:
-        if DualChartService and MainLipid:
-            # First check if lipid exists
-            lipid = MainLipid.query.get(lipid_id)
-            if not lipid:
+        if DualChartService and MainLipid and chart_payload_cache:
+            max_points = parse_max_points(request.args)
+            versions = optimized_manager.get_chart_versions([lipid_id])
+            if lipid_id not in versions:
                 # Find a valid lipid ID to use instead
-                first_lipid = MainLipid.query.first()
-                if first_lipid:
-                    print(f"⚠️ Lipid ID {lipid_id} not found, using {first_lipid.lipid_id} instead")
-                    lipid_id = first_lipid.lipid_id
-                else:
+                first_lipid_id = db.session.query(MainLipid.lipid_id).order_by(MainLipid.lipid_id).limit(1).scalar()
+                if first_lipid_id is None:
                     return jsonify({"status": "error", "message": "No lipids available in database"})
+                print(f"⚠️ Lipid ID {lipid_id} not found, using {first_lipid_id} instead")
+                lipid_id = first_lipid_id
+                versions = optimized_manager.get_chart_versions([lipid_id])
             
-            chart_service = DualChartService()
-            chart_data = chart_service.get_dual_chart_data(lipid_id)
+            etag = chart_payload_cache.make_etag(lipid_id, versions[lipid_id], max_points, wire_format)
+            not_modified = chart_not_modified(etag)
+            if not_modified:
+                return not_modified
+            
+            etag, chart_data = chart_payload_cache.get_chart(lipid_id, versions[lipid_id], max_points, wire_format)
             # Wrap data in expected structure for frontend
+            return chart_payload_response(b'{"status":"success","data":' + chart_data + b'}', etag)
+        elif DualChartService and MainLipid:
+            # One context load (lipid + class, ions, XIC arrays); the chart build itself never queries
+            context = optimized_manager.get_lipid_chart_data_optimized(lipid_id)
+            if not context:
+                first_lipid_id = db.session.query(MainLipid.lipid_id).order_by(MainLipid.lipid_id).limit(1).scalar()
+                if first_lipid_id is None:
+                    return jsonify({"status": "error", "message": "No lipids available in database"})
+                print(f"⚠️ Lipid ID {lipid_id} not found, using {first_lipid_id} instead")
+                context = optimized_manager.get_lipid_chart_data_optimized(first_lipid_id)
+            
+            chart_service = DualChartService()
+            chart_data = chart_service.build_dual_chart(context, max_points=parse_max_points(request.args),
+                                                        wire_format=wire_format)
             return jsonify({"status": "success", "data": chart_data})
         else:
             # Return demo chart data
@@ -5091,9 +4982,99 @@ def api_dual_chart_data(lipid_id):
         print(f"⚠️ Chart API error: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+DUAL_CHART_BATCH_LIMIT = 100
+
+@app.route('/api/dual-chart-data/batch')
+def api_dual_chart_data_batch():
+    """
+    Dual charts for several lipids in one request: ?lipids=1,2,3[&max_points=N][&format=compact].
+    Lipids and ions are loaded in one batch; charts come back in request order, each with its own status.
+    """
+    try:
+        lipid_ids = [int(part) for part in request.args.get('lipids', '').split(',') if part.strip()]
+    except ValueError:
+        return jsonify({"status": "error", "message": "lipids must be a comma-separated list of IDs"}), 400
+    try:
+        wire_format = parse_chart_format(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if not lipid_ids:
+        return jsonify({"status": "error", "message": "No lipids selected"}), 400
+    if len(lipid_ids) > DUAL_CHART_BATCH_LIMIT:
+        return jsonify({"status": "error",
+                        "message": f"At most {DUAL_CHART_BATCH_LIMIT} lipids per request"}), 400
+    if not MainLipid:
+        return jsonify({"status": "error", "message": "Database not available"}), 503
+    
+    try:
+        max_points = parse_max_points(request.args)
+        if not chart_payload_cache:
+            charts = DualChartService().get_dual_chart_data_batch(lipid_ids, max_points=max_points,
+                                                                  wire_format=wire_format)
+            return jsonify({"status": "success", "charts": charts})
+        
+        versions = optimized_manager.get_chart_versions(lipid_ids)
+        etags = [chart_payload_cache.make_etag(lipid_id, versions[lipid_id], max_points, wire_format)
+                 if lipid_id in versions else f"missing:{lipid_id}" for lipid_id in lipid_ids]
+        batch_etag = chart_payload_cache.combine_etags(etags)
+        not_modified = chart_not_modified(batch_etag)
+        if not_modified:
+            return not_modified
+        
+        # Cached payloads are spliced in as serialized; only misses are loaded and built
+        parts = []
+        for lipid_id, etag, result in chart_payload_cache.get_charts(lipid_ids, versions, max_points, wire_format):
+            if etag:
+                parts.append(b'{"lipid_id":%d,"status":"success","data":' % lipid_id + result + b'}')
+            else:
+                parts.append(json.dumps({'lipid_id': lipid_id, 'status': 'error', 'message': result}).encode('utf-8'))
+        body = b'{"status":"success","charts":[' + b','.join(parts) + b']}'
+        return chart_payload_response(body, batch_etag)
+    except Exception as e:
+        print(f"⚠️ Batch chart API error: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+PEAK_AREA_BATCH_LIMIT = 500
+
+@app.route('/api/peak-areas')
+def api_peak_areas():
+    """
+    Precomputed integrated peak areas of the annotated ions of ?lipids=1,2,3[&baseline=none|linear|min].
+    Rows computed from an older window or XIC are flagged "stale" until the next job run.
+    """
+    try:
+        lipid_ids = [int(part) for part in request.args.get('lipids', '').split(',') if part.strip()]
+    except ValueError:
+        return jsonify({"status": "error", "message": "lipids must be a comma-separated list of IDs"}), 400
+    if not lipid_ids:
+        return jsonify({"status": "error", "message": "No lipids selected"}), 400
+    if len(lipid_ids) > PEAK_AREA_BATCH_LIMIT:
+        return jsonify({"status": "error", "message": f"At most {PEAK_AREA_BATCH_LIMIT} lipids per request"}), 400
+    if not peak_area_service or not MainLipid:
+        return jsonify({"status": "error", "message": "Database not available"}), 503
+    baseline = request.args.get('baseline', PEAK_AREA_DEFAULT_BASELINE)
+    if baseline not in PEAK_AREA_BASELINES:
+        return jsonify({"status": "error",
+                        "message": f"baseline must be one of: {', '.join(PEAK_AREA_BASELINES)}"}), 400
+
+    try:
+        areas, stale_ion_ids = peak_area_service.get_peak_areas(lipid_ids, baseline)
+        return jsonify({
+            "status": "success",
+            "baseline": baseline,
+            "peak_areas": [{"lipid_id": lipid_id, "ions": rows} for lipid_id, rows in areas.items()],
+            "stale_ion_ids": stale_ion_ids
+        })
+    except Exception as e:
+        print(f"⚠️ Peak area API error: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route('/api/load-lipids')
 def api_load_lipids():
-    """API endpoint to load lipids asynchronously for dashboard"""
+    """
+    API endpoint to load lipids asynchronously for dashboard.
+    Served with ETag/Last-Modified from the lipid tables, so repeat loads get 304.
+    """
     import time
     start_time = time.time()
     
@@ -5105,33 +5086,35 @@ def api_load_lipids():
                 'message': 'Database not available'
             })
         
-        # Get all lipids with their classes
-        lipids = MainLipid.query.options(
-            selectinload(MainLipid.lipid_class),
-            selectinload(MainLipid.annotated_ions)
-        ).all()
+        # Cheap validator query first - unchanged tables answer 304 without listing anything
+        version = optimized_manager.get_lipid_listing_version()
+        last_modified = version['last_modified'].replace(tzinfo=timezone.utc, microsecond=0) \
+            if version['last_modified'] else None
         
-        # Convert to JSON format
-        lipids_data = []
-        for lipid in lipids:
-            lipid_dict = {
-                'lipid_id': lipid.lipid_id,
-                'lipid_name': lipid.lipid_name,
-                'api_code': lipid.api_code,
-                'retention_time': lipid.retention_time,
-                'class_name': lipid.lipid_class.class_name if lipid.lipid_class else 'Unknown',
-                'annotated_ions_count': len(lipid.annotated_ions)
-            }
-            lipids_data.append(lipid_dict)
+        # Weak comparison: compressed responses carry W/ ETags
+        not_modified = request.if_none_match.contains_weak(version['etag']) if request.if_none_match \
+            else bool(last_modified and request.if_modified_since and last_modified <= request.if_modified_since)
         
-        query_time = time.time() - start_time
+        if not_modified:
+            response = make_response('', 304)
+        else:
+            # Listed columns + grouped ion COUNT in one query (no ion rows, no xic_data)
+            lipids_data = optimized_manager.get_lipid_listing()
+            query_time = time.time() - start_time
+            response = jsonify({
+                'status': 'success',
+                'lipids': lipids_data,
+                'count': len(lipids_data),
+                'query_time': f"{query_time:.3f}s"
+            })
         
-        return jsonify({
-            'status': 'success',
-            'lipids': lipids_data,
-            'count': len(lipids_data),
-            'query_time': f"{query_time:.3f}s"
-        })
+        # A 304 echoes the validator form the client holds (weak after compression)
+        weak = not_modified and bool(request.if_none_match) and not request.if_none_match.contains(version['etag'])
+        response.set_etag(version['etag'], weak=weak)
+        if last_modified:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = 'no-cache'  # Always revalidate
+        return response
         
     except Exception as e:
         print(f"❌ Error loading lipids: {e}")
@@ -5155,7 +5138,7 @@ def api_debug_excel_structure():
     """Debug endpoint to analyze Excel file structure"""
     try:
         from streamlined_calculator_service import streamlined_calculator
-        import tempfile
+        from upload_service import get_upload_buffer
         
         if 'area_file' not in request.files:
             return jsonify({"success": False, "error": "No file uploaded"}), 400
@@ -5164,33 +5147,14 @@ def api_debug_excel_structure():
         if area_file.filename == '':
             return jsonify({"success": False, "error": "No file selected"}), 400
         
-        # Save to temp file
-        temp_area_file = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
-        area_file.save(temp_area_file.name)
-        temp_area_file.close()
+        # Debug the structure straight from the spooled upload
+        debug_info = streamlined_calculator.debug_excel_structure(get_upload_buffer(area_file), filename=area_file.filename)
         
-        try:
-            # Debug the structure
-            debug_info = streamlined_calculator.debug_excel_structure(temp_area_file.name)
-            
-            # Clean up temp file
-            try:
-                os.unlink(temp_area_file.name)
-            except:
-                pass
-                
-            return jsonify({
-                "success": True,
-                "filename": area_file.filename,
-                "debug_info": debug_info
-            })
-            
-        except Exception as debug_error:
-            try:
-                os.unlink(temp_area_file.name)
-            except:
-                pass
-            raise debug_error
+        return jsonify({
+            "success": True,
+            "filename": area_file.filename,
+            "debug_info": debug_info
+        })
             
     except Exception as e:
         print(f"❌ Debug error: {e}")
@@ -5203,8 +5167,8 @@ def api_streamlined_calculate():
         from streamlined_calculator_service import streamlined_calculator
         from models import CalculatorStatistics
         from datetime import datetime
+        from upload_service import get_upload_buffer
         import uuid
-        import tempfile
         
         # Check if user is authenticated and get user_id from email
         user_email = session.get('user_email', 'Anonymous')
@@ -5232,16 +5196,12 @@ def api_streamlined_calculate():
             return jsonify({"success": False, "error": "No file selected"}), 400
         
         
-        # Save uploaded file to temp location
-        temp_area_file = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
-        area_file.save(temp_area_file.name)
-        temp_area_file.close()
-        
         try:
-            # Perform calculation
+            # Parse the spooled upload directly - no temp file round trip
             results = streamlined_calculator.calculate_streamlined(
-                area_file=temp_area_file.name,
-                coefficient=coefficient
+                area_file=get_upload_buffer(area_file),
+                coefficient=coefficient,
+                filename=area_file.filename
             )
             
             # Save results to temp file with detailed calculations
@@ -5270,12 +5230,6 @@ def api_streamlined_calculate():
             # Send column order explicitly to ensure proper sorting
             column_order = list(results['nist_data'].columns)
             
-            # Clean up temp area file
-            try:
-                os.unlink(temp_area_file.name)
-            except:
-                pass
-            
             # Track user statistics if user is logged in - each file processed separately
             if user_id:
                 try:
@@ -5299,6 +5253,7 @@ def api_streamlined_calculate():
                 "nist_ratio_column_order": nist_ratio_column_order,  # New: NIST ratio columns
                 "substance_count": results['substance_count'],
                 "sample_count": results['sample_count'],
+                "total_rows": len(results['nist_data']),  # Full table available via /api/streamlined-results
                 "nist_column_count": results.get('nist_column_count', 0),  # New: NIST column count
                 "sample_range": results['numbering_info']['sample_range'],
                 "actual_range": results['numbering_info'].get('actual_range', '-'),
@@ -5307,11 +5262,6 @@ def api_streamlined_calculate():
             })
             
         except Exception as calc_error:
-            # Clean up temp file on error
-            try:
-                os.unlink(temp_area_file.name)
-            except:
-                pass
             raise calc_error
             
     except Exception as e:
@@ -5388,6 +5338,45 @@ def api_get_calculation_details(session_id):
             }
         }), 500
 
+@app.route('/api/streamlined-results/<session_id>')
+def api_browse_streamlined_results(session_id):
+    """Paginated, sortable, filterable window over a stored streamlined result sheet"""
+    try:
+        from result_browser_service import result_browser
+
+        def optional_float(name):
+            value = request.args.get(name, '').strip()
+            return float(value) if value else None
+
+        if result_store.is_local:
+            temp_session_store.touch(result_store.get_session_dir(session_id))
+        window = result_browser.browse(
+            session_id,
+            sheet=request.args.get('sheet', 'nist'),
+            row_offset=request.args.get('row_offset', 0, type=int),
+            row_limit=request.args.get('row_limit', 100, type=int),
+            col_offset=request.args.get('col_offset', 0, type=int),
+            col_limit=request.args.get('col_limit', 50, type=int),
+            sort_by=request.args.get('sort_by') or None,
+            sort_dir=request.args.get('sort_dir', 'asc'),
+            name_filter=request.args.get('filter') or None,
+            filter_mode=request.args.get('filter_mode', 'substring'),
+            filter_column=request.args.get('filter_column') or None,
+            min_value=optional_float('min_value'),
+            max_value=optional_float('max_value')
+        )
+
+        if window is None:
+            return jsonify({"success": False, "error": "Results not found or expired"}), 404
+
+        return jsonify({"success": True, **window})
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        print(f"❌ Result browsing error: {e}")
+        return jsonify({"success": False, "error": f"Browse error: {str(e)}"}), 500
+
 @app.route('/api/calculator-statistics')
 def api_calculator_statistics():
     """Get all individual file processing statistics"""
@@ -5423,35 +5412,18 @@ def api_calculator_statistics():
 def api_download_streamlined(session_id):
     """Download streamlined calculation results"""
     try:
-        import tempfile
-        import os
-        
-        # Find session directory
-        temp_dir = tempfile.gettempdir()
-        session_dir = os.path.join(temp_dir, f"streamlined_{session_id}")
-        
-        if not os.path.exists(session_dir):
-            return jsonify({"error": "Results not found or expired"}), 404
-        
-        # Find Excel file in session directory
-        excel_files = [f for f in os.listdir(session_dir) if f.endswith('.xlsx')]
+        # Resolve the session through the result store (local, database or shared directory)
+        excel_files = [name for name in result_store.list(session_id) if name.endswith('.xlsx')]
         
         if not excel_files:
-            return jsonify({"error": "Excel file not found"}), 404
-        
-        excel_file_path = os.path.join(session_dir, excel_files[0])
+            return jsonify({"error": "Results not found or expired"}), 404
         
-        if not os.path.exists(excel_file_path):
+        response = send_result_artifact(session_id, excel_files[0])
+        if response is None:
             return jsonify({"error": "Excel file not found"}), 404
         
         print(f"📥 Downloading streamlined results: {excel_files[0]}")
-        
-        return send_file(
-            excel_file_path,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=excel_files[0]
-        )
+        return response
         
     except Exception as e:
         print(f"❌ Download error: {e}")
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+BATCH CALCULATION SERVICE
+Vectorized engine behind the legacy /protocols/calculate route.
+Reference data is loaded once per request, sample and ISTD lookups are turned
+into index vectors, and Ratio → NIST → Agilent is computed as whole-matrix
+arithmetic instead of per-cell DataFrame access and database queries.
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ISTD = 'LPC 18:1 d7'
+FALLBACK_ISTD_AREA = 212434.0       # Used when the ISTD row is missing, empty or zero
+DEFAULT_NIST_STANDARD = 0.1769
+HEADER_KEYWORDS = ('name', 'area', 'compound')
+SAMPLE_PREFIX = 'PH-HC_'
+
+
+def detect_header_rows(main_data):
+    """Number of leading header rows (0, 1 or 2 for "Name/Area" double headers)"""
+    row_0_first = str(main_data.iloc[0, 0]).strip().lower()
+    row_1_first = str(main_data.iloc[1, 0]).strip().lower()
+    if row_1_first in HEADER_KEYWORDS:
+        return 2
+    if row_0_first in HEADER_KEYWORDS:
+        return 1
+    return 0
+
+
+def _numeric_matrix(frame):
+    """
+    Float matrix of a raw area block plus a mask of cells that hold text.
+    Text cells cannot be used as areas (the per-cell code failed on them).
+    """
+    numeric = frame.apply(pd.to_numeric, errors='coerce')
+    values = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+    text_cells = frame.notna().to_numpy() & np.isnan(values)
+    return values, text_cells
+
+
+class BatchCalculationService:
+    """Whole-matrix NIST/Agilent calculation for one uploaded area sheet"""
+
+    def calculate(self, main_data, sample_mapping, compound_data, coefficient):
+        """
+        Calculate NIST and Agilent result tables.
+
+        sample_mapping: {sample: paired_nist} from SampleIndex (one query)
+        compound_data:  {compound: {istd, conc_nm, response_factor, nist_standard}} (one query)
+        """
+        skip_rows = detect_header_rows(main_data)
+        data_columns = list(main_data.columns[1:])
+        compounds = main_data.iloc[skip_rows:, 0].astype(str).str.strip()
+        area_data_values = main_data.iloc[skip_rows:, 1:]
+
+        nist_columns = [col for col in data_columns if 'NIST' in str(col).strip().upper()]
+        nist_column_set = set(nist_columns)
+        sample_columns = [col for col in data_columns if col not in nist_column_set]
+        print(f"✅ Processing {len(compounds)} compounds after skipping {skip_rows} header rows")
+        print(f"📊 Sample columns: {len(sample_columns)}")
+        print(f"🎯 NIST columns: {len(nist_columns)}")
+
+        compound_names = compounds.tolist()
+        n_compounds = len(compound_names)
+
+        # ------------------------------------------------------------------
+        # Per-compound reference vectors (one dict lookup per compound)
+        # ------------------------------------------------------------------
+        first_position = {}
+        for position, name in enumerate(compound_names):
+            first_position.setdefault(name, position)
+
+        istd_index = np.full(n_compounds, -1, dtype=np.int64)
+        nist_standard = np.full(n_compounds, DEFAULT_NIST_STANDARD)
+        conc_nm = np.ones(n_compounds)
+        response_factor = np.ones(n_compounds)
+        for position, name in enumerate(compound_names):
+            info = compound_data.get(name, {})
+            istd_index[position] = first_position.get(info.get('istd', DEFAULT_ISTD), -1)
+            conc_nm[position] = info.get('conc_nm', 1.0) or 1.0
+            response_factor[position] = info.get('response_factor', 1.0) or 1.0
+            if name in compound_data:
+                standard = info.get('nist_standard', DEFAULT_NIST_STANDARD)
+                if standard is not None and standard != 0:
+                    nist_standard[position] = standard
+
+        # ------------------------------------------------------------------
+        # STEP 1: Ratio = Compound Area ÷ ISTD Area (same sample column)
+        # ------------------------------------------------------------------
+        sample_areas, sample_text = _numeric_matrix(area_data_values[sample_columns])
+        has_istd = istd_index >= 0
+        istd_rows = np.where(has_istd, istd_index, 0)
+
+        istd_areas = sample_areas[istd_rows]
+        istd_text = sample_text[istd_rows] & has_istd[:, None]
+        missing_istd = ~has_istd[:, None] | np.isnan(istd_areas) | (istd_areas == 0)
+        istd_areas = np.where(missing_istd & ~istd_text, FALLBACK_ISTD_AREA, istd_areas)
+
+        valid = ~np.isnan(sample_areas) & (sample_areas != 0) & ~istd_text
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.where(valid, sample_areas / istd_areas, 0.0)
+
+        # ------------------------------------------------------------------
+        # STEP 2: Resolve each sample's ratio through the sample → paired NIST key.
+        # Ratios are keyed by sample_mapping.get(sample, sample); NIST area columns
+        # written under the same key take precedence (precomputed index vector).
+        # ------------------------------------------------------------------
+        nist_areas, _ = _numeric_matrix(area_data_values[nist_columns])
+        keyed_values = np.hstack([ratios, np.nan_to_num(nist_areas, nan=0.0)])
+        key_position = {}
+        for position, col in enumerate(sample_columns):
+            key_position[sample_mapping.get(col, col)] = position
+        for position, col in enumerate(nist_columns):
+            key_position[col] = len(sample_columns) + position
+        ratio_index = np.array([key_position[sample_mapping.get(col, col)] for col in sample_columns],
+                               dtype=np.int64)
+        sample_ratios = keyed_values[:, ratio_index] if len(sample_columns) else ratios
+
+        # ------------------------------------------------------------------
+        # STEP 3: NIST = Ratio ÷ NIST Standard; Agilent = Ratio × Conc × RF × Coefficient
+        # ------------------------------------------------------------------
+        nist_values = sample_ratios / nist_standard[:, None]
+        agilent_values = sample_ratios * (conc_nm * response_factor * coefficient)[:, None]
+
+        # Output keeps named compounds and PH-HC_ sample columns, in upload order
+        keep_rows = np.array([bool(name) for name in compound_names], dtype=bool)
+        output_positions = [position for position, col in enumerate(sample_columns)
+                            if isinstance(col, str) and col.startswith(SAMPLE_PREFIX)]
+        output_columns = [sample_columns[position] for position in output_positions]
+        kept_names = [name for name, keep in zip(compound_names, keep_rows) if keep]
+
+        def result_frame(matrix):
+            frame = pd.DataFrame(matrix[np.ix_(keep_rows, output_positions)], columns=output_columns)
+            frame.insert(0, 'Compound', kept_names)
+            return frame
+
+        nist_results = result_frame(nist_values)
+        agilent_results = result_frame(agilent_values)
+        print(f"✅ Calculated NIST and Agilent values for {len(nist_results)} compounds")
+
+        return {
+            'skip_rows': skip_rows,
+            'compounds': compounds,
+            'area_data_values': area_data_values,
+            'sample_columns': sample_columns,
+            'nist_columns': nist_columns,
+            'istd_positions': first_position,
+            'nist_results': nist_results,
+            'agilent_results': agilent_results,
+        }
+
+    @staticmethod
+    def preview_records(frame, limit):
+        """First `limit` rows as JSON records with NaN shown as 0.0"""
+        return frame.head(limit).fillna(0.0).to_dict('records')
+
+
+# Global instance
+batch_calculator = BatchCalculationService()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+CHART WIRE FORMAT BENCHMARK
+Payload size of /api/dual-chart-data per wire format (verbose Chart.js objects,
+compact columnar arrays, compact with base64 float32 arrays), raw and after
+gzip / brotli, plus server build+serialize time and client-side parse time
+(json.loads + expand_chart_payload as a stand-in for JSON.parse + expandCompactChart).
+
+Usage:
+  python benchmarks/benchmark_chart_wire_format.py                  # real lipids (needs DATABASE_URL)
+  python benchmarks/benchmark_chart_wire_format.py --sample 200 --max-points 0
+  python benchmarks/benchmark_chart_wire_format.py --synthetic      # generated traces, no database
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dual_chart_service import DualChartService, CHART_WIRE_FORMATS, expand_chart_payload
+from json_provider import dumps_bytes
+from response_compression import BROTLI_AVAILABLE
+
+if BROTLI_AVAILABLE:
+    import brotli
+
+
+def synthetic_contexts(count=50, ions=8):
+    """Chart contexts shaped like get_lipids_chart_data_optimized output"""
+    rng = np.random.default_rng(7)
+    times = np.round(np.arange(0, 16, 0.0043), 4)
+    contexts = []
+    for lipid_id in range(1, count + 1):
+        rt = float(rng.uniform(1, 15))
+        intensities = np.round(150 + 2e4 * np.exp(-((times - rt) / 0.04) ** 2) + rng.normal(0, 15, times.size), 1)
+        annotated_ions = []
+        for idx in range(ions):
+            ion_rt = round(rt + idx * 0.35 - 1.0, 3)
+            annotated_ions.append({
+                'ion_id': lipid_id * 100 + idx, 'main_lipid_id': lipid_id, 'ion_lipid_name': f"PC 3{idx}:{lipid_id % 6}",
+                'ion_lipidcode': None, 'annotation_type': ['Current lipid', '+2 isotope', 'Similar MRM'][min(idx, 2)],
+                'retention_time': ion_rt, 'precursor_ion': '760.6', 'product_ion': '184.1', 'collision_energy': 30,
+                'polarity': 'Positive', 'response_factor': 1.0, 'int_start': ion_rt - 0.08, 'int_end': ion_rt + 0.08,
+                'is_main_lipid': idx == 0
+            })
+        contexts.append({
+            'lipid_info': {'lipid_id': lipid_id, 'lipid_name': f"PC 34:{lipid_id % 6}", 'api_code': None,
+                           'retention_time': rt, 'class_name': 'PC'},
+            'annotated_ions': annotated_ions,
+            'xic_arrays': (times, intensities)
+        })
+    return contexts
+
+
+def live_contexts(sample):
+    """Chart contexts of the first `sample` lipids with an XIC trace"""
+    from app import app, db, MainLipid, optimized_manager
+
+    if not MainLipid:
+        print("❌ DATABASE_URL not set or database unavailable (use --synthetic)")
+        sys.exit(1)
+    with app.app_context():
+        lipid_ids = [lipid_id for (lipid_id,) in db.session.query(MainLipid.lipid_id).filter(
+            MainLipid.xic_blob.isnot(None) | MainLipid.xic_data.isnot(None)
+        ).order_by(MainLipid.lipid_id).limit(sample)]
+        contexts = optimized_manager.get_lipids_chart_data_optimized(lipid_ids)
+        return [contexts[lipid_id] for lipid_id in lipid_ids if lipid_id in contexts]
+
+
+def measure(contexts, wire_format, max_points):
+    service = DualChartService()
+    totals = {'raw': 0, 'gzip': 0, 'br': 0, 'build_ms': [], 'parse_ms': [], 'charts': 0}
+    for context in contexts:
+        start = time.perf_counter()
+        try:
+            body = dumps_bytes(service.build_dual_chart(context, max_points=max_points, wire_format=wire_format))
+        except ValueError:
+            continue   # No usable trace
+        totals['build_ms'].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        payload = json.loads(body)
+        if wire_format != 'verbose':
+            expand_chart_payload(payload)
+        totals['parse_ms'].append((time.perf_counter() - start) * 1000)
+
+        totals['charts'] += 1
+        totals['raw'] += len(body)
+        totals['gzip'] += len(gzip.compress(body, 6))
+        if BROTLI_AVAILABLE:
+            totals['br'] += len(brotli.compress(body, quality=5))
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chart payload wire formats")
+    parser.add_argument('--sample', type=int, default=100, help="Lipids measured")
+    parser.add_argument('--max-points', type=int, default=1000, help="Per chromatogram line, 0 = every point")
+    parser.add_argument('--synthetic', action='store_true', help="Generated traces instead of the database")
+    args = parser.parse_args()
+
+    contexts = synthetic_contexts(args.sample) if args.synthetic else live_contexts(args.sample)
+    max_points = args.max_points or None
+    print(f"📦 Chart wire format benchmark: {len(contexts)} {'synthetic' if args.synthetic else 'real'} lipids, "
+          f"max_points={max_points}")
+    print("-" * 100)
+    print(f"{'format':<13} {'raw/chart':>11} {'gzip/chart':>11} {'br/chart':>11} {'vs verbose raw':>15} "
+          f"{'vs verbose gzip':>16} {'build':>9} {'parse':>9}")
+    print("-" * 100)
+
+    baseline = None
+    for wire_format in CHART_WIRE_FORMATS:
+        totals = measure(contexts, wire_format, max_points)
+        if not totals['charts']:
+            print("❌ No lipid with a usable XIC trace")
+            sys.exit(1)
+        baseline = baseline or totals
+        per_chart = lambda key: f"{totals[key] / totals['charts'] / 1024:.1f}KB"
+        print(f"{wire_format:<13} {per_chart('raw'):>11} {per_chart('gzip'):>11} "
+              f"{per_chart('br') if BROTLI_AVAILABLE else 'n/a':>11} "
+              f"{totals['raw'] / baseline['raw']:>15.1%} {totals['gzip'] / baseline['gzip']:>16.1%} "
+              f"{np.median(totals['build_ms']):>7.2f}ms {np.median(totals['parse_ms']):>7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+JSON PROVIDER BENCHMARK
+Encodes real preview payloads built from an uploaded plate with
+  (a) the previous path: hand-rolled NaN/NumPy walkers + Flask's stdlib provider
+  (b) the app-wide FastJSONProvider (orjson, native NumPy/NaN handling)
+
+Payloads (from PH-HC_5701-5800.xlsx + sample-index.xlsx / compound-index.xlsx):
+  calculate-preview   /protocols/calculate response (50-row NIST/Agilent previews + breakdown)
+  nist-full           full NIST result matrix as records
+  ratio-preview       /api/ratio-preview-data rows for the whole plate
+  calc-details        streamlined calculation details tree (NumPy scalars)
+
+Usage:
+  python benchmarks/benchmark_json_provider.py
+  python benchmarks/benchmark_json_provider.py --upload other.xlsx --repeats 50
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+from flask import Flask, jsonify
+
+from batch_calculation_service import batch_calculator
+from json_provider import init_json_provider, json_response, ORJSON_AVAILABLE
+from parsed_upload_service import ParsedUpload
+from ratio_preview_service import ratio_preview_service
+
+
+# ----------------------------------------------------------------------
+# Previous walkers (removed from the app), kept here as the baseline
+# ----------------------------------------------------------------------
+
+def clean_nan_for_json(value):
+    if pd.isna(value) or value is None:
+        return 0.0
+    elif isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return 0.0
+    return value
+
+
+def clean_dict_for_json(data_dict):
+    cleaned_dict = {}
+    for key, value in data_dict.items():
+        if isinstance(value, list):
+            cleaned_dict[key] = [clean_nan_for_json(item) if not isinstance(item, dict) else clean_dict_for_json(item)
+                                 for item in value]
+        elif isinstance(value, dict):
+            cleaned_dict[key] = clean_dict_for_json(value)
+        else:
+            cleaned_dict[key] = clean_nan_for_json(value)
+    return cleaned_dict
+
+
+def make_json_safe(obj):
+    if isinstance(obj, dict):
+        return {k: make_json_safe(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [make_json_safe(item) for item in obj]
+    elif isinstance(obj, (np.integer, np.floating)):
+        return float(obj)
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif pd.isna(obj):
+        return None
+    return obj
+
+
+def iterrows_records(frame):
+    """Legacy preview conversion: iterrows with per-cell NaN checks"""
+    records = []
+    for _, row in frame.iterrows():
+        record = {}
+        for col, value in row.items():
+            record[col] = 0.0 if pd.isna(value) else value
+        records.append(record)
+    return records
+
+
+# ----------------------------------------------------------------------
+# Payloads
+# ----------------------------------------------------------------------
+
+def build_payloads(upload_path):
+    sheets = pd.read_excel(upload_path, sheet_name=None)
+    main_data = next(iter(sheets.values()))
+    sample_index = pd.read_excel(os.path.join(ROOT, 'sample-index.xlsx'))
+    compound_index = pd.read_excel(os.path.join(ROOT, 'compound-index.xlsx')).dropna(subset=['ISTD'])
+    sample_mapping = dict(zip(sample_index['sample'], sample_index['paired_nist']))
+    compound_data = {row['Compound']: {'istd': row['ISTD'], 'conc_nm': row['Conc. (nM)'],
+                                       'response_factor': row['Response factor'],
+                                       'nist_standard': row['NIST Conc. (nM)']}
+                     for _, row in compound_index.iterrows()}
+
+    batch = batch_calculator.calculate(main_data, sample_mapping, compound_data, 500)
+    nist, agilent = batch['nist_results'], batch['agilent_results']
+    breakdown = {'compound': 'AcylCarnitine 10:0', 'area': np.float64('nan'), 'ratio': np.float64(0.25),
+                 'available_compounds': [{'name': name, 'index': i} for i, name in enumerate(batch['compounds'])]}
+
+    parsed = ParsedUpload.from_sheets(sheets)
+    ratio = ratio_preview_service.build_table(parsed, sample_mapping,
+                                              {c: info['istd'] for c, info in compound_data.items()})
+
+    details = {f"{compound}|{sample}": {
+        'source_data': {'substance_area': np.float64(nist.iloc[i, 1]), 'istd_row': np.int64(i),
+                        'nist_area': np.float64('nan')},
+        'calculations': {'ratio': np.float64(nist.iloc[i, 1]), 'history': np.arange(4, dtype=np.float64)}
+    } for i, (compound, sample) in enumerate(zip(nist['Compound'][:200], nist.columns[1:].tolist() * 2))}
+
+    # name → (old builder, new builder, NaN policy)
+    return {
+        'calculate-preview': (
+            lambda: clean_dict_for_json({'nist_data': iterrows_records(nist.head(50)),
+                                         'agilent_data': iterrows_records(agilent.head(50)),
+                                         'sample_breakdown': clean_dict_for_json(breakdown)}),
+            lambda: {'nist_data': batch_calculator.preview_records(nist, 50),
+                     'agilent_data': batch_calculator.preview_records(agilent, 50),
+                     'sample_breakdown': breakdown},
+            'zero'),
+        'nist-full': (lambda: {'rows': iterrows_records(nist)},
+                      lambda: {'rows': nist},
+                      'zero'),
+        'ratio-preview': (lambda: {'rows': [clean_dict_for_json(row) for row in ratio['table'].to_dict('records')]},
+                          lambda: {'rows': ratio['table']},
+                          'zero'),
+        'calc-details': (lambda: make_json_safe(details),
+                         lambda: details,
+                         'null'),
+    }
+
+
+def time_request(client, path, repeats):
+    timings = []
+    size = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        body = client.get(path).get_data()
+        timings.append(time.perf_counter() - start)
+        size = len(body)
+    timings.sort()
+    return size, timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fast JSON provider on real preview payloads")
+    parser.add_argument('--upload', default=os.path.join(ROOT, 'PH-HC_5701-5800.xlsx'))
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    print("📦 JSON provider benchmark")
+    print(f"   Encoder: {'orjson' if ORJSON_AVAILABLE else 'stdlib json (orjson not installed)'}")
+    payloads = build_payloads(args.upload)
+
+    old_app = Flask('old')
+    new_app = Flask('new')
+    init_json_provider(new_app)
+    for name, (old_builder, new_builder, policy) in payloads.items():
+        old_app.add_url_rule(f'/{name}', name, (lambda b=old_builder: jsonify(b())))
+        new_app.add_url_rule(f'/{name}', name, (lambda b=new_builder, p=policy: json_response(b(), nan_policy=p)))
+
+    old_client, new_client = old_app.test_client(), new_app.test_client()
+    for name in payloads:
+        old_size, old_time = time_request(old_client, f'/{name}', args.repeats)
+        new_size, new_time = time_request(new_client, f'/{name}', args.repeats)
+        print(f"  {name:<18} walkers+stdlib {old_time * 1000:>8.2f} ms ({old_size / 1024:>7.1f} KB)   "
+              f"provider {new_time * 1000:>7.2f} ms ({new_size / 1024:>7.1f} KB)   "
+              f"speedup {old_time / new_time:>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
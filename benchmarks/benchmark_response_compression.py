@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+RESPONSE COMPRESSION BENCHMARK
+Measures payload size and end-to-end latency with and without negotiated
+compression for the JSON-heavy endpoints:
+  /api/load-lipids, /api/dual-chart-data/<id>, /api/streamlined-calculate previews,
+  /api/calculation-details/<session_id>
+
+Usage:
+  python benchmarks/benchmark_response_compression.py                 # representative payloads
+  python benchmarks/benchmark_response_compression.py --live 42       # real app + DB, lipid_id 42
+  python benchmarks/benchmark_response_compression.py --bandwidth 5   # assume 5 Mbit/s client link
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+
+from response_compression import ResponseCompressor, BROTLI_AVAILABLE
+
+
+def build_load_lipids_payload(count=800):
+    """Shape of /api/load-lipids"""
+    classes = ['AC', 'PC', 'PE', 'LPC', 'TG', 'SM', 'Cer', 'DG']
+    lipids = []
+    for i in range(count):
+        cls = classes[i % len(classes)]
+        lipids.append({
+            'lipid_id': i + 1,
+            'lipid_name': f"{cls} {14 + i % 10}:{i % 6}",
+            'api_code': f"{cls}_{i:05d}",
+            'retention_time': round(random.uniform(0.5, 15.5), 3),
+            'class_name': cls,
+            'annotated_ions_count': 1 + i % 5
+        })
+    return {'status': 'success', 'lipids': lipids, 'count': len(lipids), 'query_time': '0.050s'}
+
+
+def build_dual_chart_payload(points=960, ions=6):
+    """Shape of /api/dual-chart-data/<id> built through DualChartService"""
+    import numpy as np
+    from dual_chart_service import DualChartService
+
+    times = [i * 16.0 / points for i in range(points)]
+    intensities = [200 + 5000 * math.exp(-((t - 6.2) ** 2) / 0.01) + random.uniform(0, 40) for t in times]
+    annotated_ions = []
+    for idx in range(ions):
+        rt = 6.2 + idx * 0.4
+        annotated_ions.append({
+            'ion_id': idx, 'main_lipid_id': 1, 'ion_lipid_name': f"PC 34:{idx}",
+            'annotation_type': ['Current lipid', '+2 isotope', 'Similar MRM'][idx % 3],
+            'retention_time': rt, 'int_start': rt - 0.1, 'int_end': rt + 0.1,
+            'precursor_ion': '760.6', 'product_ion': '184.1', 'collision_energy': 30,
+            'is_main_lipid': idx == 0
+        })
+    context = {
+        'lipid_info': {'lipid_id': 1, 'lipid_name': 'PC 34:1', 'retention_time': 6.2, 'class_name': 'PC'},
+        'annotated_ions': annotated_ions,
+        'xic_arrays': (np.array(times), np.array(intensities))
+    }
+    return {'status': 'success', 'data': DualChartService().build_dual_chart(context)}
+
+
+def build_streamlined_preview_payload(substances=50, samples=100):
+    """Shape of the /api/streamlined-calculate preview rows"""
+    columns = [f"PH-HC_{5701 + i}" for i in range(samples)]
+    rows = []
+    for s in range(substances):
+        row = {'Substance': f"AcylCarnitine {s}:0"}
+        row.update({col: random.uniform(0, 10) for col in columns})
+        rows.append(row)
+    return {'success': True, 'nist_data': rows, 'agilent_data': rows, 'column_order': ['Substance'] + columns}
+
+
+def build_calculation_details_payload():
+    """Shape of /api/calculation-details/<session_id>"""
+    step = {'formula': 'PH-HC Sample: Substance Area ÷ ISTD Area', 'calculation': '123456.0 ÷ 654321.0',
+            'result': 0.18867, 'description': 'Calculate ratio of substance to ISTD in PH-HC_5701',
+            'step_name': 'Calculate PH-HC Sample Ratio'}
+    return {'success': True, 'details': {
+        'substance': 'AcylCarnitine 10:0', 'sample': 'PH-HC_5701',
+        'source_data': {f"field_{i}": random.uniform(0, 1e6) for i in range(20)},
+        'calculations': {f"step_{i}": dict(step) for i in range(4)}
+    }}
+
+
+def run_case(client, path, encoding, repeats):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    timings = []
+    size = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        body = response.get_data()
+        timings.append(time.perf_counter() - start)
+        size = len(body)
+    timings.sort()
+    return size, timings[len(timings) // 2]
+
+
+def report(name, client, path, repeats, bandwidth_mbit):
+    encodings = [('identity', None), ('gzip', 'gzip')]
+    if BROTLI_AVAILABLE:
+        encodings.append(('br', 'br'))
+
+    baseline_size = None
+    baseline_total = None
+    for label, header in encodings:
+        size, server_time = run_case(client, path, header, repeats)
+        transfer = size * 8 / (bandwidth_mbit * 1_000_000)
+        total = server_time + transfer
+        if baseline_size is None:
+            baseline_size, baseline_total = size, total
+        print(f"  {name:<28} {label:<9} {size / 1024:>9.1f} KB  {size / baseline_size:>6.1%}  "
+              f"server {server_time * 1000:>7.2f} ms  total@{bandwidth_mbit}Mbit {total * 1000:>8.1f} ms  "
+              f"saved {max(0.0, baseline_total - total) * 1000:>7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark negotiated response compression")
+    parser.add_argument('--live', type=int, metavar='LIPID_ID', help="Benchmark the real app (needs DATABASE_URL)")
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--bandwidth', type=float, default=10.0, help="Client link speed in Mbit/s")
+    args = parser.parse_args()
+
+    print("📦 Response compression benchmark")
+    print(f"   Brotli available: {BROTLI_AVAILABLE}")
+
+    if args.live is not None:
+        from app import app
+        client = app.test_client()
+        cases = [('/api/load-lipids', '/api/load-lipids'),
+                 ('/api/dual-chart-data', f'/api/dual-chart-data/{args.live}')]
+    else:
+        random.seed(7)
+        bench_app = Flask(__name__)
+        ResponseCompressor(bench_app)
+        payloads = {
+            'load-lipids': build_load_lipids_payload(),
+            'dual-chart-data': build_dual_chart_payload(),
+            'streamlined-preview': build_streamlined_preview_payload(),
+            'calculation-details': build_calculation_details_payload(),
+        }
+        for key, payload in payloads.items():
+            bench_app.add_url_rule(f'/{key}', key, (lambda p=payload: jsonify(p)))
+        client = bench_app.test_client()
+        cases = [(key, f'/{key}') for key in payloads]
+
+    for name, path in cases:
+        report(name, client, path, args.repeats, args.bandwidth)
+
+
+if __name__ == '__main__':
+    main()
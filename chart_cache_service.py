@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+CHART CACHE SERVICE
+Serialized dual chart payloads kept in process memory, keyed by lipid ID, the
+version of its chart inputs (OptimizedDataManager.get_chart_versions),
+max_points and wire format. A payload is a pure function of that key, so the
+key hash doubles as a strong ETag and nothing needs invalidating: edits change
+the version and superseded entries age out of the LRU.
+A repeat visit costs the version SELECT plus a dictionary lookup. The optional
+background prewarm builds the whole library after a deploy or bulk import;
+each worker process keeps (and warms) its own copy.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from json_provider import DEFAULT_NAN_POLICY, dumps_bytes
+from models import db, MainLipid, optimized_manager
+from dual_chart_service import DualChartService
+
+# Bump whenever DualChartService output changes for the same inputs
+CHART_PAYLOAD_VERSION = 1
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024     # Serialized payloads per worker process
+DEFAULT_PREWARM_BATCH_SIZE = 50           # Lipids loaded per prewarm batch
+
+
+class ChartPayloadCache:
+    """Byte-bounded LRU of serialized chart payloads, plus a library prewarm thread"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, prewarm_batch_size=DEFAULT_PREWARM_BATCH_SIZE):
+        self.max_bytes = max_bytes
+        self.prewarm_batch_size = prewarm_batch_size
+        self._entries = OrderedDict()      # etag → serialized chart payload
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._prewarm_thread = None
+        self._prewarm_pid = None
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'not_modified': 0}
+        self.prewarm_stats = None
+
+    @staticmethod
+    def make_etag(lipid_id, version, max_points, wire_format='verbose'):
+        """Strong ETag of one chart payload: hash of everything the payload depends on"""
+        key = f"{CHART_PAYLOAD_VERSION}|{lipid_id}|{max_points}|{wire_format}|{version}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]
+
+    @staticmethod
+    def combine_etags(etags):
+        """ETag of a batch response from the ETags (or error markers) of its entries"""
+        return hashlib.sha1('|'.join(etags).encode('utf-8')).hexdigest()[:24]
+
+    # ------------------------------------------------------------------
+    # LRU
+    # ------------------------------------------------------------------
+
+    def get(self, etag):
+        with self._lock:
+            body = self._entries.get(etag)
+            if body is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.stats['hits'] += 1
+            return body
+
+    def put(self, etag, body, evict=True):
+        """Store a payload; with evict=False nothing is dropped and False means it did not fit"""
+        with self._lock:
+            if etag in self._entries:
+                return True
+            if len(body) > self.max_bytes or (not evict and self._bytes + len(body) > self.max_bytes):
+                return False
+            self._entries[etag] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.stats['evictions'] += 1
+            return True
+
+    def contains(self, etag):
+        with self._lock:
+            return etag in self._entries
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def record_not_modified(self):
+        with self._lock:
+            self.stats['not_modified'] += 1
+
+    # ------------------------------------------------------------------
+    # Chart payloads
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _build(context, max_points, wire_format):
+        payload = DualChartService().build_dual_chart(context, max_points=max_points, wire_format=wire_format)
+        return dumps_bytes(payload, current_app.config.get('JSON_NAN_POLICY', DEFAULT_NAN_POLICY))
+
+    def get_chart(self, lipid_id, version, max_points, wire_format='verbose'):
+        """(etag, serialized chart payload) for one lipid, built and cached on a miss"""
+        etag = self.make_etag(lipid_id, version, max_points, wire_format)
+        body = self.get(etag)
+        if body is None:
+            context = optimized_manager.get_lipid_chart_data_optimized(lipid_id)
+            if not context:
+                raise ValueError(f"Error generating dual chart data: Lipid with ID {lipid_id} not found")
+            body = self._build(context, max_points, wire_format)
+            self.put(etag, body)
+        return etag, body
+
+    def get_charts(self, lipid_ids, versions, max_points, wire_format='verbose'):
+        """
+        Batch entries in request order: (lipid_id, etag, payload) or (lipid_id, None, error message).
+        Only lipids without a cached payload are loaded (in one batch) and built.
+        """
+        entries = {}
+        missing = {}
+        for lipid_id in lipid_ids:
+            if lipid_id in entries or lipid_id in missing:
+                continue
+            if lipid_id not in versions:
+                entries[lipid_id] = (None, f"Lipid with ID {lipid_id} not found")
+                continue
+            etag = self.make_etag(lipid_id, versions[lipid_id], max_points, wire_format)
+            body = self.get(etag)
+            if body is None:
+                missing[lipid_id] = etag
+            else:
+                entries[lipid_id] = (etag, body)
+
+        if missing:
+            contexts = optimized_manager.get_lipids_chart_data_optimized(list(missing))
+            for lipid_id, etag in missing.items():
+                context = contexts.get(lipid_id)
+                if not context:
+                    entries[lipid_id] = (None, f"Lipid with ID {lipid_id} not found")
+                    continue
+                try:
+                    body = self._build(context, max_points, wire_format)
+                except ValueError as e:
+                    entries[lipid_id] = (None, str(e))
+                    continue
+                self.put(etag, body)
+                entries[lipid_id] = (etag, body)
+
+        return [(lipid_id, *entries[lipid_id]) for lipid_id in lipid_ids]
+
+    # ------------------------------------------------------------------
+    # Background prewarm
+    # ------------------------------------------------------------------
+
+    def prewarm(self, max_points, wire_format='verbose'):
+        """
+        Build and cache every lipid's payload, in keyset batches of lipid IDs (needs an app context).
+        Stops early on stop_prewarm() or once the byte budget is full: prewarm never evicts.
+        """
+        stats = {'started': time.time(), 'finished': None, 'max_points': max_points, 'wire_format': wire_format,
+                 'built': 0, 'already_cached': 0, 'skipped': 0, 'stopped_reason': 'stopped'}
+        self.prewarm_stats = stats
+        last_id = None
+        try:
+            while not self._stop_event.is_set():
+                query = db.session.query(MainLipid.lipid_id).order_by(MainLipid.lipid_id)
+                if last_id is not None:
+                    query = query.filter(MainLipid.lipid_id > last_id)
+                lipid_ids = [lipid_id for (lipid_id,) in query.limit(self.prewarm_batch_size)]
+                if not lipid_ids:
+                    stats['stopped_reason'] = 'complete'
+                    break
+                last_id = lipid_ids[-1]
+
+                todo = {}
+                for lipid_id, version in optimized_manager.get_chart_versions(lipid_ids).items():
+                    etag = self.make_etag(lipid_id, version, max_points, wire_format)
+                    if self.contains(etag):
+                        stats['already_cached'] += 1
+                    else:
+                        todo[lipid_id] = etag
+                contexts = optimized_manager.get_lipids_chart_data_optimized(list(todo)) if todo else {}
+                for lipid_id, etag in todo.items():
+                    try:
+                        body = self._build(contexts[lipid_id], max_points, wire_format)
+                    except (KeyError, ValueError):
+                        stats['skipped'] += 1   # Deleted meanwhile, or no XIC trace
+                        continue
+                    if not self.put(etag, body, evict=False):
+                        stats['stopped_reason'] = 'byte budget full'
+                        return stats
+                    stats['built'] += 1
+                # Do not hold the batch's ORM objects across batches
+                db.session.remove()
+        except Exception as e:
+            stats['stopped_reason'] = f"error: {e}"
+            print(f"⚠️ Chart cache prewarm error: {e}")
+        finally:
+            db.session.remove()
+            stats['finished'] = time.time()
+            print(f"✅ Chart cache prewarm {stats['stopped_reason']}: {stats['built']} built, "
+                  f"{stats['already_cached']} already cached, {stats['skipped']} skipped "
+                  f"in {stats['finished'] - stats['started']:.1f}s")
+        return stats
+
+    def start_prewarm(self, app, max_points, wire_format='verbose'):
+        """Run prewarm() in a daemon thread of this process; no-op while one is running"""
+        with self._lock:
+            if self._prewarm_thread and self._prewarm_thread.is_alive() and self._prewarm_pid == os.getpid():
+                return False
+            self._stop_event.clear()
+
+            def run():
+                with app.app_context():
+                    self.prewarm(max_points, wire_format)
+
+            self._prewarm_thread = threading.Thread(target=run, name='chart-cache-prewarm', daemon=True)
+            self._prewarm_pid = os.getpid()
+            self._prewarm_thread.start()
+            return True
+
+    def ensure_prewarm(self, app, max_points, wire_format='verbose'):
+        """Start the prewarm once per process (gunicorn workers are forked after import)"""
+        if self._prewarm_pid != os.getpid():
+            self.start_prewarm(app, max_points, wire_format)
+
+    def stop_prewarm(self):
+        self._stop_event.set()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({'entries': len(self._entries), 'bytes': self._bytes})
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'hit_rate': round(stats['hits'] / lookups, 3) if lookups else None,
+            'max_bytes': self.max_bytes,
+            'payload_version': CHART_PAYLOAD_VERSION,
+            'prewarm_running': bool(self._prewarm_thread and self._prewarm_thread.is_alive()
+                                    and self._prewarm_pid == os.getpid()),
+            'prewarm': dict(self.prewarm_stats) if self.prewarm_stats else None,
+        })
+        return stats
+
+
+# Global instance
+chart_payload_cache = ChartPayloadCache(
+    max_bytes=int(os.getenv('CHART_CACHE_MB', DEFAULT_MAX_BYTES // (1024 * 1024))) * 1024 * 1024,
+)
@@ -4,9 +4,16 @@ Shows both Chart 1 (focused RT±0.6) and Chart 2 (full 0-16 min overview)
 with annotated ions displayed ON the charts and proper mouse hover information
 """
 
+import base64
 import json
 import math
+from types import SimpleNamespace
 from typing import Dict, List, Optional, Tuple, Any
+
+import numpy as np
+
+from xic_storage import widen
+
 # Import compatibility - works with both PostgreSQL and SQLite
 try:
     # Try PostgreSQL optimized models first
@@ -18,6 +25,128 @@ except ImportError:
     optimized_manager = fast_db
     print("✅ Using SQLite models for dual charts")
 
+def minmax_downsample_indices(times: np.ndarray, values: np.ndarray, max_points: int,
+                              preserve: List[Tuple[float, float]] = ()) -> np.ndarray:
+    """
+    Indices of a min/max-preserving downsample of a trace to about max_points.
+    The trace is cut into max_points/2 equal-count buckets and each bucket keeps its
+    lowest and highest point (so no peak apex is ever dropped), plus the first and
+    last point. Every point inside a `preserve` (start, end) time window is kept as is.
+    """
+    count = len(values)
+    if not max_points or count <= max_points:
+        return np.arange(count)
+
+    bucket_size = -(-count // max(max_points // 2, 1))
+    padded = np.full(-(-count // bucket_size) * bucket_size, np.nan)
+    padded[:count] = values
+    buckets = padded.reshape(-1, bucket_size)
+    offsets = np.arange(len(buckets)) * bucket_size
+    keep = np.zeros(count, dtype=bool)
+    keep[offsets + np.nanargmin(buckets, axis=1)] = True
+    keep[offsets + np.nanargmax(buckets, axis=1)] = True
+    keep[[0, count - 1]] = True
+
+    if len(preserve):
+        # Coverage count per point from +1/-1 marks at each window's bounds
+        starts, ends = np.asarray(preserve, dtype=np.float64).T
+        marks = np.zeros(count + 1, dtype=np.int32)
+        np.add.at(marks, np.searchsorted(times, starts, side='left'), 1)
+        np.add.at(marks, np.searchsorted(times, ends, side='right'), -1)
+        keep |= np.cumsum(marks[:-1]) > 0
+    return np.flatnonzero(keep)
+
+# Response formats of build_dual_chart: verbose Chart.js objects, or the columnar form of compact_chart_payload
+CHART_WIRE_FORMATS = ('verbose', 'compact', 'compact-f32')
+
+# Dataset keys that are per-dataset content; every other key is styling shared through the style table
+_DATASET_CONTENT_KEYS = ('label', 'data', 'lipid_info', 'ion_info', 'integration_range')
+
+def _encode_column(values: List[float], binary: bool):
+    """Numeric column as a JSON array, or as base64 little-endian float32"""
+    if binary:
+        return base64.b64encode(np.asarray(values, dtype='<f4').tobytes()).decode('ascii')
+    return values
+
+def _decode_column(column) -> List[float]:
+    if isinstance(column, str):
+        return widen(np.frombuffer(base64.b64decode(column), dtype='<f4')).tolist()
+    return column
+
+def _format_minutes(value) -> str:
+    return f"{float(value):.2f} minutes" if value else "N/A"
+
+def _format_mass(value) -> str:
+    return f"{value} m/z" if value else "N/A"
+
+def compact_chart_payload(payload: Dict[str, Any], binary: bool = False) -> Dict[str, Any]:
+    """
+    Columnar wire form of a build_dual_chart(..., wire_format='compact') payload:
+      - points as parallel 'x' / 'y' arrays instead of one {'x', 'y'} object per point
+        (base64 float32 with binary=True, read back to 7 significant digits like xic_blob)
+      - styling keys in a shared 'styles' table, referenced by index from each dataset
+      - integration area hover info as raw values in a shared 'area_info' table
+        (formatted into strings by the client, not per dataset on the server)
+    expand_chart_payload, and expandCompactChart in dual_chart_view.html, restore the verbose payload.
+    """
+    styles, style_ids = [], {}
+    area_info, area_info_ids = [], {}
+
+    def table_index(table, ids, entry):
+        key = json.dumps(entry, sort_keys=True)
+        if key not in ids:
+            ids[key] = len(table)
+            table.append(entry)
+        return ids[key]
+
+    def compact_dataset(dataset):
+        style = {key: value for key, value in dataset.items() if key not in _DATASET_CONTENT_KEYS}
+        compact = {
+            'label': dataset['label'],
+            'style': table_index(styles, style_ids, style),
+            'x': _encode_column([point['x'] for point in dataset['data']], binary),
+            'y': _encode_column([point['y'] for point in dataset['data']], binary),
+        }
+        if 'ion_info' in dataset:
+            compact['info'] = table_index(area_info, area_info_ids, dataset['ion_info'])
+        return compact
+
+    compact = dict(payload)
+    for chart_key in ('chart1', 'chart2'):
+        chart = dict(payload[chart_key])
+        chart['data'] = {'datasets': [compact_dataset(dataset) for dataset in chart['data']['datasets']]}
+        compact[chart_key] = chart
+    compact.update({'format': 'compact-f32' if binary else 'compact', 'styles': styles, 'area_info': area_info})
+    return compact
+
+def expand_chart_payload(compact: Dict[str, Any]) -> Dict[str, Any]:
+    """Verbose payload (as build_dual_chart returns by default) from compact_chart_payload output"""
+    def expand_dataset(dataset):
+        expanded = {'label': dataset['label'],
+                    'data': [{'x': x, 'y': y} for x, y in zip(_decode_column(dataset['x']), _decode_column(dataset['y']))]}
+        expanded.update(compact['styles'][dataset['style']])
+        if 'info' in dataset:
+            info = compact['area_info'][dataset['info']]
+            expanded['lipid_info'] = {
+                'lipid_name': info['lipid_name'],
+                'lipid_class': info['lipid_class'],
+                'retention_time': _format_minutes(info['retention_time']),
+                'integration_start': _format_minutes(info['integration_start']),
+                'integration_end': _format_minutes(info['integration_end']),
+                'precursor_mass': _format_mass(info['precursor_ion']),
+                'product_mass': _format_mass(info['product_ion']),
+                'annotation': info['annotation']
+            }
+            expanded['integration_range'] = {'start': info['integration_start'], 'end': info['integration_end']}
+        return expanded
+
+    payload = {key: value for key, value in compact.items() if key not in ('format', 'styles', 'area_info')}
+    for chart_key in ('chart1', 'chart2'):
+        chart = dict(compact[chart_key])
+        chart['data'] = {'datasets': [expand_dataset(dataset) for dataset in chart['data']['datasets']]}
+        payload[chart_key] = chart
+    return payload
+
 class DualChartService:
     """
     Dual chart service for interactive charts with annotated ions.
@@ -36,68 +165,68 @@ class DualChartService:
         # Integration area color (light blue like reference)
         self.integration_color = 'rgba(31, 119, 180, 0.3)'
     
-    def get_dual_chart_data(self, lipid_id: int) -> Dict[str, Any]:
+    def get_dual_chart_data(self, lipid_id: int, max_points: Optional[int] = None,
+                            wire_format: str = 'verbose') -> Dict[str, Any]:
         """
         Get dual chart data for a specific lipid.
         Returns both Chart 1 (focused) and Chart 2 (overview) with annotated ions.
+        max_points caps each chromatogram line (min/max-preserving downsample); None ships every point.
         """
-        try:
-            # Get lipid with annotated ions using optimized data access
-            chart_data = optimized_manager.get_lipid_chart_data_optimized(lipid_id)
+        # Get lipid with annotated ions using optimized data access
+        chart_data = optimized_manager.get_lipid_chart_data_optimized(lipid_id)
+        if not chart_data:
+            raise ValueError(f"Error generating dual chart data: Lipid with ID {lipid_id} not found")
+        return self.build_dual_chart(chart_data, max_points=max_points, wire_format=wire_format)
+    
+    def get_dual_chart_data_batch(self, lipid_ids: List[int], max_points: Optional[int] = None,
+                                  wire_format: str = 'verbose') -> List[Dict[str, Any]]:
+        """
+        Dual charts for several lipids from one batched load, in request order.
+        Each entry is {'lipid_id', 'status': 'success', 'data'} or {'lipid_id', 'status': 'error', 'message'}.
+        """
+        chart_data_by_id = optimized_manager.get_lipids_chart_data_optimized(lipid_ids)
+        
+        results = []
+        for lipid_id in lipid_ids:
+            chart_data = chart_data_by_id.get(lipid_id)
             if not chart_data:
-                raise ValueError(f"Lipid with ID {lipid_id} not found")
-            
+                results.append({'lipid_id': lipid_id, 'status': 'error',
+                                'message': f"Lipid with ID {lipid_id} not found"})
+                continue
+            try:
+                results.append({'lipid_id': lipid_id, 'status': 'success',
+                                'data': self.build_dual_chart(chart_data, max_points=max_points,
+                                                              wire_format=wire_format)})
+            except ValueError as e:
+                results.append({'lipid_id': lipid_id, 'status': 'error', 'message': str(e)})
+        return results
+    
+    def build_dual_chart(self, chart_data: Dict[str, Any], max_points: Optional[int] = None,
+                         wire_format: str = 'verbose') -> Dict[str, Any]:
+        """
+        Chart 1 + Chart 2 payload from a preloaded lipid context, as returned by
+        get_lipid_chart_data_optimized: lipid_info (incl. class_name), annotated_ions, xic_arrays.
+        Everything the charts need is in the context; building never touches the database.
+        wire_format 'compact' / 'compact-f32' returns the columnar form (see compact_chart_payload).
+        """
+        if wire_format not in CHART_WIRE_FORMATS:
+            raise ValueError(f"Unknown chart format: {wire_format}")
+        compact = wire_format != 'verbose'
+        try:
             lipid_info = chart_data['lipid_info']
             annotated_ions_data = chart_data['annotated_ions']
-            xic_data = chart_data['xic_data']
+            times, intensities = chart_data['xic_arrays']
             
-            if not xic_data:
+            if not times.size:
                 raise ValueError(f"No XIC data found for lipid {lipid_info['lipid_name']}")
             
-            # Parse XIC data with error handling
-            time_points = []
-            intensity_points = []
-            
-            # Handle XIC data from Railway (now matches web-lipid2 format exactly)
-            if isinstance(xic_data, list):
-                # Railway JSON parsed to list - exact format from web-lipid2
-                for point in xic_data:
-                    if isinstance(point, dict) and 'time' in point and 'intensity' in point:
-                        try:
-                            time_val = float(point['time'])
-                            intensity_val = float(point['intensity'])
-                            if not (math.isnan(time_val) or math.isnan(intensity_val)):
-                                time_points.append(time_val)
-                                intensity_points.append(intensity_val)
-                        except (ValueError, TypeError):
-                            continue
-            elif isinstance(xic_data, str):
-                # String format - parse as JSON to get list
-                try:
-                    parsed_json = json.loads(xic_data)
-                    if isinstance(parsed_json, list):
-                        for point in parsed_json:
-                            if isinstance(point, dict) and 'time' in point and 'intensity' in point:
-                                try:
-                                    time_val = float(point['time'])
-                                    intensity_val = float(point['intensity'])
-                                    if not (math.isnan(time_val) or math.isnan(intensity_val)):
-                                        time_points.append(time_val)
-                                        intensity_points.append(intensity_val)
-                                except (ValueError, TypeError):
-                                    continue
-                except (json.JSONDecodeError, ValueError) as e:
-                    print(f"WARNING: JSON parsing error for {lipid_info['lipid_name']}: {e}")
-            
-            if not time_points:
-                raise ValueError("No valid XIC data points found")
-            
-            
-            # Convert annotated ions data to objects for compatibility
-            annotated_ions = []
-            for ion_data in annotated_ions_data:
-                ion_obj = type('AnnotatedIon', (), ion_data)()
-                annotated_ions.append(ion_obj)
+            # Windowing below uses searchsorted, which needs ascending times
+            if np.any(np.diff(times) < 0):
+                order = np.argsort(times, kind='stable')
+                times, intensities = times[order], intensities[order]
+            
+            # Attribute access over the preloaded ion dicts (no ORM objects, no lazy loads)
+            annotated_ions = [SimpleNamespace(**ion_data) for ion_data in annotated_ions_data]
             
             # Find main lipid retention time for Chart 1 range
             main_retention_time = lipid_info.get('retention_time')
@@ -113,17 +242,24 @@ class DualChartService:
             chart1_end = float(main_retention_time) + 0.6
             
             # Create both charts (no titles)
+            class_name = lipid_info.get('class_name', 'Unknown')
             chart1_config = self._create_chart_config(
-                time_points, intensity_points, annotated_ions, 
+                times, intensities, annotated_ions, 
                 chart1_start, chart1_end, 
-                ""  # No title
+                "",  # No title
+                class_name=class_name,
+                max_points=max_points,
+                raw_info=compact
             )
             
             chart2_config = self._create_chart_config(
-                time_points, intensity_points, annotated_ions,
+                times, intensities, annotated_ions,
                 0.0, 16.0, 
                 "",  # No title
-                force_x_range=True  # Force exact 0-16 range for Chart 2
+                force_x_range=True,  # Force exact 0-16 range for Chart 2
+                class_name=class_name,
+                max_points=max_points,
+                raw_info=compact
             )
             
             # Prepare result
@@ -143,29 +279,33 @@ class DualChartService:
                 'annotated_ions': [self._format_ion_data(ion) for ion in annotated_ions]
             }
             
-            return result
+            return compact_chart_payload(result, binary=wire_format == 'compact-f32') if compact else result
             
         except Exception as e:
             import traceback
             print(f"FULL ERROR: {traceback.format_exc()}")
             raise ValueError(f"Error generating dual chart data: {str(e)}")
     
-    def _get_parent_lipid(self, ion):
-        """Get the parent lipid object for extracting class information."""
-        try:
-            # For optimized compatibility, return a simple object with class info
-            if hasattr(ion, 'main_lipid_id'):
-                chart_data = optimized_manager.get_lipid_chart_data_optimized(ion.main_lipid_id)
-                if chart_data:
-                    class_info = type('LipidClass', (), {'class_name': chart_data['lipid_info'].get('class_name', 'Unknown')})()
-                    parent = type('MainLipid', (), {'lipid_class': class_info})()
-                    return parent
-            return None
-        except Exception:
-            return None
+    @staticmethod
+    def _window(times: np.ndarray, start: float, end: float) -> slice:
+        """Slice of the (ascending) trace with start <= time <= end"""
+        return slice(int(np.searchsorted(times, start, side='left')),
+                     int(np.searchsorted(times, end, side='right')))
+    
+    @staticmethod
+    def _nearest_indices(times: np.ndarray, targets) -> np.ndarray:
+        """Index of the trace point closest to each target time (earlier point on ties)"""
+        targets = np.asarray(targets, dtype=np.float64)
+        if len(times) < 2:
+            return np.zeros(targets.shape, dtype=np.intp)
+        right = np.clip(np.searchsorted(times, targets), 1, len(times) - 1)
+        left = right - 1
+        return np.where(targets - times[left] <= times[right] - targets, left, right)
     
-    def _create_chart_config(self, time_points: List[float], intensity_points: List[float], 
-                           annotated_ions: List, x_min: float, x_max: float, title: str, force_x_range: bool = False) -> Dict:
+    def _create_chart_config(self, times: np.ndarray, intensities: np.ndarray, 
+                           annotated_ions: List, x_min: float, x_max: float, title: str, force_x_range: bool = False,
+                           class_name: str = 'Unknown', max_points: Optional[int] = None,
+                           raw_info: bool = False) -> Dict:
         """
         Create Chart.js configuration for a single chart with proper hover and annotations.
         
@@ -177,19 +317,22 @@ class DualChartService:
         """
         
         # Filter data to chart range
-        filtered_data = []
-        filtered_intensities = []
-        
-        for i, time in enumerate(time_points):
-            if x_min <= time <= x_max:
-                filtered_data.append({'x': time, 'y': intensity_points[i]})
-                filtered_intensities.append(intensity_points[i])
+        window = self._window(times, x_min, x_max)
+        filtered_times, filtered_intensities = times[window], intensities[window]
         
+        # Downsample the line for the canvas; integration windows keep every point so shaded areas match it
+        keep = minmax_downsample_indices(
+            filtered_times, filtered_intensities, max_points,
+            preserve=[(float(ion.int_start), float(ion.int_end)) for ion in annotated_ions
+                      if ion.int_start and ion.int_end]
+        )
+        filtered_data = [{'x': time, 'y': intensity}
+                         for time, intensity in zip(filtered_times[keep].tolist(), filtered_intensities[keep].tolist())]
         
         # Calculate optimized Y-axis range - ALWAYS start from 0
-        if filtered_intensities:
-            min_intensity = min(filtered_intensities)
-            max_intensity = max(filtered_intensities)
+        if filtered_intensities.size:
+            min_intensity = float(filtered_intensities.min())
+            max_intensity = float(filtered_intensities.max())
             
             
             # Y-axis ALWAYS starts from 0 (as requested)
@@ -345,9 +488,9 @@ class DualChartService:
                     if should_add_ion:
                         # Add INDIVIDUAL integration area with SPECIFIC hover info for THIS ion only
                         integration_area = self._create_integration_area(
-                            time_points, intensity_points, 
+                            times, intensities, 
                             float(ion.int_start), float(ion.int_end),
-                            ion, x_min, x_max, self._get_parent_lipid(ion), idx
+                            ion, x_min, x_max, class_name, idx, raw_info=raw_info
                         )
                         if integration_area:
                             datasets.append(integration_area)
@@ -444,27 +587,22 @@ class DualChartService:
         
         return config
     
-    def _create_integration_area(self, time_points: List[float], intensity_points: List[float], 
-                               int_start: float, int_end: float, ion, x_min: float, x_max: float, parent_lipid=None, ion_idx=0) -> Optional[Dict]:
+    def _create_integration_area(self, times: np.ndarray, intensities: np.ndarray, 
+                               int_start: float, int_end: float, ion, x_min: float, x_max: float,
+                               class_name: str = 'Unknown', ion_idx=0, raw_info: bool = False) -> Optional[Dict]:
         """
         Create integration area dataset for an annotated ion.
+        With raw_info the hover info is kept as raw values ('ion_info') for compact_chart_payload.
         """
         try:
             # Get annotation color
             color = self.annotation_colors.get(ion.annotation_type, self.annotation_colors['Default'])
             
-            # Find data points within integration window
-            integration_data = []
-            
-            # Add starting point at baseline
-            integration_data.append({'x': int_start, 'y': 0})
-            
-            # Add actual data points within integration window
-            for i, time in enumerate(time_points):
-                if int_start <= time <= int_end:
-                    integration_data.append({'x': time, 'y': intensity_points[i]})
-            
-            # Add ending point at baseline
+            # Baseline start, data points within the integration window, baseline end
+            window = self._window(times, int_start, int_end)
+            integration_data = [{'x': int_start, 'y': 0}]
+            integration_data.extend({'x': time, 'y': intensity}
+                                    for time, intensity in zip(times[window].tolist(), intensities[window].tolist()))
             integration_data.append({'x': int_end, 'y': 0})
             
             if len(integration_data) < 3:  # Need at least start, some data, end
@@ -482,7 +620,7 @@ class DualChartService:
             else:
                 light_fill = "rgba(64, 224, 208, 0.12)"  # Default very light turquoise
             
-            return {
+            area = {
                 'label': f"{ion.ion_lipid_name}_area",  # UNIQUE label for each integration area
                 'data': integration_data,
                 'borderColor': color,
@@ -496,37 +634,51 @@ class DualChartService:
                 'pointBorderColor': 'transparent',      # Invisible borders
                 'tension': 0,        # No smoothing for accurate area representation
                 'order': 1,  # Draw on top of main line
-                # Store INDIVIDUAL lipid info for THIS SPECIFIC integration area only
-                'lipid_info': {
+            }
+            if raw_info:
+                # Formatted (and integration_range derived) on the client
+                area['ion_info'] = {
                     'lipid_name': ion.ion_lipid_name,
-                    'lipid_class': parent_lipid.lipid_class.class_name if parent_lipid and parent_lipid.lipid_class else 'Unknown',
-                    'retention_time': f"{float(ion.retention_time):.2f} minutes" if ion.retention_time else "N/A",
-                    'integration_start': f"{float(ion.int_start):.2f} minutes" if ion.int_start else "N/A", 
-                    'integration_end': f"{float(ion.int_end):.2f} minutes" if ion.int_end else "N/A",
-                    'precursor_mass': f"{ion.precursor_ion} m/z" if ion.precursor_ion else "N/A",
-                    'product_mass': f"{ion.product_ion} m/z" if ion.product_ion else "N/A",
+                    'lipid_class': class_name or 'Unknown',
+                    'retention_time': float(ion.retention_time) if ion.retention_time else None,
+                    'integration_start': float(ion.int_start),
+                    'integration_end': float(ion.int_end),
+                    'precursor_ion': ion.precursor_ion or None,
+                    'product_ion': ion.product_ion or None,
                     'annotation': ion.annotation_type or "Similar MRM"
-                },
-                # Store the integration time range for precise hover detection
-                'integration_range': {
-                    'start': float(ion.int_start),
-                    'end': float(ion.int_end)
                 }
+                return area
+            
+            # Store INDIVIDUAL lipid info for THIS SPECIFIC integration area only
+            area['lipid_info'] = {
+                'lipid_name': ion.ion_lipid_name,
+                'lipid_class': class_name or 'Unknown',
+                'retention_time': _format_minutes(ion.retention_time),
+                'integration_start': _format_minutes(ion.int_start),
+                'integration_end': _format_minutes(ion.int_end),
+                'precursor_mass': _format_mass(ion.precursor_ion),
+                'product_mass': _format_mass(ion.product_ion),
+                'annotation': ion.annotation_type or "Similar MRM"
+            }
+            # Store the integration time range for precise hover detection
+            area['integration_range'] = {
+                'start': float(ion.int_start),
+                'end': float(ion.int_end)
             }
+            return area
             
         except Exception as e:
             print(f"Warning: Could not create integration area for {ion.ion_lipid_name}: {e}")
             return None
     
-    def _create_annotation_point(self, time_points: List[float], intensity_points: List[float], ion) -> Optional[Dict]:
+    def _create_annotation_point(self, times: np.ndarray, intensities: np.ndarray, ion) -> Optional[Dict]:
         """
         Create annotation point at peak maximum for hover information.
         """
         try:
             # Find intensity at retention time
             rt = float(ion.retention_time)
-            closest_idx = min(range(len(time_points)), key=lambda i: abs(time_points[i] - rt))
-            peak_intensity = intensity_points[closest_idx]
+            peak_intensity = float(intensities[self._nearest_indices(times, rt)])
             
             color = self.annotation_colors.get(ion.annotation_type, self.annotation_colors['Default'])
             
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Bulk import of a lipid library (main lipids, annotated ions, XIC traces),
+see lipid_import_service.py for the accepted file layouts.
+
+Validates records chunk by chunk and writes each chunk in one transaction of
+batched inserts/updates, upserting on lipid name (lipids) and on lipid + ion
+name + annotation type (ions), so re-running a library updates it in place.
+Invalid rows are reported and skipped. Run migrate_peak_areas.py afterwards to
+integrate the imported windows.
+
+Usage:
+  python import_lipid_library.py lipids.csv --ions ions.csv --xic-dir traces/
+  python import_lipid_library.py library.jsonl --prune-ions
+  python import_lipid_library.py library.xlsx --dry-run       # validate only
+"""
+
+import argparse
+import os
+import sys
+
+from sqlalchemy import create_engine
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def run_import():
+    """Validate and load a lipid library in chunked transactions"""
+    from lipid_import_service import DEFAULT_CHUNK_SIZE, LipidImportService
+
+    parser = argparse.ArgumentParser(description="Bulk import a lipid library with annotated ions and XIC traces")
+    parser.add_argument('library', help="Lipids: CSV/TSV, Excel, Parquet, JSON or JSON Lines")
+    parser.add_argument('--ions', help="Separate annotated ion table (linked by lipid_name)")
+    parser.add_argument('--xic-dir', help="Directory of xic_file paths (default: the library's directory)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Records per transaction")
+    parser.add_argument('--prune-ions', action='store_true',
+                        help="Delete stored ions of imported lipids that the files no longer list")
+    parser.add_argument('--dry-run', action='store_true', help="Validate only, write nothing")
+    args = parser.parse_args()
+
+    try:
+        DATABASE_URL = os.getenv('DATABASE_URL')
+        if not DATABASE_URL:
+            print("❌ Error: DATABASE_URL not found in environment variables")
+            sys.exit(1)
+        if DATABASE_URL.startswith('postgres://'):
+            DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+        for path in filter(None, (args.library, args.ions)):
+            if not os.path.exists(path):
+                print(f"❌ Error: file not found: {path}")
+                sys.exit(1)
+
+        engine = create_engine(DATABASE_URL)
+        service = LipidImportService(chunk_size=args.chunk_size)
+
+        def progress(stats):
+            print(f"   … {stats['rows']} rows ({stats['invalid']} invalid): "
+                  f"{stats['lipids_inserted'] + stats['lipids_updated']} lipids, "
+                  f"{stats['ions_inserted'] + stats['ions_updated']} ions")
+
+        print(f"🚀 {'Validating' if args.dry_run else 'Importing'} lipid library {args.library}...")
+        stats = service.import_library(engine, args.library, ions_path=args.ions, xic_dir=args.xic_dir,
+                                       prune_ions=args.prune_ions, dry_run=args.dry_run, progress=progress)
+
+        for error in stats['errors']:
+            print(f"⚠️ Row {error['row']}: {error['error']}")
+        if stats['invalid'] > len(stats['errors']):
+            print(f"⚠️ … and {stats['invalid'] - len(stats['errors'])} more invalid rows")
+
+        if args.dry_run:
+            print(f"\n✅ Validation finished: {stats['rows'] - stats['invalid']} valid rows, "
+                  f"{stats['invalid']} invalid in {stats['seconds']:.1f}s")
+        else:
+            print(f"\n✅ Import finished in {stats['seconds']:.1f}s")
+            print(f"📊 Lipids: {stats['lipids_inserted']} inserted, {stats['lipids_updated']} updated "
+                  f"({stats['traces']} XIC traces, {stats['classes_inserted']} new classes)")
+            print(f"🧪 Ions: {stats['ions_inserted']} inserted, {stats['ions_updated']} updated, "
+                  f"{stats['ions_pruned']} pruned")
+            print(f"⚠️ Invalid rows skipped: {stats['invalid']}" if stats['invalid'] else "✅ No invalid rows")
+
+    except Exception as e:
+        print(f"\n❌ Import failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_import()
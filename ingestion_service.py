@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+INGESTION SERVICE
+Format detection and pluggable readers for area-compound input files.
+xlsx/xls go through pandas (calamine when installed, openpyxl otherwise),
+CSV/TSV through the pandas C parser (the preamble preview through the csv
+module, which tolerates ragged rows) and Parquet/Arrow through pyarrow.
+Every backend feeds the same PH-HC/NIST header detection, so the calculator
+sees an identical DataFrame whatever the instrument exported.
+"""
+
+import csv
+import io
+import os
+import re
+from itertools import islice
+
+import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401 - only needed by pandas' calamine engine
+    _major, _minor = (int(part) for part in pd.__version__.split('.')[:2])
+    CALAMINE_AVAILABLE = (_major, _minor) >= (2, 2)
+except ImportError:
+    CALAMINE_AVAILABLE = False
+
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Rows scanned for the header (PH-HC sample columns)
+HEADER_SCAN_ROWS = 15
+
+# Magic bytes at the start of binary formats
+MAGIC_SIGNATURES = (
+    (b'PK\x03\x04', 'xlsx'),                # Zip container (xlsx/xlsm)
+    (b'\xd0\xcf\x11\xe0', 'xls'),           # OLE2 compound document
+    (b'PAR1', 'parquet'),
+    (b'ARROW1', 'arrow'),
+)
+
+EXTENSION_FORMATS = {
+    '.xlsx': 'xlsx', '.xlsm': 'xlsx',
+    '.xls': 'xls',
+    '.csv': 'csv',
+    '.tsv': 'tsv', '.tab': 'tsv',
+    '.parquet': 'parquet', '.pq': 'parquet',
+    '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow',
+}
+
+SUPPORTED_EXTENSIONS = tuple(sorted(EXTENSION_FORMATS))
+
+
+class UnsupportedFormatError(ValueError):
+    """Raised when an input file cannot be read by any installed backend"""
+
+
+def _rewind(source):
+    """Reset file-like sources so every read starts at the first byte"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+
+def _read_head(source, size=2048):
+    """First bytes of a path or file-like source"""
+    if hasattr(source, 'read'):
+        _rewind(source)
+        head = source.read(size)
+        _rewind(source)
+        return head if isinstance(head, bytes) else head.encode('utf-8')
+    with open(source, 'rb') as handle:
+        return handle.read(size)
+
+
+def _sniff_delimiter(head):
+    """
+    Pick tab, semicolon or comma from the head of a text export.
+    Uses the line with the most delimiters, so a short preamble line
+    ("Batch report") does not decide the delimiter for the table below it.
+    """
+    lines = head.decode('utf-8', errors='ignore').splitlines() if head else []
+    counts = {delimiter: max((line.count(delimiter) for line in lines), default=0)
+              for delimiter in ('\t', ';', ',')}
+    best = max(counts, key=counts.get)
+    return best if counts[best] else ','
+
+
+_COMMA_DECIMAL = re.compile(r'^[-+]?\d+,\d+$')
+_POINT_DECIMAL = re.compile(r'^[-+]?\d+\.\d+$')
+_POINT_THOUSANDS = re.compile(r'^[-+]?\d{1,3}(\.\d{3})+(,\d+)?$')
+
+
+def _sniff_number_format(head, sep):
+    """
+    (decimal, thousands) marks of the numeric cells in a text export.
+    Only semicolon/tab exports can use decimal commas (European instrument
+    locales); the mark that occurs more often in the head wins.
+    """
+    if sep == ',':
+        return '.', None
+    cells = [cell.strip().strip('"') for line in head.decode('utf-8', errors='ignore').splitlines()
+             for cell in line.split(sep)]
+    comma = sum(1 for cell in cells if _COMMA_DECIMAL.match(cell))
+    point = sum(1 for cell in cells if _POINT_DECIMAL.match(cell))
+    if comma <= point:
+        return '.', None
+    return ',', '.' if any(_POINT_THOUSANDS.match(cell) for cell in cells) else None
+
+
+def detect_format(source, filename=None):
+    """
+    Detect the input format from the filename extension, falling back to magic bytes.
+    Returns one of: xlsx, xls, csv, tsv, parquet, arrow.
+    """
+    name = filename or (source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', None))
+    if isinstance(name, (str, os.PathLike)):
+        extension = os.path.splitext(str(name))[1].lower()
+        if extension in EXTENSION_FORMATS:
+            return EXTENSION_FORMATS[extension]
+
+    head = _read_head(source)
+    for signature, file_format in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return file_format
+    return 'tsv' if _sniff_delimiter(head) == '\t' else 'csv'
+
+
+class IngestionBackend:
+    """Reads one tabular format as a raw grid (for header detection) and as a table"""
+
+    name = 'base'
+    formats = ()
+
+    def is_available(self):
+        return True
+
+    def read_preview(self, source, nrows):
+        """First `nrows` rows with no header applied"""
+        raise NotImplementedError
+
+    def read_table(self, source, header_row):
+        """Full table using `header_row` as column names"""
+        raise NotImplementedError
+
+
+class ExcelBackend(IngestionBackend):
+    """xlsx/xls through pandas - calamine (Rust) when installed, openpyxl/xlrd otherwise"""
+
+    formats = ('xlsx', 'xls')
+
+    def __init__(self, engine=None):
+        self.engine = engine
+        self.name = f"excel:{engine or 'default'}"
+
+    def read_preview(self, source, nrows):
+        return pd.read_excel(_rewind(source), header=None, nrows=nrows, engine=self.engine)
+
+    def read_table(self, source, header_row):
+        return pd.read_excel(_rewind(source), header=header_row, engine=self.engine)
+
+
+class DelimitedBackend(IngestionBackend):
+    """CSV/TSV through the pandas C parser"""
+
+    ENCODINGS = ('utf-8-sig', 'latin-1')  # Instrument exports are UTF-8 (often with BOM) or Windows-1252
+
+    def __init__(self, file_format):
+        self.formats = (file_format,)
+        self.name = file_format
+        self.sep = '\t' if file_format == 'tsv' else None
+
+    def _read(self, source, **kwargs):
+        head = _read_head(source, size=16384)
+        sep = self.sep or _sniff_delimiter(head)
+        # Decimal-comma areas ("1200,5") would otherwise load as strings and clean to 0.0
+        decimal, thousands = _sniff_number_format(head, sep)
+        last_error = None
+        for encoding in self.ENCODINGS:
+            try:
+                return pd.read_csv(_rewind(source), sep=sep, engine='c', encoding=encoding,
+                                   decimal=decimal, thousands=thousands, **kwargs)
+            except UnicodeDecodeError as e:
+                last_error = e
+        raise last_error
+
+    def _preview_rows(self, source, sep, encoding, nrows):
+        """First `nrows` non-blank rows as lists of cells, however many fields each has"""
+        if not hasattr(source, 'read'):
+            with open(source, newline='', encoding=encoding) as handle:
+                return list(islice(filter(None, csv.reader(handle, delimiter=sep)), nrows))
+        _rewind(source)
+        if isinstance(source, io.TextIOBase):
+            return list(islice(filter(None, csv.reader(source, delimiter=sep)), nrows))
+        text = io.TextIOWrapper(source, encoding=encoding, newline='')
+        try:
+            return list(islice(filter(None, csv.reader(text, delimiter=sep)), nrows))
+        finally:
+            text.detach()  # Leave the caller's file open for read_table
+
+    def read_preview(self, source, nrows):
+        # Preamble lines above the header usually have fewer fields than the table,
+        # which the C parser rejects with header=None - pad rows to the widest one
+        sep = self.sep or _sniff_delimiter(_read_head(source))
+        last_error = None
+        for encoding in self.ENCODINGS:
+            try:
+                rows = self._preview_rows(source, sep, encoding, nrows)
+                break
+            except UnicodeDecodeError as e:
+                last_error = e
+        else:
+            raise last_error
+        width = max((len(row) for row in rows), default=0)
+        return pd.DataFrame([[cell if cell != '' else None for cell in row] + [None] * (width - len(row))
+                             for row in rows])
+
+    def read_table(self, source, header_row):
+        return self._read(source, header=header_row)
+
+
+class ArrowBackend(IngestionBackend):
+    """Parquet/Arrow IPC through pyarrow; stored column names form row 0 of the raw grid"""
+
+    def __init__(self, file_format):
+        self.formats = (file_format,)
+        self.name = file_format
+
+    def is_available(self):
+        return PYARROW_AVAILABLE
+
+    def _load(self, source):
+        if self.formats[0] == 'parquet':
+            return pd.read_parquet(_rewind(source))
+        return pd.read_feather(_rewind(source))
+
+    def _raw_grid(self, frame):
+        header = pd.DataFrame([list(frame.columns)])
+        body = pd.DataFrame(frame.to_numpy(dtype=object))
+        return pd.concat([header, body], ignore_index=True)
+
+    def read_preview(self, source, nrows):
+        return self._raw_grid(self._load(source)).head(nrows)
+
+    def read_table(self, source, header_row):
+        frame = self._load(source)
+        if header_row == 0:
+            return frame
+        # Header found inside the data - rebuild the table below it
+        grid = self._raw_grid(frame)
+        table = grid.iloc[header_row + 1:].reset_index(drop=True)
+        table.columns = [f"Unnamed: {idx}" if pd.isna(value) else value
+                         for idx, value in enumerate(grid.iloc[header_row].tolist())]
+        return table.infer_objects()
+
+
+def _default_backends():
+    xlsx_engine = 'calamine' if CALAMINE_AVAILABLE else None
+    return {
+        'xlsx': ExcelBackend(xlsx_engine),
+        'xls': ExcelBackend(xlsx_engine),
+        'csv': DelimitedBackend('csv'),
+        'tsv': DelimitedBackend('tsv'),
+        'parquet': ArrowBackend('parquet'),
+        'arrow': ArrowBackend('arrow'),
+    }
+
+
+def detect_header_row(raw_df, max_rows=HEADER_SCAN_ROWS):
+    """
+    Find the header row: the first row with at least 2 PH-HC sample columns.
+    Falls back to row 0 when none is found.
+    """
+    print("🔎 Analyzing potential header rows...")
+    for row_idx in range(min(max_rows, len(raw_df))):
+        row_values = [str(val) for val in raw_df.iloc[row_idx].tolist()]
+        ph_hc_count = sum(1 for val in row_values if 'PH-HC' in val)
+        nist_count = sum(1 for val in row_values if 'NIST' in val)
+
+        print(f"   Row {row_idx}: PH-HC columns={ph_hc_count}, NIST columns={nist_count}, First cell='{raw_df.iloc[row_idx, 0]}'")
+
+        # If this row has multiple PH-HC patterns, it's likely the header
+        if ph_hc_count >= 2:  # Need at least 2 PH-HC columns to be a proper header
+            print(f"✅ Detected header row at index {row_idx}, data starts at {row_idx + 1}")
+            return row_idx
+    return 0
+
+
+class IngestionService:
+    """Dispatch input files to the fastest installed reader for their format"""
+
+    def __init__(self, backends=None):
+        self.backends = backends or _default_backends()
+
+    def register_backend(self, file_format, backend):
+        """Override or add the reader for a format"""
+        self.backends[file_format] = backend
+
+    def get_backend(self, file_format):
+        backend = self.backends.get(file_format)
+        if backend is None:
+            raise UnsupportedFormatError(f"Unsupported input format '{file_format}'. "
+                                         f"Supported files: {', '.join(SUPPORTED_EXTENSIONS)}")
+        if not backend.is_available():
+            raise UnsupportedFormatError(f"Reading {file_format} files requires pyarrow, which is not installed")
+        return backend
+
+    def load_area_table(self, source, filename=None):
+        """
+        Read an area-compound table from a path or file-like object.
+        Returns (area_data, header_row, backend_name).
+        """
+        file_format = detect_format(source, filename)
+        backend = self.get_backend(file_format)
+        print(f"📥 Reading {file_format} input with {backend.name} backend")
+
+        preview = backend.read_preview(source, HEADER_SCAN_ROWS)
+        print(f"📋 First few cells in column 0: {[preview.iloc[i, 0] for i in range(min(8, len(preview)))]}")
+        header_row = detect_header_row(preview)
+
+        area_data = backend.read_table(source, header_row)
+        return area_data, header_row, backend.name
+
+    def load_table(self, source, filename=None):
+        """Read a table with its first row as the header"""
+        return self.get_backend(detect_format(source, filename)).read_table(source, 0)
+
+
+# Global instance
+ingestion_service = IngestionService()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+JSON PROVIDER
+App-wide Flask JSON provider backed by orjson (C/Rust encoder).
+NumPy scalars and arrays, pandas Series/DataFrames/Timestamps, datetimes and
+Decimals are serialized natively, so routes can return calculation results
+without walking them first. Non-finite floats (NaN/±Inf) follow a policy:
+  'null'  - written as null (default; native in orjson, no extra pass)
+  'zero'  - written as 0.0 (legacy calculation-tool payloads)
+  'error' - raise ValueError
+Falls back to the stdlib json module when orjson is not installed.
+"""
+
+import json
+import math
+from datetime import date, datetime, time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+NAN_POLICIES = ('null', 'zero', 'error')
+DEFAULT_NAN_POLICY = 'null'
+
+
+def frame_records(frame):
+    """DataFrame → list of row dicts, built column-wise (several times faster than to_dict('records'))"""
+    columns = [str(column) if not isinstance(column, str) else column for column in frame.columns]
+    column_values = [frame.iloc[:, position].tolist() for position in range(frame.shape[1])]
+    return [dict(zip(columns, row)) for row in zip(*column_values)]
+
+
+def _default(obj):
+    """Types orjson (and json) do not handle natively"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, pd.DataFrame):
+        return frame_records(obj)
+    if isinstance(obj, pd.Series):
+        return obj.tolist()
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def apply_nan_policy(obj, policy):
+    """
+    Copy of `obj` with non-finite floats replaced (None for 'null', 0.0 for 'zero')
+    or ValueError for 'error'. Arrays and frames are handled as whole blocks.
+    Only needed for 'zero'/'error' with orjson, or for the stdlib fallback.
+    """
+    replacement = 0.0 if policy == 'zero' else None
+
+    def fix(value):
+        if isinstance(value, (float, np.floating)):
+            if math.isfinite(value):
+                return value
+            if policy == 'error':
+                raise ValueError(f"Out of range float value {value!r} is not JSON compliant")
+            return replacement
+        if isinstance(value, dict):
+            return {key: fix(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [fix(item) for item in value]
+        if isinstance(value, (np.ndarray, pd.Series, pd.DataFrame)):
+            return fix_block(value)
+        return value
+
+    def fix_block(block):
+        if isinstance(block, pd.DataFrame):
+            # Column blocks are fixed with array operations, never cell by cell
+            frame = block.copy()
+            for column in frame.columns:
+                values = frame[column].to_numpy()
+                if values.dtype.kind == 'f':
+                    bad = ~np.isfinite(values)
+                elif values.dtype == object:
+                    bad = pd.isna(values) & np.not_equal(values, None)
+                else:
+                    continue
+                if bad.any():
+                    if policy == 'error':
+                        raise ValueError(f"Out of range float values in column {column!r} are not JSON compliant")
+                    frame[column] = np.where(bad, replacement, values.astype(object))
+            return frame_records(frame)
+        array = np.asarray(block)
+        if array.dtype.kind != 'f':
+            return fix(array.tolist()) if array.dtype == object else array.tolist()
+        finite = np.isfinite(array)
+        if finite.all():
+            return array.tolist()
+        if policy == 'error':
+            raise ValueError("Out of range float values are not JSON compliant")
+        if policy == 'zero':
+            return np.where(finite, array, 0.0).tolist()
+        return np.where(finite, array, None).tolist()
+
+    return fix(obj)
+
+
+def dumps_bytes(obj, nan_policy=DEFAULT_NAN_POLICY, sort_keys=False, indent=False):
+    """Serialize to UTF-8 bytes with the given NaN policy"""
+    if nan_policy not in NAN_POLICIES:
+        raise ValueError(f"Unknown NaN policy: {nan_policy}")
+
+    if ORJSON_AVAILABLE:
+        if nan_policy != 'null':
+            obj = apply_nan_policy(obj, nan_policy)
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+
+    text = json.dumps(apply_nan_policy(obj, nan_policy), default=_default, allow_nan=False,
+                      ensure_ascii=False, sort_keys=sort_keys, indent=2 if indent else None)
+    return text.encode('utf-8')
+
+
+def dumps_json(obj, nan_policy=DEFAULT_NAN_POLICY, indent=False):
+    """String form of dumps_bytes (for files and stores outside a request)"""
+    return dumps_bytes(obj, nan_policy=nan_policy, indent=indent).decode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider that encodes with orjson and a configurable NaN policy"""
+
+    @property
+    def nan_policy(self):
+        return self._app.config.get('JSON_NAN_POLICY', DEFAULT_NAN_POLICY)
+
+    def _indent(self):
+        return self.compact is False or (self.compact is None and self._app.debug)
+
+    def dumps(self, obj, nan_policy=None, **kwargs):
+        if kwargs:
+            # Explicit stdlib options (cls=, separators=...) keep stdlib semantics
+            kwargs.setdefault('default', _default)
+            return json.dumps(apply_nan_policy(obj, nan_policy or self.nan_policy), **kwargs)
+        return dumps_bytes(obj, nan_policy or self.nan_policy, self.sort_keys).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if ORJSON_AVAILABLE and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, nan_policy=None, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = dumps_bytes(obj, nan_policy or self.nan_policy, self.sort_keys, indent=self._indent())
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def json_response(payload, status=200, nan_policy=None):
+    """jsonify() with a per-response NaN policy"""
+    response = current_app.json.response(payload, nan_policy=nan_policy) \
+        if isinstance(current_app.json, FastJSONProvider) else current_app.json.response(payload)
+    response.status_code = status
+    return response
+
+
+def init_json_provider(app):
+    """Install FastJSONProvider on an app (JSON_NAN_POLICY config, default 'null')"""
+    policy = app.config.setdefault('JSON_NAN_POLICY', DEFAULT_NAN_POLICY)
+    if policy not in NAN_POLICIES:
+        raise ValueError(f"JSON_NAN_POLICY must be one of {NAN_POLICIES}, got {policy!r}")
+    sort_keys = app.json.sort_keys
+    app.json = FastJSONProvider(app)
+    app.json.sort_keys = sort_keys
+    return app.json
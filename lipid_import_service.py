@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+LIPID IMPORT SERVICE
+Bulk loader for lipid libraries: main lipids (+ class, XIC trace) and their
+annotated ions, from CSV/TSV, Excel/Parquet (via ingestion_service), JSON or
+JSON Lines files.
+
+- Records are read and validated chunk by chunk (CSV and JSON Lines stream from
+  disk; XIC files are only read for the chunk being written), invalid rows are
+  reported with their row number and skipped
+- Each chunk is one transaction of executemany statements on SQLAlchemy Core:
+  classes are inserted once per name, lipids are upserted on lipid_name, ions
+  on (lipid, ion_lipid_name, annotation_type)
+- Only fields present in a record are written, so re-importing a file without
+  traces keeps the stored traces
+Table layouts (header names are case/spacing-insensitive, common aliases accepted):
+  lipids: lipid_name, class_name, api_code, retention_time, precursor_ion, product_ion,
+          collision_energy, polarity, internal_standard, extraction_method, xic_file
+  ions:   lipid_name, ion_lipid_name, ion_lipidcode, annotation_type, retention_time,
+          precursor_ion, product_ion, collision_energy, polarity, response_factor,
+          int_start, int_end, is_main_lipid
+JSON records use the same keys; a lipid may embed "annotated_ions" and an inline
+"xic" ([{time, intensity}, ...] or {"times": [...], "intensities": [...]}).
+XIC files are two numeric columns (time, intensity; header optional) or JSON.
+"""
+
+import json
+import math
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, func, insert, select, update, delete
+
+from ingestion_service import detect_format, ingestion_service
+from models import AnnotatedIon, DashboardStats, LipidClass, MainLipid
+from xic_storage import encode_xic, points_to_arrays
+
+DEFAULT_CHUNK_SIZE = 1000      # Records per transaction
+MAX_REPORTED_ERRORS = 50       # Invalid rows listed individually in the stats
+
+JSON_FORMATS = {'.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+POLARITIES = {'positive': 'Positive', 'pos': 'Positive', '+': 'Positive',
+              'negative': 'Negative', 'neg': 'Negative', '-': 'Negative'}
+
+HEADER_ALIASES = {
+    'lipid': 'lipid_name', 'name': 'lipid_name', 'lipid_class': 'class_name', 'class': 'class_name',
+    'api': 'api_code', 'rt': 'retention_time', 'retention_time_min': 'retention_time',
+    'precursor': 'precursor_ion', 'precursor_mz': 'precursor_ion', 'q1': 'precursor_ion',
+    'product': 'product_ion', 'product_mz': 'product_ion', 'q3': 'product_ion',
+    'ce': 'collision_energy', 'istd': 'internal_standard', 'xic': 'xic_file',
+    'ion': 'ion_lipid_name', 'ion_name': 'ion_lipid_name', 'lipidcode': 'ion_lipidcode',
+    'annotation': 'annotation_type', 'type': 'annotation_type', 'rf': 'response_factor',
+    'start': 'int_start', 'end': 'int_end', 'main': 'is_main_lipid',
+}
+
+
+class LipidImportError(ValueError):
+    """Raised for an unreadable library file or an invalid record"""
+
+
+# ----------------------------------------------------------------------
+# Field validation
+# ----------------------------------------------------------------------
+
+def _is_blank(value):
+    return value is None or (isinstance(value, float) and math.isnan(value)) or \
+        (isinstance(value, str) and not value.strip())
+
+
+def _text(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))   # 184.0 from a numeric Excel cell → '184'
+    return str(value).strip()
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise LipidImportError(f"not a number: {value!r}")
+    if not math.isfinite(number):
+        raise LipidImportError(f"not a finite number: {value!r}")
+    return number
+
+
+def _integer(value):
+    number = _number(value)
+    if not number.is_integer():
+        raise LipidImportError(f"not an integer: {value!r}")
+    return int(number)
+
+
+def _polarity(value):
+    polarity = POLARITIES.get(_text(value).lower())
+    if polarity is None:
+        raise LipidImportError(f"unknown polarity: {value!r}")
+    return polarity
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    text = _text(value).lower()
+    if text in ('true', 'yes', 'y', '1', 'x'):
+        return True
+    if text in ('false', 'no', 'n', '0'):
+        return False
+    raise LipidImportError(f"not a boolean: {value!r}")
+
+
+LIPID_FIELDS = {
+    'lipid_name': _text, 'class_name': _text, 'api_code': _text, 'retention_time': _number,
+    'precursor_ion': _text, 'product_ion': _text, 'collision_energy': _integer, 'polarity': _polarity,
+    'internal_standard': _text, 'extraction_method': _text, 'xic_file': _text,
+}
+
+ION_FIELDS = {
+    'lipid_name': _text, 'ion_lipid_name': _text, 'ion_lipidcode': _text, 'annotation_type': _text,
+    'retention_time': _number, 'precursor_ion': _text, 'product_ion': _text, 'collision_energy': _integer,
+    'polarity': _polarity, 'response_factor': _number, 'int_start': _number, 'int_end': _number,
+    'is_main_lipid': _boolean,
+}
+
+
+def normalize_header(name):
+    """Canonical field name of a column header ('Retention Time (min)' → 'retention_time_min' → 'retention_time')"""
+    key = re.sub(r'[^0-9a-z]+', '_', str(name).strip().lower()).strip('_')
+    return HEADER_ALIASES.get(key, key)
+
+
+def validate_record(raw, fields, required):
+    """Typed copy of the known fields present in `raw` (blank values become None)"""
+    record = {}
+    for key, value in raw.items():
+        field = normalize_header(key)
+        if field not in fields or field in record:
+            continue
+        if _is_blank(value):
+            record[field] = None
+            continue
+        try:
+            record[field] = fields[field](value)
+        except LipidImportError as e:
+            raise LipidImportError(f"{field}: {e}")
+    for field in required:
+        if record.get(field) is None:
+            raise LipidImportError(f"missing {field}")
+    if record.get('retention_time') is not None and record['retention_time'] < 0:
+        raise LipidImportError("retention_time: negative")
+    if record.get('int_start') is not None and record.get('int_end') is not None \
+            and record['int_start'] > record['int_end']:
+        raise LipidImportError("int_start is after int_end")
+    return record
+
+
+# ----------------------------------------------------------------------
+# XIC traces
+# ----------------------------------------------------------------------
+
+def trace_arrays(value):
+    """(times, intensities) of an inline trace: point list or {"times", "intensities"}"""
+    if isinstance(value, dict):
+        times = np.asarray(value.get('times', []), dtype=np.float64)
+        intensities = np.asarray(value.get('intensities', []), dtype=np.float64)
+        if times.shape != intensities.shape:
+            raise LipidImportError("xic: times and intensities differ in length")
+        return times, intensities
+    return points_to_arrays(value)
+
+
+def load_xic_file(path):
+    """(times, intensities) from a delimited text file (first two columns, header optional) or a JSON trace"""
+    if os.path.splitext(path)[1].lower() == '.json':
+        with open(path, encoding='utf-8') as handle:
+            return trace_arrays(json.load(handle))
+    with open(path, encoding='utf-8-sig', errors='ignore') as handle:
+        text = handle.read()
+    # Plain token parsing: ~2x faster than pd.read_csv on a few thousand lines, which dominates bulk imports
+    if ';' in text:
+        text = text.replace(',', '.').replace(';', ' ')   # Semicolon exports use decimal commas
+    else:
+        text = text.replace(',', ' ')
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        raise LipidImportError("xic: empty trace file")
+    try:
+        float(lines[0].split()[0])
+    except ValueError:
+        lines = lines[1:]   # Column titles
+    width = len(lines[0].split()) if lines else 2
+    try:
+        values = np.array(' '.join(lines).split(), dtype=np.float64).reshape(-1, width)
+    except ValueError:
+        raise LipidImportError("xic: trace file is not a numeric table")
+    if width < 2:
+        raise LipidImportError("xic: trace file needs time and intensity columns")
+    return values[:, 0], values[:, 1]
+
+
+def encode_trace(times, intensities):
+    """Validated, time-sorted trace as an xic_blob"""
+    times = np.asarray(times, dtype=np.float64)
+    intensities = np.asarray(intensities, dtype=np.float64)
+    if times.size < 2:
+        raise LipidImportError("xic: fewer than 2 points")
+    if not (np.isfinite(times).all() and np.isfinite(intensities).all()):
+        raise LipidImportError("xic: non-finite values")
+    if np.any(np.diff(times) < 0):
+        order = np.argsort(times, kind='stable')
+        times, intensities = times[order], intensities[order]
+    return encode_xic(times, intensities)
+
+
+# ----------------------------------------------------------------------
+# Readers: chunks of (row_number, raw record)
+# ----------------------------------------------------------------------
+
+def iter_raw_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Raw records of a library file in chunks; row numbers are 1-based data rows / JSON items"""
+    extension = os.path.splitext(path)[1].lower()
+    file_format = JSON_FORMATS.get(extension) or detect_format(path)
+    row = 0
+
+    if file_format == 'jsonl':
+        chunk = []
+        with open(path, encoding='utf-8-sig') as handle:
+            for line in handle:
+                if not line.strip():
+                    continue
+                row += 1
+                try:
+                    chunk.append((row, json.loads(line)))
+                except json.JSONDecodeError as e:
+                    chunk.append((row, LipidImportError(f"invalid JSON: {e}")))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+        return
+
+    if file_format == 'json':
+        with open(path, encoding='utf-8-sig') as handle:
+            data = json.load(handle)
+        items = data.get('lipids', []) if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise LipidImportError("JSON library must be a list of lipids or {\"lipids\": [...]}")
+        for offset in range(0, len(items), chunk_size):
+            yield list(enumerate(items[offset:offset + chunk_size], start=offset + 1))
+        return
+
+    if file_format in ('csv', 'tsv'):
+        with open(path, encoding='utf-8-sig', errors='ignore') as handle:
+            first_line = handle.readline()
+        sep = '\t' if file_format == 'tsv' or '\t' in first_line else (';' if ';' in first_line else ',')
+        frames = pd.read_csv(path, sep=sep, dtype=str, chunksize=chunk_size, encoding='utf-8-sig', engine='c')
+    else:
+        # Excel/Parquet have no incremental reader: load once, write in chunks
+        table = ingestion_service.load_table(path)
+        frames = (table.iloc[offset:offset + chunk_size] for offset in range(0, len(table), chunk_size))
+
+    for frame in frames:
+        records = frame.to_dict('records')
+        yield list(enumerate(records, start=row + 1))
+        row += len(records)
+
+
+# ----------------------------------------------------------------------
+# Importer
+# ----------------------------------------------------------------------
+
+def _grouped_by_columns(rows):
+    """executemany needs one column set per statement: group rows by their keys"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return groups.values()
+
+
+class LipidImportService:
+    """Chunked, upserting bulk loader for main lipids, annotated ions and XIC traces"""
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _new_stats():
+        return {'rows': 0, 'invalid': 0, 'errors': [], 'lipids_inserted': 0, 'lipids_updated': 0,
+                'classes_inserted': 0, 'traces': 0, 'ions_inserted': 0, 'ions_updated': 0,
+                'ions_pruned': 0, 'chunks': 0, 'seconds': None}
+
+    @staticmethod
+    def _reject(stats, row, error):
+        stats['invalid'] += 1
+        if len(stats['errors']) < MAX_REPORTED_ERRORS:
+            stats['errors'].append({'row': row, 'error': str(error)})
+
+    def import_library(self, engine, path, ions_path=None, xic_dir=None, prune_ions=False,
+                       dry_run=False, progress=None):
+        """
+        Load a lipid library (and optionally a separate ions table) in chunked transactions.
+        xic_file paths are resolved against xic_dir (default: the library's directory).
+        With prune_ions, lipids that have ions in the files lose the stored ions the files no longer list.
+        Returns import stats; with dry_run everything is validated and nothing is written.
+        """
+        started = time.time()
+        stats = self._new_stats()
+        xic_dir = xic_dir or os.path.dirname(os.path.abspath(path))
+        kept_ions = {}   # lipid_id → ion_ids listed in the files (prune_ions)
+
+        for chunk in iter_raw_chunks(path, self.chunk_size):
+            lipids, ions = self._validate_lipids(chunk, xic_dir, stats)
+            if lipids and not dry_run:
+                with engine.begin() as conn:
+                    lipid_ids = self._upsert_lipids(conn, lipids, stats)
+                    self._upsert_ions(conn, ions, lipid_ids, stats, kept_ions if prune_ions else None)
+            stats['chunks'] += 1
+            if progress:
+                progress(stats)
+
+        if ions_path:
+            for chunk in iter_raw_chunks(ions_path, self.chunk_size):
+                ions = self._validate_ions(chunk, stats)
+                if ions and not dry_run:
+                    with engine.begin() as conn:
+                        lipid_ids = self._lipid_ids(conn, {ion['lipid_name'] for _, ion in ions})
+                        self._upsert_ions(conn, ions, lipid_ids, stats, kept_ions if prune_ions else None)
+                stats['chunks'] += 1
+                if progress:
+                    progress(stats)
+
+        if prune_ions and kept_ions and not dry_run:
+            with engine.begin() as conn:
+                self._prune_ions(conn, kept_ions, stats)
+        if not dry_run:
+            self._mark_dashboard_stale(engine)
+
+        stats['seconds'] = round(time.time() - started, 3)
+        return stats
+
+    @staticmethod
+    def _mark_dashboard_stale(engine):
+        """Core writes skip the ORM commit hook: let the next dashboard hit refresh its counts"""
+        table = DashboardStats.__table__
+        try:
+            with engine.begin() as conn:
+                conn.execute(update(table).values(is_stale=True))
+        except Exception as e:
+            print(f"⚠️ Dashboard stats not marked stale (run migrate_dashboard_stats.py): {e}")
+
+    # -- validation ----------------------------------------------------
+
+    def _validate_lipids(self, chunk, xic_dir, stats):
+        """Lipid records (last occurrence of a name wins) and their embedded ions as (row, ion)"""
+        lipids = {}
+        ions = []
+        for row, raw in chunk:
+            stats['rows'] += 1
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                if not isinstance(raw, dict):
+                    raise LipidImportError("record is not an object")
+                lipid = validate_record(raw, LIPID_FIELDS, ('lipid_name',))
+                xic_file = lipid.pop('xic_file', None)
+                if raw.get('xic') is not None:
+                    lipid['xic_blob'] = encode_trace(*trace_arrays(raw['xic']))
+                elif xic_file:
+                    xic_path = xic_file if os.path.isabs(xic_file) else os.path.join(xic_dir, xic_file)
+                    if not os.path.exists(xic_path):
+                        raise LipidImportError(f"xic_file not found: {xic_file}")
+                    lipid['xic_blob'] = encode_trace(*load_xic_file(xic_path))
+                embedded = []
+                for ion in raw.get('annotated_ions') or []:
+                    embedded.append((row, validate_record({**ion, 'lipid_name': lipid['lipid_name']},
+                                                          ION_FIELDS, ('ion_lipid_name',))))
+            except (LipidImportError, ValueError, TypeError, OSError) as e:
+                self._reject(stats, row, e)
+                continue
+            lipids[lipid['lipid_name']] = lipid
+            ions.extend(embedded)
+        return list(lipids.values()), ions
+
+    def _validate_ions(self, chunk, stats):
+        ions = []
+        for row, raw in chunk:
+            stats['rows'] += 1
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                ions.append((row, validate_record(raw, ION_FIELDS, ('lipid_name', 'ion_lipid_name'))))
+            except (LipidImportError, ValueError, TypeError) as e:
+                self._reject(stats, row, e)
+        return ions
+
+    # -- writes --------------------------------------------------------
+
+    @staticmethod
+    def _lipid_ids(conn, names):
+        """lipid_name → lipid_id (the lowest ID when a name is stored more than once)"""
+        table = MainLipid.__table__
+        rows = conn.execute(select(table.c.lipid_name, table.c.lipid_id).where(
+            table.c.lipid_name.in_(list(names))).order_by(table.c.lipid_id.desc()))
+        return dict(rows.all())
+
+    @staticmethod
+    def _class_ids(conn, names, stats):
+        """class_name → class_id, inserting missing classes"""
+        table = LipidClass.__table__
+        lookup = select(table.c.class_name, table.c.class_id).where(table.c.class_name.in_(list(names)))
+        class_ids = dict(conn.execute(lookup).all())
+        missing = [{'class_name': name} for name in names if name not in class_ids]
+        if missing:
+            conn.execute(insert(table), missing)
+            stats['classes_inserted'] += len(missing)
+            class_ids = dict(conn.execute(lookup).all())
+        return class_ids
+
+    def _upsert_lipids(self, conn, lipids, stats):
+        table = MainLipid.__table__
+        class_names = {lipid['class_name'] for lipid in lipids if lipid.get('class_name')}
+        class_ids = self._class_ids(conn, class_names, stats) if class_names else {}
+        existing = self._lipid_ids(conn, [lipid['lipid_name'] for lipid in lipids])
+
+        inserts, updates = [], []
+        for lipid in lipids:
+            row = {key: value for key, value in lipid.items() if key != 'class_name'}
+            if 'class_name' in lipid:
+                row['class_id'] = class_ids.get(lipid['class_name'])
+            if 'xic_blob' in row:
+                row['xic_data'] = None   # The binary trace replaces any legacy JSON copy
+                stats['traces'] += 1
+            if lipid['lipid_name'] in existing:
+                row['row_id'] = existing[lipid['lipid_name']]
+                updates.append(row)
+            else:
+                inserts.append(row)
+
+        for group in _grouped_by_columns(inserts):
+            conn.execute(insert(table), group)
+        for group in _grouped_by_columns(updates):
+            # Bound names must differ from column names; updated_at comes from the column's onupdate
+            values = {key: bindparam(f"new_{key}") for key in group[0] if key != 'row_id'}
+            params = [{f"new_{key}" if key != 'row_id' else key: value for key, value in row.items()}
+                      for row in group]
+            conn.execute(update(table).where(table.c.lipid_id == bindparam('row_id')).values(values), params)
+        stats['lipids_inserted'] += len(inserts)
+        stats['lipids_updated'] += len(updates)
+        return {**existing, **self._lipid_ids(conn, [row['lipid_name'] for row in inserts])} if inserts else existing
+
+    def _upsert_ions(self, conn, ions, lipid_ids, stats, kept_ions=None):
+        """Upsert (row, ion) records on (lipid, ion_lipid_name, annotation_type)"""
+        if not ions:
+            return
+        table = AnnotatedIon.__table__
+        resolved = []
+        for row, ion in ions:
+            lipid_id = lipid_ids.get(ion['lipid_name'])
+            if lipid_id is None:
+                self._reject(stats, row, f"unknown lipid_name: {ion['lipid_name']}")
+                continue
+            resolved.append((lipid_id, ion))
+        if not resolved:
+            return
+
+        touched = sorted({lipid_id for lipid_id, _ in resolved})
+        existing = {(lipid_id, name, annotation_type): ion_id for ion_id, lipid_id, name, annotation_type in conn.execute(
+            select(table.c.ion_id, table.c.main_lipid_id, table.c.ion_lipid_name, table.c.annotation_type)
+            .where(table.c.main_lipid_id.in_(touched)).order_by(table.c.ion_id.desc()))}
+
+        inserts, updates = {}, {}
+        for lipid_id, ion in resolved:
+            row = {key: value for key, value in ion.items() if key != 'lipid_name'}
+            row['main_lipid_id'] = lipid_id
+            key = (lipid_id, ion['ion_lipid_name'], ion.get('annotation_type'))
+            if key in existing:
+                updates[key] = {**row, 'row_id': existing[key]}
+            else:
+                inserts[key] = row
+
+        for group in _grouped_by_columns(inserts.values()):
+            conn.execute(insert(table), group)
+        for group in _grouped_by_columns(updates.values()):
+            values = {key: bindparam(f"new_{key}") for key in group[0] if key != 'row_id'}
+            params = [{f"new_{key}" if key != 'row_id' else key: value for key, value in row.items()}
+                      for row in group]
+            conn.execute(update(table).where(table.c.ion_id == bindparam('row_id')).values(values), params)
+        stats['ions_inserted'] += len(inserts)
+        stats['ions_updated'] += len(updates)
+
+        # Core writes skip the ORM hooks that touch parent lipids: bump chart/peak-area versions here
+        lipids = MainLipid.__table__
+        conn.execute(update(lipids).where(lipids.c.lipid_id.in_(touched)).values(updated_at=func.current_timestamp()))
+
+        if kept_ions is not None:
+            ion_ids = conn.execute(select(table.c.ion_id, table.c.main_lipid_id, table.c.ion_lipid_name,
+                                          table.c.annotation_type).where(table.c.main_lipid_id.in_(touched))).all()
+            listed = set(inserts) | set(updates)
+            for ion_id, lipid_id, name, annotation_type in ion_ids:
+                kept = kept_ions.setdefault(lipid_id, set())
+                if (lipid_id, name, annotation_type) in listed:
+                    kept.add(ion_id)
+
+    def _prune_ions(self, conn, kept_ions, stats):
+        """Delete ions of imported lipids that no input file listed"""
+        table = AnnotatedIon.__table__
+        lipid_ids = list(kept_ions)
+        for offset in range(0, len(lipid_ids), self.chunk_size):
+            batch = lipid_ids[offset:offset + self.chunk_size]
+            stale = [ion_id for ion_id, lipid_id in conn.execute(
+                select(table.c.ion_id, table.c.main_lipid_id).where(table.c.main_lipid_id.in_(batch)))
+                if ion_id not in kept_ions[lipid_id]]
+            if stale:
+                conn.execute(delete(table).where(table.c.ion_id.in_(stale)))
+                stats['ions_pruned'] += len(stale)
+                lipids = MainLipid.__table__
+                conn.execute(update(lipids).where(lipids.c.lipid_id.in_(batch)).values(
+                    updated_at=func.current_timestamp()))
+
+
+# Global instance
+lipid_import_service = LipidImportService()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Migration script for the materialized dashboard statistics snapshot (dashboard_stats)
+
+Creates the table and computes the first snapshot. Afterwards the app keeps it
+current: commits that change lipid tables mark it stale, the next homepage or
+dashboard hit refreshes it, and DASHBOARD_STATS_MAX_AGE (seconds, default 300)
+bounds staleness from bulk writers. Safe to re-run; also refreshes on demand.
+
+Usage:
+  python migrate_dashboard_stats.py
+"""
+
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def run_migration():
+    """Create dashboard_stats and compute the snapshot"""
+    try:
+        DATABASE_URL = os.getenv('DATABASE_URL')
+        if not DATABASE_URL:
+            print("❌ Error: DATABASE_URL not found in environment variables")
+            sys.exit(1)
+
+        from app import app
+        from models import db, DashboardStats, optimized_manager
+
+        print("🚀 Starting migration for dashboard statistics snapshot...")
+        with app.app_context():
+            DashboardStats.__table__.create(db.engine, checkfirst=True)
+            print("✅ Table dashboard_stats ready")
+
+            snapshot = optimized_manager.refresh_dashboard_stats()
+            print(f"✅ Snapshot refreshed: {snapshot['total_lipids']} lipids, {snapshot['total_classes']} classes, "
+                  f"{snapshot['total_annotations']} annotated ions")
+
+        print("\n✅ Migration completed successfully!")
+
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the lipid browse indexes to existing databases
+(db.create_all() only creates indexes together with new tables)
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def run_migration():
+    """Create the keyset/filter indexes used by /browse-lipids and /api/browse-lipids"""
+    try:
+        from models import MainLipid, AnnotatedIon
+
+        DATABASE_URL = os.getenv('DATABASE_URL')
+        if not DATABASE_URL:
+            print("❌ Error: DATABASE_URL not found in environment variables")
+            sys.exit(1)
+
+        engine = create_engine(DATABASE_URL)
+
+        print("🚀 Starting migration for lipid browse indexes...")
+
+        for table in (MainLipid.__table__, AnnotatedIon.__table__):
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                # checkfirst skips indexes that already exist
+                index.create(engine, checkfirst=True)
+                print(f"✅ {index.name} on {table.name}({', '.join(column.name for column in index.columns)})")
+
+        print("\n✅ Migration completed successfully!")
+
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_migration()
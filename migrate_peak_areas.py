@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Migration / batch job for precomputed ion peak areas (ion_peak_areas, see peak_area_service.py)
+
+Creates the table if needed, then integrates every annotated ion whose window,
+XIC or integration method changed since its stored row. Incremental and safe to
+re-run (one transaction per batch of lipids); run it after imports or window
+edits, or trigger the same job through POST /api/admin/peak-areas.
+
+Usage:
+  python migrate_peak_areas.py                          # linear baseline
+  python migrate_peak_areas.py --baseline all
+  python migrate_peak_areas.py --baseline none --force  # recompute every ion
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def run_migration():
+    """Create ion_peak_areas and (re)compute stale peak areas"""
+    from peak_area_service import BASELINES, DEFAULT_BASELINE, DEFAULT_BATCH_SIZE
+
+    parser = argparse.ArgumentParser(description="Precompute integrated peak areas of annotated ions")
+    parser.add_argument('--baseline', choices=BASELINES + ('all',), default=DEFAULT_BASELINE)
+    parser.add_argument('--force', action='store_true', help="Recompute every ion, not only changed ones")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Lipids per transaction")
+    args = parser.parse_args()
+
+    try:
+        DATABASE_URL = os.getenv('DATABASE_URL')
+        if not DATABASE_URL:
+            print("❌ Error: DATABASE_URL not found in environment variables")
+            sys.exit(1)
+
+        from app import app
+        from models import db, IonPeakArea
+        from peak_area_service import peak_area_service
+
+        print("🚀 Starting peak area precomputation...")
+        with app.app_context():
+            IonPeakArea.__table__.create(db.engine, checkfirst=True)
+            print("✅ Table ion_peak_areas ready")
+
+            def progress(done, total):
+                print(f"   … {done}/{total} lipids")
+
+            for baseline in (BASELINES if args.baseline == 'all' else (args.baseline,)):
+                stats = peak_area_service.compute(baseline, force=args.force, batch_size=args.batch_size,
+                                                  progress=progress)
+                print(f"✅ Baseline '{baseline}': {stats['computed']} ions from {stats['lipids']} lipids "
+                      f"({stats['without_area']} without area), {stats['removed']} orphan rows removed "
+                      f"in {stats['seconds']:.1f}s")
+
+        print("\n✅ Migration completed successfully!")
+
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Migration script to move XIC traces from main_lipids.xic_data (JSON point lists)
+to main_lipids.xic_blob (compact float32 binary, see xic_storage.py)
+
+Converts in keyset batches, one transaction per batch, so it can be stopped and
+re-run safely (rows that already have a blob are skipped). Prints a report of
+storage size and decode time before and after.
+Run it (at least once, even with --report-only) before deploying code that maps
+MainLipid.xic_blob, since it also adds the column to existing databases.
+
+Usage:
+  python migrate_xic_binary.py                    # convert, keep the JSON copy
+  python migrate_xic_binary.py --clear-json       # convert and free the JSON column
+  python migrate_xic_binary.py --report-only
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine, inspect, select, update, bindparam, func, cast, null, Text
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def ensure_blob_column(engine, table):
+    """Add main_lipids.xic_blob on databases created before the column existed"""
+    columns = {column['name'] for column in inspect(engine).get_columns(table.name)}
+    if 'xic_blob' in columns:
+        return False
+    column_type = table.c.xic_blob.type.compile(dialect=engine.dialect)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN xic_blob {column_type}")
+    return True
+
+
+def measure(engine, table, sample_size):
+    """Storage (bytes) of both representations and median per-trace decode time of each"""
+    from xic_storage import points_to_arrays, xic_arrays
+
+    with engine.connect() as conn:
+        json_bytes, blob_bytes, json_rows, blob_rows = conn.execute(select(
+            func.coalesce(func.sum(func.length(cast(table.c.xic_data, Text))), 0),
+            func.coalesce(func.sum(func.length(table.c.xic_blob)), 0),
+            func.count(table.c.xic_data),
+            func.count(table.c.xic_blob)
+        ).where(table.c.xic_data.isnot(None) | table.c.xic_blob.isnot(None))).one()
+
+        table_bytes = None
+        if engine.dialect.name == 'postgresql':
+            table_bytes = conn.exec_driver_sql(
+                f"SELECT pg_total_relation_size('{table.name}')").scalar()
+
+        # Raw values as a request would receive them: JSON text / bytes off the driver
+        json_sample = conn.execute(select(cast(table.c.xic_data, Text)).where(
+            table.c.xic_data.isnot(None)).order_by(table.c.lipid_id).limit(sample_size)).scalars().all()
+        blob_sample = conn.execute(select(table.c.xic_blob).where(
+            table.c.xic_blob.isnot(None)).order_by(table.c.lipid_id).limit(sample_size)).scalars().all()
+
+    def median_ms(values, decode):
+        timings = []
+        for value in values:
+            start = time.perf_counter()
+            decode(value)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return timings[len(timings) // 2] * 1000 if timings else None
+
+    return {
+        'json_rows': json_rows,
+        'json_bytes': int(json_bytes),
+        'blob_rows': blob_rows,
+        'blob_bytes': int(blob_bytes),
+        'table_bytes': table_bytes,
+        'json_decode_ms': median_ms([value for value in json_sample if value not in (None, 'null')],
+                                    lambda value: points_to_arrays(json.loads(value))),
+        'blob_decode_ms': median_ms(blob_sample, xic_arrays)
+    }
+
+
+def convert(engine, table, batch_size, clear_json):
+    """Encode every JSON trace without a blob; returns (converted, skipped)"""
+    from xic_storage import encode_xic, points_to_arrays
+
+    # Same data in a new representation: keep updated_at (and the listing validators) unchanged
+    values = {'xic_blob': bindparam('blob'), 'updated_at': table.c.updated_at}
+    if clear_json:
+        values['xic_data'] = null()
+    statement = update(table).where(table.c.lipid_id == bindparam('row_id')).values(**values)
+
+    converted = skipped = 0
+    last_id = None
+    while True:
+        query = select(table.c.lipid_id, table.c.xic_data).where(
+            table.c.xic_data.isnot(None), table.c.xic_blob.is_(None)
+        ).order_by(table.c.lipid_id).limit(batch_size)
+        if last_id is not None:
+            query = query.where(table.c.lipid_id > last_id)
+
+        with engine.begin() as conn:
+            rows = conn.execute(query).all()
+            if not rows:
+                break
+            params = []
+            for lipid_id, xic_data in rows:
+                times, intensities = points_to_arrays(xic_data)
+                if times.size:
+                    params.append({'row_id': lipid_id, 'blob': encode_xic(times, intensities)})
+                else:
+                    skipped += 1
+            if params:
+                conn.execute(statement, params)
+            converted += len(params)
+            last_id = rows[-1].lipid_id
+
+        print(f"   … {converted} converted, {skipped} without valid points (last lipid_id {last_id})")
+
+    return converted, skipped
+
+
+def print_report(before, after):
+    def size(value):
+        return f"{value / 1024 / 1024:.2f} MB" if value is not None else 'n/a'
+
+    def ms(value):
+        return f"{value:.3f} ms" if value is not None else 'n/a'
+
+    print("\n📊 XIC storage report")
+    print("-" * 72)
+    print(f"{'':<28} {'Before':>20} {'After':>20}")
+    print("-" * 72)
+    for label, key, fmt in [
+        ('JSON traces', 'json_rows', str), ('JSON storage', 'json_bytes', size),
+        ('Binary traces', 'blob_rows', str), ('Binary storage', 'blob_bytes', size),
+        ('main_lipids total size', 'table_bytes', size),
+        ('Decode per trace (JSON)', 'json_decode_ms', ms), ('Decode per trace (binary)', 'blob_decode_ms', ms),
+    ]:
+        print(f"{label:<28} {fmt(before[key]):>20} {fmt(after[key]):>20}")
+    if after['table_bytes'] is not None:
+        print("\nℹ️ PostgreSQL returns freed JSON space to the OS only after VACUUM FULL main_lipids")
+
+
+def run_migration():
+    """Add xic_blob, convert JSON traces in batches, report size and decode time"""
+    parser = argparse.ArgumentParser(description="Move XIC traces to the compact binary column")
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--clear-json', action='store_true', help="Set xic_data to NULL for converted rows")
+    parser.add_argument('--report-only', action='store_true')
+    parser.add_argument('--sample', type=int, default=100, help="Traces timed per format for the report")
+    args = parser.parse_args()
+
+    try:
+        from models import MainLipid
+
+        DATABASE_URL = os.getenv('DATABASE_URL')
+        if not DATABASE_URL:
+            print("❌ Error: DATABASE_URL not found in environment variables")
+            sys.exit(1)
+
+        engine = create_engine(DATABASE_URL)
+        table = MainLipid.__table__
+
+        print("🚀 Starting migration for binary XIC storage...")
+        if ensure_blob_column(engine, table):
+            print("✅ Added column main_lipids.xic_blob")
+
+        before = measure(engine, table, args.sample)
+        if not args.report_only:
+            converted, skipped = convert(engine, table, args.batch_size, args.clear_json)
+            print(f"✅ Converted {converted} traces ({skipped} skipped: no valid points)")
+        after = measure(engine, table, args.sample)
+        print_report(before, after)
+
+        print("\n✅ Migration completed successfully!")
+
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_migration()
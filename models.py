@@ -5,15 +5,18 @@ Fixes N+1 query problems that caused original performance issues
 
 import os
 import json
-from functools import lru_cache
+import base64
+import hashlib
+import threading
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import joinedload, selectinload
-from sqlalchemy import func, text, Column, String, Integer, Float, Text, Boolean, DateTime, JSON, CheckConstraint, Index
+from sqlalchemy.orm import joinedload, selectinload, Session
+from sqlalchemy import cast, event, func, inspect, null, text, tuple_, Column, String, Integer, Float, Text, Boolean, DateTime, JSON, CheckConstraint, Index
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 import time
 import uuid
 from datetime import datetime, timedelta
+from xic_storage import encode_xic, xic_arrays
 
 # SQLAlchemy instance
 db = SQLAlchemy()
@@ -196,7 +199,8 @@ class MainLipid(db.Model):
     collision_energy = db.Column(db.Integer)
     polarity = db.Column(db.String(255), default='Positive')
     internal_standard = db.Column(db.String(255))
-    xic_data = db.Column(db.JSON)
+    xic_data = db.Column(db.JSON)  # Legacy [{'time', 'intensity'}, ...] list
+    xic_blob = db.Column(db.LargeBinary)  # Compact float32 trace (xic_storage), preferred when set
     extraction_timestamp = db.Column(db.DateTime, default=db.func.current_timestamp())
     extraction_method = db.Column(db.String(255))
     extraction_success = db.Column(db.Boolean, default=True)
@@ -208,6 +212,13 @@ class MainLipid(db.Model):
     annotated_ions = db.relationship('AnnotatedIon', back_populates='main_lipid', 
                                    lazy='select', cascade='all, delete-orphan')
     
+    # Browse keyset order (lipid_name, lipid_id) and its range filters
+    __table_args__ = (
+        Index('idx_main_lipids_name_id', 'lipid_name', 'lipid_id'),
+        Index('idx_main_lipids_class_id', 'class_id'),
+        Index('idx_main_lipids_retention_time', 'retention_time'),
+    )
+    
     def to_dict(self, include_xic=False, include_ions=False):
         result = {
             'lipid_id': self.lipid_id,
@@ -222,13 +233,24 @@ class MainLipid(db.Model):
             'extraction_success': self.extraction_success
         }
         
-        if include_xic and self.xic_data:
-            result['xic_data'] = self.xic_data
+        if include_xic and (self.xic_blob or self.xic_data):
+            times, intensities = self.get_xic_arrays()
+            result['xic_data'] = [{'time': t, 'intensity': i} for t, i in zip(times.tolist(), intensities.tolist())]
             
         if include_ions:
             result['annotated_ions'] = [ion.to_dict() for ion in self.annotated_ions]
             
         return result
+    
+    def get_xic_arrays(self):
+        """(times, intensities) float64 arrays from xic_blob, falling back to the JSON point list"""
+        return xic_arrays(self.xic_blob, self.xic_data)
+    
+    def set_xic_arrays(self, times, intensities, keep_json=False):
+        """Store a trace in the compact binary column (the JSON copy is cleared unless keep_json)"""
+        self.xic_blob = encode_xic(times, intensities)
+        if not keep_json:
+            self.xic_data = null()
 
 class AnnotatedIon(db.Model):
     __tablename__ = 'annotated_ions'
@@ -252,6 +274,11 @@ class AnnotatedIon(db.Model):
     # Relationship back to main lipid
     main_lipid = db.relationship('MainLipid', back_populates='annotated_ions', lazy='select')
     
+    # Per-lipid ion counts are index-only lookups
+    __table_args__ = (
+        Index('idx_annotated_ions_main_lipid_id', 'main_lipid_id'),
+    )
+    
     def to_dict(self):
         return {
             'ion_id': self.ion_id,
@@ -271,22 +298,148 @@ class AnnotatedIon(db.Model):
         }
 
 
+class IonPeakArea(db.Model):
+    """
+    Integrated peak area of an annotated ion's window (see peak_area_service), one row per
+    ion and baseline mode. int_start/int_end/lipid_version/method_version record the inputs
+    it was computed from, so re-runs only recompute ions whose window or XIC changed.
+    """
+    __tablename__ = 'ion_peak_areas'
+
+    ion_id = db.Column(db.Integer, db.ForeignKey('annotated_ions.ion_id', ondelete='CASCADE'), primary_key=True)
+    baseline = db.Column(db.String(20), primary_key=True)  # none, linear, min
+    main_lipid_id = db.Column(db.Integer, nullable=False)
+    area = db.Column(db.Float)           # NULL when the window has no overlap with the trace
+    peak_height = db.Column(db.Float)
+    apex_time = db.Column(db.Float)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    int_start = db.Column(db.Float)
+    int_end = db.Column(db.Float)
+    lipid_version = db.Column(db.DateTime)  # MainLipid.updated_at of the XIC integrated
+    method_version = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    __table_args__ = (
+        Index('idx_ion_peak_areas_lipid_baseline', 'main_lipid_id', 'baseline'),
+    )
+
+    def to_dict(self):
+        return {
+            'ion_id': self.ion_id,
+            'main_lipid_id': self.main_lipid_id,
+            'baseline': self.baseline,
+            'area': self.area,
+            'peak_height': self.peak_height,
+            'apex_time': self.apex_time,
+            'points': self.points,
+            'int_start': self.int_start,
+            'int_end': self.int_end,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        }
+
+
+class DashboardStats(db.Model):
+    """
+    Materialized homepage/dashboard statistics, one row per snapshot name, read with a
+    primary-key lookup instead of COUNT and GROUP BY queries on every hit. Commits that
+    change lipid tables mark it stale and the next reader refreshes it; refreshed_at bounds
+    staleness from writers that bypass the ORM session (bulk imports, migrations).
+    """
+    __tablename__ = 'dashboard_stats'
+
+    name = db.Column(db.String(50), primary_key=True)
+    total_lipids = db.Column(db.Integer, nullable=False, default=0)
+    total_classes = db.Column(db.Integer, nullable=False, default=0)
+    total_annotations = db.Column(db.Integer, nullable=False, default=0)
+    class_counts = db.Column(db.JSON)    # [{'class_name', 'count'}] ordered by class name
+    recent_lipids = db.Column(db.JSON)   # Newest lipids, as get_lipids_sample rows
+    is_stale = db.Column(db.Boolean, nullable=False, default=False)
+    refreshed_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'total_lipids': self.total_lipids,
+            'total_classes': self.total_classes,
+            'total_annotations': self.total_annotations,
+            'class_counts': self.class_counts or [],
+            'recent_lipids': self.recent_lipids or [],
+            'refreshed_at': self.refreshed_at.isoformat() if self.refreshed_at else None
+        }
+
+
+class QueryCache:
+    """
+    Small TTL cache for read-mostly lipid queries.
+    Entries expire after `ttl_seconds`; the whole cache is also invalidated after
+    any commit that inserted/updated/deleted MainLipid, LipidClass or AnnotatedIon
+    rows in this process (see the SQLAlchemy event hooks below). The TTL bounds
+    staleness for writes made by other workers.
+    """
+    
+    def __init__(self, ttl_seconds=300):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}             # key → (expires_at, value)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidations': 0, 'last_invalidated': None}
+    
+    def get_or_load(self, key, loader):
+        """Cached value for `key`, calling `loader()` on a miss or after expiry"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.stats['hits'] += 1
+                    return entry[1]
+                self.stats['expired'] += 1
+                del self._entries[key]
+            self.stats['misses'] += 1
+            generation = self.stats['invalidations']
+        
+        value = loader()
+        with self._lock:
+            # Do not store a value loaded while an invalidation happened
+            if generation == self.stats['invalidations']:
+                self._entries[key] = (time.time() + self.ttl_seconds, value)
+        return value
+    
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.stats['invalidations'] += 1
+            self.stats['last_invalidated'] = time.time()
+    
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = sorted(str(key) for key in self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        stats['ttl_seconds'] = self.ttl_seconds
+        return stats
+
+
+DASHBOARD_SNAPSHOT = 'library'   # DashboardStats row read by the homepage and dashboard
+DASHBOARD_RECENT_LIPIDS = 5
+
 class OptimizedDataManager:
     """
     Optimized data access layer that fixes N+1 query problems
     """
     
-    def __init__(self):
-        self._cache = {}
-        self._cache_timeout = 300  # 5 minutes
-        self._last_cache_time = 0
+    def __init__(self, cache_ttl=300, dashboard_max_age=300):
+        self.cache = QueryCache(ttl_seconds=cache_ttl)  # 5 minutes by default
+        self.dashboard_max_age = dashboard_max_age
+        self._dashboard_refresh_lock = threading.Lock()
     
-    @lru_cache(maxsize=1)
     def get_all_lipids_optimized(self):
         """
         Get all lipids with proper eager loading - NO N+1 QUERIES
         This is equivalent to SQLite's cached approach but with PostgreSQL
         """
+        return self.cache.get_or_load('all_lipids', self._load_all_lipids)
+    
+    def _load_all_lipids(self):
         start_time = time.time()
         
         # Single optimized query with all related data - show ALL lipids for management
@@ -320,11 +473,13 @@ class OptimizedDataManager:
         
         return result
     
-    @lru_cache(maxsize=1)
     def get_lipid_classes_optimized(self):
         """
         Get lipid classes with counts using efficient SQL
         """
+        return self.cache.get_or_load('lipid_classes', self._load_lipid_classes)
+    
+    def _load_lipid_classes(self):
         # Single efficient query with COUNT
         classes_with_counts = db.session.query(
             LipidClass.class_name,
@@ -338,6 +493,166 @@ class OptimizedDataManager:
             for class_name, count in classes_with_counts
         ]
     
+    def get_lipid_listing(self, extracted_only=False):
+        """
+        Dashboard lipid list: only the listed columns plus a grouped COUNT of ions.
+        One SELECT; no ion rows and no xic_data are loaded.
+        extracted_only limits it to lipids with extraction_success (as search does).
+        """
+        ion_counts = db.session.query(
+            AnnotatedIon.main_lipid_id.label('lipid_id'),
+            func.count(AnnotatedIon.ion_id).label('ion_count')
+        ).group_by(AnnotatedIon.main_lipid_id).subquery()
+
+        listing = db.session.query(
+            MainLipid.lipid_id,
+            MainLipid.lipid_name,
+            MainLipid.api_code,
+            MainLipid.retention_time,
+            LipidClass.class_name,
+            func.coalesce(ion_counts.c.ion_count, 0)
+        ).outerjoin(
+            LipidClass, MainLipid.class_id == LipidClass.class_id
+        ).outerjoin(
+            ion_counts, ion_counts.c.lipid_id == MainLipid.lipid_id
+        )
+        if extracted_only:
+            listing = listing.filter(MainLipid.extraction_success == True)
+        rows = listing.order_by(MainLipid.lipid_id).all()
+
+        return [
+            {
+                'lipid_id': lipid_id,
+                'lipid_name': lipid_name,
+                'api_code': api_code,
+                'retention_time': retention_time,
+                'class_name': class_name or 'Unknown',
+                'annotated_ions_count': ion_count
+            }
+            for lipid_id, lipid_name, api_code, retention_time, class_name, ion_count in rows
+        ]
+
+    def get_lipid_listing_version(self):
+        """
+        Validator for the lipid listing: latest change time and row counts of the
+        listed tables in one SELECT (counts catch deletes that leave max() unchanged),
+        plus every class id:name pair, as lipid_classes has no update timestamp and
+        a rename changes the listed class_name (get_chart_versions does the same).
+        Returns {'etag': str, 'last_modified': datetime or None}.
+        """
+        def latest(column):
+            return db.session.query(func.max(column)).scalar_subquery()
+
+        def count(column):
+            return db.session.query(func.count(column)).scalar_subquery()
+
+        row = db.session.query(
+            latest(MainLipid.updated_at), count(MainLipid.lipid_id),
+            latest(AnnotatedIon.created_at), count(AnnotatedIon.ion_id),
+            latest(LipidClass.created_at), count(LipidClass.class_id),
+            self._class_names_aggregate()
+        ).one()
+
+        timestamps = [value for value in row[0:6:2] if value is not None]
+        fingerprint = '|'.join(str(value) for value in row)
+        return {
+            'etag': hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:20],
+            'last_modified': max(timestamps) if timestamps else None
+        }
+
+    @staticmethod
+    def _class_names_aggregate():
+        """Scalar subquery of all lipid classes as 'id:name' joined in class_id order"""
+        pair = cast(LipidClass.class_id, String) + ':' + LipidClass.class_name
+        if db.session.get_bind().dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import aggregate_order_by
+            return db.session.query(func.string_agg(pair, aggregate_order_by(',', LipidClass.class_id))).scalar_subquery()
+        pairs = db.session.query(pair.label('pair')).order_by(LipidClass.class_id).subquery()
+        return db.session.query(func.group_concat(pairs.c.pair, ',')).scalar_subquery()
+
+    @staticmethod
+    def encode_browse_cursor(lipid_name, lipid_id):
+        """Opaque cursor for the browse keyset (lipid_name, lipid_id)"""
+        raw = json.dumps([lipid_name, lipid_id], separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_browse_cursor(cursor):
+        """Cursor → (lipid_name, lipid_id); ValueError for anything not made by encode_browse_cursor"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            lipid_name, lipid_id = json.loads(raw)
+        except Exception:
+            raise ValueError(f"Invalid browse cursor: {cursor!r}")
+        if not isinstance(lipid_name, str) or not isinstance(lipid_id, int):
+            raise ValueError(f"Invalid browse cursor: {cursor!r}")
+        return lipid_name, lipid_id
+
+    def browse_lipids(self, search=None, class_name=None, rt_min=None, rt_max=None,
+                      multi_ion=False, after=None, limit=50):
+        """
+        One page of the lipid browser, keyset-paginated on (lipid_name, lipid_id).
+        `after` is a cursor from a previous page. The page is read straight off
+        idx_main_lipids_name_id and ion counts are per-row index lookups, so the
+        cost depends on the page size, not on the library size (no OFFSET, no COUNT).
+        Returns {'items': [...], 'next_cursor': str or None}.
+        """
+        ion_count = db.session.query(
+            func.count(AnnotatedIon.ion_id)
+        ).filter(
+            AnnotatedIon.main_lipid_id == MainLipid.lipid_id
+        ).correlate(MainLipid).scalar_subquery()
+
+        query = db.session.query(
+            MainLipid.lipid_id,
+            MainLipid.lipid_name,
+            MainLipid.api_code,
+            MainLipid.retention_time,
+            MainLipid.precursor_ion,
+            MainLipid.product_ion,
+            LipidClass.class_name,
+            ion_count
+        ).outerjoin(
+            LipidClass, MainLipid.class_id == LipidClass.class_id
+        )
+
+        if search:
+            query = query.filter(MainLipid.lipid_name.ilike(f'%{search}%'))
+        if class_name:
+            query = query.filter(LipidClass.class_name == class_name)
+        if rt_min is not None:
+            query = query.filter(MainLipid.retention_time >= rt_min)
+        if rt_max is not None:
+            query = query.filter(MainLipid.retention_time <= rt_max)
+        if multi_ion:
+            query = query.filter(ion_count > 1)
+        if after:
+            query = query.filter(
+                tuple_(MainLipid.lipid_name, MainLipid.lipid_id) > tuple_(*self.decode_browse_cursor(after))
+            )
+
+        # One extra row tells whether there is a next page
+        rows = query.order_by(MainLipid.lipid_name, MainLipid.lipid_id).limit(limit + 1).all()
+        page = rows[:limit]
+
+        items = [
+            {
+                'lipid_id': lipid_id,
+                'lipid_name': lipid_name,
+                'api_code': api_code,
+                'retention_time': retention_time,
+                'precursor_ion': precursor_ion,
+                'product_ion': product_ion,
+                'class_name': class_name or 'Unknown',
+                'annotated_ions_count': ions,
+                'has_multiple_annotations': ions > 1
+            }
+            for lipid_id, lipid_name, api_code, retention_time, precursor_ion, product_ion, class_name, ions in page
+        ]
+        next_cursor = self.encode_browse_cursor(page[-1].lipid_name, page[-1].lipid_id) \
+            if len(rows) > limit else None
+        return {'items': items, 'next_cursor': next_cursor}
+
     def get_lipid_chart_data_optimized(self, lipid_id):
         """
         Get chart data with optimized single query - NO N+1
@@ -351,6 +666,47 @@ class OptimizedDataManager:
         if not lipid:
             return None
             
+        return self._chart_data(lipid)
+    
+    def get_lipids_chart_data_optimized(self, lipid_ids):
+        """
+        Chart data for several lipids as {lipid_id: chart data} (missing ids are absent).
+        Two SELECTs in total whatever the count: lipids joined to their class, then all their ions.
+        """
+        lipids = MainLipid.query.options(
+            joinedload(MainLipid.lipid_class),
+            selectinload(MainLipid.annotated_ions)
+        ).filter(MainLipid.lipid_id.in_(list(lipid_ids))).all()
+        
+        return {lipid.lipid_id: self._chart_data(lipid) for lipid in lipids}
+
+    def get_chart_versions(self, lipid_ids):
+        """
+        Version of each lipid's chart inputs as {lipid_id: str} (missing ids are absent), in one SELECT.
+        Built from the lipid's updated_at (bumped by ion changes too, see _touch_ion_parents),
+        its class name and the count / latest id / latest created_at of its ions.
+        """
+        lipid_ids = list(lipid_ids)
+        ions = db.session.query(
+            AnnotatedIon.main_lipid_id.label('lipid_id'),
+            func.count(AnnotatedIon.ion_id).label('ion_count'),
+            func.max(AnnotatedIon.ion_id).label('last_ion_id'),
+            func.max(AnnotatedIon.created_at).label('last_ion_created')
+        ).filter(AnnotatedIon.main_lipid_id.in_(lipid_ids)).group_by(AnnotatedIon.main_lipid_id).subquery()
+
+        rows = db.session.query(
+            MainLipid.lipid_id, MainLipid.updated_at, LipidClass.class_name,
+            ions.c.ion_count, ions.c.last_ion_id, ions.c.last_ion_created
+        ).outerjoin(
+            LipidClass, MainLipid.class_id == LipidClass.class_id
+        ).outerjoin(
+            ions, ions.c.lipid_id == MainLipid.lipid_id
+        ).filter(MainLipid.lipid_id.in_(lipid_ids)).all()
+
+        return {row[0]: '|'.join(str(value) for value in row[1:]) for row in rows}
+
+    @staticmethod
+    def _chart_data(lipid):
         return {
             'lipid_info': {
                 'lipid_id': lipid.lipid_id,
@@ -360,13 +716,16 @@ class OptimizedDataManager:
                 'class_name': lipid.lipid_class.class_name if lipid.lipid_class else 'Unknown'
             },
             'annotated_ions': [ion.to_dict() for ion in lipid.annotated_ions],
-            'xic_data': lipid.xic_data
+            'xic_arrays': lipid.get_xic_arrays()
         }
     
     def get_database_stats(self):
         """
         Get database statistics with efficient queries
         """
+        return self.cache.get_or_load('database_stats', self._load_database_stats)
+    
+    def _load_database_stats(self):
         # Count ALL lipids (don't filter by extraction_success - field may not exist)
         total_lipids = MainLipid.query.count()
         total_ions = AnnotatedIon.query.count() 
@@ -380,28 +739,84 @@ class OptimizedDataManager:
             'database_url': os.getenv('DATABASE_URL', 'Local PostgreSQL')
         }
     
-    def search_lipids_optimized(self, query):
+    def get_dashboard_stats(self):
         """
-        Search lipids with proper eager loading
+        Dashboard snapshot (DashboardStats.to_dict()) with one primary-key lookup. A missing,
+        stale or expired snapshot is refreshed by one thread at a time; other threads keep
+        serving the previous one meanwhile.
         """
-        lipids = MainLipid.query.options(
-            joinedload(MainLipid.lipid_class)
-        ).filter(
-            MainLipid.lipid_name.ilike(f'%{query}%'),
-            MainLipid.extraction_success == True
-        ).all()
-        
-        return [
-            {
-                'lipid_id': lipid.lipid_id,
-                'lipid_name': lipid.lipid_name,
-                'api_code': lipid.api_code,
-                'retention_time': lipid.retention_time,
-                'class_name': lipid.lipid_class.class_name if lipid.lipid_class else 'Unknown',
-                'annotated_ions_count': len(lipid.annotated_ions)
+        snapshot = db.session.execute(
+            db.select(DashboardStats).where(DashboardStats.name == DASHBOARD_SNAPSHOT)
+            .execution_options(populate_existing=True)
+        ).scalar_one_or_none()
+        expired = snapshot is None or snapshot.is_stale or snapshot.refreshed_at is None or \
+            (datetime.utcnow() - snapshot.refreshed_at).total_seconds() > self.dashboard_max_age
+        if not expired:
+            return snapshot.to_dict()
+        if snapshot is not None and not self._dashboard_refresh_lock.acquire(blocking=False):
+            return snapshot.to_dict()
+        if snapshot is None:
+            self._dashboard_refresh_lock.acquire()
+        try:
+            return self.refresh_dashboard_stats()
+        finally:
+            self._dashboard_refresh_lock.release()
+    
+    def refresh_dashboard_stats(self, recent_limit=DASHBOARD_RECENT_LIPIDS):
+        """Recompute the dashboard snapshot and store it in its own transaction"""
+        lipids, classes, ions = MainLipid.__table__, LipidClass.__table__, AnnotatedIon.__table__
+        with db.engine.begin() as conn:
+            total_lipids = conn.execute(db.select(func.count()).select_from(lipids)).scalar()
+            total_classes = conn.execute(db.select(func.count()).select_from(classes)).scalar()
+            total_annotations = conn.execute(db.select(func.count()).select_from(ions)).scalar()
+            class_counts = [{'class_name': class_name, 'count': count} for class_name, count in conn.execute(
+                db.select(classes.c.class_name, func.count(lipids.c.lipid_id))
+                .select_from(classes.outerjoin(lipids, lipids.c.class_id == classes.c.class_id))
+                .group_by(classes.c.class_id, classes.c.class_name).order_by(classes.c.class_name))]
+            recent_lipids = [{
+                'lipid_id': row.lipid_id,
+                'lipid_name': row.lipid_name,
+                'api_code': row.api_code,
+                'retention_time': row.retention_time,
+                'class_name': row.class_name or 'Unknown'
+            } for row in conn.execute(
+                db.select(lipids.c.lipid_id, lipids.c.lipid_name, lipids.c.api_code, lipids.c.retention_time,
+                          classes.c.class_name)
+                .select_from(lipids.outerjoin(classes, lipids.c.class_id == classes.c.class_id))
+                .where(lipids.c.extraction_success == True)
+                .order_by(lipids.c.created_at.desc(), lipids.c.lipid_id.desc()).limit(recent_limit))]
+            
+            values = {
+                'total_lipids': total_lipids,
+                'total_classes': total_classes,
+                'total_annotations': total_annotations,
+                'class_counts': class_counts,
+                'recent_lipids': recent_lipids,
+                'is_stale': False,
+                'refreshed_at': datetime.utcnow()
             }
-            for lipid in lipids
-        ]
+            table = DashboardStats.__table__
+            updated = conn.execute(table.update().where(table.c.name == DASHBOARD_SNAPSHOT).values(**values))
+            if not updated.rowcount:
+                conn.execute(table.insert().values(name=DASHBOARD_SNAPSHOT, **values))
+        
+        snapshot = DashboardStats(name=DASHBOARD_SNAPSHOT, **values)
+        return snapshot.to_dict()
+    
+    def search_lipids_optimized(self, query, limit=20):
+        """
+        Ranked name/API-code search from the in-memory trigram index.
+        Like the old ILIKE search it only covers lipids with extraction_success;
+        limit=None returns every match.
+        The index is built from the listing query and cached, so it is rebuilt
+        after commits to the lipid tables (and on TTL expiry across workers).
+        """
+        index = self.cache.get_or_load('lipid_search_index', self._load_lipid_search_index)
+        return [dict(lipid, score=score) for lipid, score in index.search(query, limit=limit)]
+    
+    def _load_lipid_search_index(self):
+        from search_index import build_lipid_index
+        return build_lipid_index(self.get_lipid_listing(extracted_only=True))
     
     def filter_by_class_optimized(self, class_name):
         """
@@ -431,6 +846,9 @@ class OptimizedDataManager:
         """
         Get a small sample of lipids for homepage - ULTRA FAST
         """
+        return self.cache.get_or_load(('lipids_sample', limit), lambda: self._load_lipids_sample(limit))
+    
+    def _load_lipids_sample(self, limit):
         lipids = MainLipid.query.options(
             joinedload(MainLipid.lipid_class)
         ).filter(
@@ -449,7 +867,76 @@ class OptimizedDataManager:
         ]
 
 # Create global optimized manager
-optimized_manager = OptimizedDataManager()
+optimized_manager = OptimizedDataManager(cache_ttl=int(os.getenv('LIPID_CACHE_TTL', 300)),
+                                         dashboard_max_age=int(os.getenv('DASHBOARD_STATS_MAX_AGE', 300)))
+
+# Invalidate the lipid query cache after commits that changed lipid tables
+CACHED_LIPID_MODELS = (MainLipid, LipidClass, AnnotatedIon)
+LIPID_CACHE_DIRTY = 'lipid_cache_dirty'
+
+def _mark_lipid_cache_dirty(session):
+    session.info[LIPID_CACHE_DIRTY] = True
+
+@event.listens_for(Session, 'before_flush')
+def _track_lipid_changes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, CACHED_LIPID_MODELS):
+            _mark_lipid_cache_dirty(session)
+            return
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_lipid_bulk_changes(orm_execute_state):
+    """query.update()/delete() and insert()/update()/delete() statements bypass the flush"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in CACHED_LIPID_MODELS:
+            _mark_lipid_cache_dirty(orm_execute_state.session)
+
+ION_PARENTS_TOUCHED = 'ion_parents_touched'
+
+@event.listens_for(Session, 'before_flush')
+def _collect_ion_parents(session, flush_context, instances):
+    """Lipids whose ions are added, changed or deleted in this flush"""
+    parents = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, AnnotatedIon):
+            history = inspect(obj).attrs.main_lipid_id.history
+            parents.update(value for value in (obj.main_lipid_id, *history.deleted) if value is not None)
+    if parents:
+        session.info.setdefault(ION_PARENTS_TOUCHED, set()).update(parents)
+
+@event.listens_for(Session, 'after_flush')
+def _touch_ion_parents(session, flush_context):
+    """
+    AnnotatedIon has no updated_at: bump the parent lipid's instead, so versions built
+    from MainLipid.updated_at (chart payload cache) change when only an ion was edited
+    """
+    parents = session.info.pop(ION_PARENTS_TOUCHED, None)
+    if parents:
+        table = MainLipid.__table__
+        session.connection().execute(table.update().where(
+            table.c.lipid_id.in_(sorted(parents))).values(updated_at=func.current_timestamp()))
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_lipid_cache(session):
+    if session.info.pop(LIPID_CACHE_DIRTY, False):
+        optimized_manager.cache.invalidate()
+        _mark_dashboard_stats_stale(session)
+
+def _mark_dashboard_stats_stale(session):
+    """One UPDATE on a separate transaction; the next dashboard reader refreshes the snapshot"""
+    try:
+        table = DashboardStats.__table__
+        with session.get_bind().begin() as conn:
+            conn.execute(table.update().where(table.c.is_stale == False).values(is_stale=True))
+    except Exception as e:
+        print(f"⚠️ Could not mark dashboard stats stale (run migrate_dashboard_stats.py): {e}")
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_lipid_changes(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop(LIPID_CACHE_DIRTY, None)
+        session.info.pop(ION_PARENTS_TOUCHED, None)
 
 # Compatibility functions
 def get_db_stats():
@@ -460,9 +947,9 @@ def get_lipids_by_class(class_name):
     """Optimized class filtering"""
     return optimized_manager.filter_by_class_optimized(class_name)
 
-def search_lipids(query):
-    """Optimized search"""
-    return optimized_manager.search_lipids_optimized(query)
+def search_lipids(query, limit=None):
+    """Optimized search (all matches unless a limit is given)"""
+    return optimized_manager.search_lipids_optimized(query, limit=limit)
 
 def init_db(app):
     """Initialize database"""
@@ -615,7 +1102,15 @@ class ChartZoomSettings(db.Model):
     @staticmethod
     def get_all_zoom_settings():
         """Get all zoom settings as a dictionary, admin defaults take precedence"""
-        settings = ChartZoomSettings.query.order_by(ChartZoomSettings.is_admin_default.desc()).all()
+        return ChartZoomSettings.get_zoom_settings()
+    
+    @staticmethod
+    def get_zoom_settings(lipid_ids=None):
+        """Zoom settings of the given lipids (all lipids when None) keyed '<lipid_id>_<chart_type>'"""
+        query = ChartZoomSettings.query
+        if lipid_ids is not None:
+            query = query.filter(ChartZoomSettings.lipid_id.in_(list(lipid_ids)))
+        settings = query.order_by(ChartZoomSettings.is_admin_default.desc()).all()
         result = {}
         for setting in settings:
             key = f"{setting.lipid_id}_{setting.chart_type}"
@@ -655,6 +1150,56 @@ class ChartZoomSettings(db.Model):
         db.session.commit()
         return setting
     
+    @staticmethod
+    def upsert_zoom_settings(settings, user_id=None):
+        """
+        Save many {lipid_id, chart_type, zoom_start, zoom_end} settings with one native
+        INSERT ... ON CONFLICT (lipid_id, chart_type) DO UPDATE (PostgreSQL/SQLite), same
+        semantics as save_zoom_setting: existing rows keep their creator and admin flag.
+        Later entries for the same lipid/chart win. Returns the number of rows written.
+        """
+        rows = {}
+        for setting in settings:
+            rows[(setting['lipid_id'], setting['chart_type'])] = {
+                'lipid_id': setting['lipid_id'],
+                'chart_type': setting['chart_type'],
+                'zoom_start': setting['zoom_start'],
+                'zoom_end': setting['zoom_end'],
+                'is_admin_default': False,
+                'created_by': user_id
+            }
+        if not rows:
+            return 0
+        
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            # No native upsert: read-then-write per row, still one transaction
+            for row in rows.values():
+                setting = ChartZoomSettings.query.filter_by(lipid_id=row['lipid_id'], chart_type=row['chart_type']).first()
+                if setting:
+                    setting.zoom_start, setting.zoom_end = row['zoom_start'], row['zoom_end']
+                else:
+                    db.session.add(ChartZoomSettings(**row))
+            db.session.commit()
+            return len(rows)
+        
+        statement = dialect_insert(ChartZoomSettings.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=['lipid_id', 'chart_type'],
+            set_={
+                'zoom_start': statement.excluded.zoom_start,
+                'zoom_end': statement.excluded.zoom_end,
+                'updated_at': db.func.current_timestamp()
+            }
+        )
+        db.session.execute(statement.values(list(rows.values())))
+        db.session.commit()
+        return len(rows)
+    
     @staticmethod
     def delete_zoom_settings(lipid_id):
         """Delete all zoom settings for a lipid"""
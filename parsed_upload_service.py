@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+PARSED UPLOAD SERVICE
+Parse an uploaded area workbook once and reuse it across requests.
+A ParsedUpload holds the compound names, data column names with sample/NIST
+indices, a cleaned float64 area matrix and per-sheet summaries. It is cached
+per calculation session in memory (LRU) and as an .npz next to the upload, so
+compound breakdowns, ratio previews and debug views never re-read the xlsx.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from batch_calculation_service import detect_header_rows
+
+SAMPLE_PREFIX = 'PH-HC_'
+
+
+def _summary_value(value):
+    """JSON-safe cell value for the per-sheet summaries"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value if isinstance(value, (bool, int, float)) else str(value)
+
+
+class ParsedUpload:
+    """Area matrix of the main sheet of one upload (all rows, header rows included)"""
+
+    def __init__(self, compound_names, columns, values, text_mask, sheet_summaries, version=None):
+        self.compound_names = [str(name) for name in compound_names]
+        self.columns = [str(col) for col in columns]
+        self.values = values
+        self.text_mask = text_mask
+        self.sheet_summaries = sheet_summaries
+        self.version = version
+        self._column_index = {col: idx for idx, col in enumerate(self.columns)}
+        self.header_rows = self._detect_header_rows()
+        self.compound_positions = {}      # Compound name → first row after the header rows
+        for position, name in enumerate(self.compounds):
+            self.compound_positions.setdefault(name, position)
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_sheets(cls, sheets, version=None):
+        """Build from the {sheet_name: DataFrame} returned by pd.read_excel(sheet_name=None)"""
+        sheet_summaries = {}
+        for sheet_name, sheet_data in sheets.items():
+            sheet_summaries[str(sheet_name)] = {
+                'shape': list(sheet_data.shape),
+                'columns': [str(col) for col in sheet_data.columns[:10]],   # First 10 columns
+                'first_row': [_summary_value(val) for val in sheet_data.iloc[0, :5].tolist()]
+                             if len(sheet_data) > 0 else []
+            }
+
+        main_data = next(iter(sheets.values()))
+        compound_names = main_data.iloc[:, 0].astype(str).str.strip().tolist()
+        raw_block = main_data.iloc[:, 1:]
+        values = raw_block.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        text_mask = raw_block.notna().to_numpy() & np.isnan(values)
+        return cls(compound_names, list(raw_block.columns), values, text_mask, sheet_summaries, version)
+
+    @classmethod
+    def from_workbook(cls, source, version=None):
+        """Parse every sheet of a workbook (path or file object) exactly once"""
+        return cls.from_sheets(pd.read_excel(source, sheet_name=None), version)
+
+    def save(self, path):
+        """Write the binary copy (atomic replace so readers never see a partial file)"""
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.npz')
+        with os.fdopen(fd, 'wb') as handle:
+            np.savez(
+                handle,
+                compound_names=np.array(self.compound_names, dtype=str),
+                columns=np.array(self.columns, dtype=str),
+                values=self.values,
+                text_mask=self.text_mask,
+                meta=np.array(json.dumps({'sheet_summaries': self.sheet_summaries, 'version': self.version}))
+            )
+        os.replace(temp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz['meta']))
+            return cls(npz['compound_names'].tolist(), npz['columns'].tolist(), npz['values'],
+                       npz['text_mask'], meta['sheet_summaries'], meta.get('version'))
+
+    # ------------------------------------------------------------------
+    # Access
+    # ------------------------------------------------------------------
+
+    def _detect_header_rows(self):
+        leading = (self.compound_names + ['', ''])[:2]
+        return detect_header_rows(pd.DataFrame({'name': leading}))
+
+    @property
+    def compounds(self):
+        """Compound names after the header rows"""
+        return self.compound_names[self.header_rows:]
+
+    @property
+    def area_values(self):
+        """Float area matrix after the header rows (rows = compounds, cols = data columns)"""
+        return self.values[self.header_rows:]
+
+    @property
+    def sample_column_indices(self):
+        return [idx for idx, col in enumerate(self.columns) if col.startswith(SAMPLE_PREFIX)]
+
+    @property
+    def nist_column_indices(self):
+        return [idx for idx, col in enumerate(self.columns) if 'NIST' in col]
+
+    def column_index(self, column):
+        return self._column_index.get(str(column))
+
+    def area(self, row, column):
+        """Area of a compound row (after headers) in a data column; NaN when empty or text"""
+        return float(self.area_values[row, self._column_index[str(column)]])
+
+    def area_frame(self):
+        """Area matrix as a DataFrame view for code written against .iloc[row][column]"""
+        return pd.DataFrame(self.area_values, columns=self.columns)
+
+
+class ParsedUploadCache:
+    """Per-session ParsedUpload cache: in-memory LRU backed by an on-disk .npz copy"""
+
+    def __init__(self, max_sessions=8, base_dir=None):
+        self.max_sessions = max_sessions
+        self.base_dir = base_dir or tempfile.gettempdir()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'parses': 0}
+
+    def binary_path(self, session_id):
+        return os.path.join(self.base_dir, f"metabolomics_parsed_{session_id}.npz")
+
+    def _remember(self, session_id, parsed):
+        with self._lock:
+            self._entries[session_id] = parsed
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def put(self, session_id, parsed):
+        """Cache a freshly parsed upload in memory and on disk"""
+        self._remember(session_id, parsed)
+        try:
+            parsed.save(self.binary_path(session_id))
+        except OSError as e:
+            print(f"⚠️ Could not write parsed upload cache: {e}")
+        return parsed
+
+    def get(self, session_id, version=None, source_path=None):
+        """
+        ParsedUpload for a session, or None when nothing is cached and no source is given.
+        A cached copy whose version differs from `version` (a re-upload) is rebuilt.
+        """
+        with self._lock:
+            parsed = self._entries.get(session_id)
+            if parsed is not None and (version is None or parsed.version == version):
+                self._entries.move_to_end(session_id)
+                self.stats['memory_hits'] += 1
+                return parsed
+
+        binary_path = self.binary_path(session_id)
+        if os.path.exists(binary_path):
+            try:
+                parsed = ParsedUpload.load(binary_path)
+                if version is None or parsed.version == version:
+                    self.stats['disk_hits'] += 1
+                    self._remember(session_id, parsed)
+                    return parsed
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Ignoring unreadable parsed upload cache {binary_path}: {e}")
+
+        if not source_path or not os.path.exists(source_path):
+            return None
+        self.stats['parses'] += 1
+        print(f"📊 Parsing upload once for session {session_id}")
+        return self.put(session_id, ParsedUpload.from_workbook(source_path, version))
+
+    def forget(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+
+# Global instance
+parsed_upload_cache = ParsedUploadCache()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+PEAK AREA SERVICE
+Integrated peak areas of annotated ions over their integration windows
+(AnnotatedIon.int_start / int_end), stored in ion_peak_areas so comparisons
+never need the XIC again.
+
+Integration is trapezoidal over the trace, with the window ends interpolated
+onto the trace, and is vectorized over all windows of a lipid (one cumulative
+integral, then searchsorted lookups). Baseline modes:
+  none    area above zero intensity
+  linear  area above the straight line joining the trace at the window ends
+  min     area above the lowest intensity in the window
+Runs are incremental: only ions whose window, XIC (MainLipid.updated_at) or
+method version changed since their stored row are recomputed.
+"""
+
+import time
+
+import numpy as np
+from sqlalchemy import and_, delete, insert, select
+
+from models import db, AnnotatedIon, IonPeakArea, MainLipid
+from xic_storage import xic_arrays
+
+# Bump whenever integrate_windows results change for the same inputs (forces a full recompute)
+PEAK_AREA_METHOD_VERSION = 1
+
+BASELINES = ('none', 'linear', 'min')
+DEFAULT_BASELINE = 'linear'
+DEFAULT_BATCH_SIZE = 100   # Lipids (XIC traces) loaded per batch
+
+
+def integrate_windows(times, intensities, starts, ends, baseline=DEFAULT_BASELINE):
+    """
+    Trapezoid areas of a trace over many [start, end] windows at once.
+    times must be ascending. Windows are clipped to the trace; windows without overlap get NaN.
+    Returns a dict of arrays: area, peak_height / apex_time (highest sample inside the window,
+    NaN when it holds none) and points (samples inside the window).
+    """
+    if baseline not in BASELINES:
+        raise ValueError(f"Unknown baseline: {baseline} (use one of {', '.join(BASELINES)})")
+    times = np.asarray(times, dtype=np.float64)
+    intensities = np.asarray(intensities, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    count = len(starts)
+    result = {'area': np.full(count, np.nan), 'peak_height': np.full(count, np.nan),
+              'apex_time': np.full(count, np.nan), 'points': np.zeros(count, dtype=np.int64)}
+    if len(times) < 2 or not count:
+        return result
+
+    a = np.clip(starts, times[0], times[-1])
+    b = np.clip(ends, times[0], times[-1])
+    valid = (b > a) & np.isfinite(a) & np.isfinite(b)
+
+    # Cumulative trapezoid integral at every sample, then at any time by interpolation
+    widths = np.diff(times)
+    cumulative = np.concatenate(([0.0], np.cumsum(widths * (intensities[1:] + intensities[:-1]) / 2)))
+
+    def at(x):
+        k = np.clip(np.searchsorted(times, x, side='right') - 1, 0, len(times) - 2)
+        width = widths[k]
+        slope = np.divide(intensities[k + 1] - intensities[k], width, out=np.zeros_like(x), where=width > 0)
+        y = intensities[k] + slope * (x - times[k])
+        return cumulative[k] + (x - times[k]) * (intensities[k] + y) / 2, y
+
+    integral_a, y_a = at(a)
+    integral_b, y_b = at(b)
+    area = integral_b - integral_a
+
+    # Samples inside each window as a padded (windows x longest window) matrix
+    lo = np.searchsorted(times, a, side='left')
+    hi = np.searchsorted(times, b, side='right')
+    points = np.where(valid, hi - lo, 0)
+    width = int(points.max()) if count else 0
+    if width:
+        index = lo[:, None] + np.arange(width)
+        inside = np.arange(width) < points[:, None]
+        samples = intensities[np.minimum(index, len(times) - 1)]
+        apex = np.argmax(np.where(inside, samples, -np.inf), axis=1)
+        has_samples = points > 0
+        rows = np.arange(count)
+        result['peak_height'] = np.where(has_samples, samples[rows, apex], np.nan)
+        result['apex_time'] = np.where(has_samples, times[np.minimum(lo + apex, len(times) - 1)], np.nan)
+        window_min = np.where(has_samples, np.where(inside, samples, np.inf).min(axis=1), np.inf)
+    else:
+        window_min = np.full(count, np.inf)
+
+    if baseline == 'linear':
+        area = area - (b - a) * (y_a + y_b) / 2
+    elif baseline == 'min':
+        area = area - (b - a) * np.minimum(window_min, np.minimum(y_a, y_b))
+
+    result['area'] = np.where(valid, area, np.nan)
+    result['points'] = points
+    return result
+
+
+def _optional(value):
+    return None if value is None or not np.isfinite(value) else float(value)
+
+
+class PeakAreaService:
+    """Incremental batch job + lookups for ion_peak_areas"""
+
+    def _stale_ions(self, session, baseline, lipid_ids=None):
+        """
+        [(ion_id, main_lipid_id)] of ions without a current row for this baseline. One SELECT;
+        inputs are compared in Python so timestamps compare as values on every backend
+        (SQLite keeps DATETIME as text in whichever format wrote it).
+        """
+        stored = and_(IonPeakArea.ion_id == AnnotatedIon.ion_id, IonPeakArea.baseline == baseline)
+        query = select(
+            AnnotatedIon.ion_id, AnnotatedIon.main_lipid_id, AnnotatedIon.int_start, AnnotatedIon.int_end,
+            MainLipid.updated_at, IonPeakArea.main_lipid_id, IonPeakArea.int_start, IonPeakArea.int_end,
+            IonPeakArea.lipid_version, IonPeakArea.method_version
+        ).join(MainLipid, MainLipid.lipid_id == AnnotatedIon.main_lipid_id).outerjoin(IonPeakArea, stored)
+        if lipid_ids is not None:
+            query = query.where(AnnotatedIon.main_lipid_id.in_(list(lipid_ids)))
+        query = query.order_by(AnnotatedIon.main_lipid_id, AnnotatedIon.ion_id)
+        current = lambda row: row[5:] == (row[1], row[2], row[3], row[4], PEAK_AREA_METHOD_VERSION)
+        return [(row[0], row[1]) for row in session.execute(query) if not current(row)]
+
+    def compute(self, baseline=DEFAULT_BASELINE, force=False, batch_size=DEFAULT_BATCH_SIZE,
+                session=None, progress=None):
+        """
+        (Re)compute stale peak areas for one baseline (every ion with force=True), committing
+        per batch of lipids. Rows of deleted ions are removed. Returns run stats.
+        """
+        if baseline not in BASELINES:
+            raise ValueError(f"Unknown baseline: {baseline} (use one of {', '.join(BASELINES)})")
+        session = session or db.session
+        started = time.time()
+
+        if force:
+            todo = session.execute(select(AnnotatedIon.ion_id, AnnotatedIon.main_lipid_id).where(
+                AnnotatedIon.main_lipid_id.isnot(None)).order_by(AnnotatedIon.main_lipid_id, AnnotatedIon.ion_id)).all()
+        else:
+            todo = self._stale_ions(session, baseline)
+        ions_by_lipid = {}
+        for ion_id, lipid_id in todo:
+            ions_by_lipid.setdefault(lipid_id, []).append(ion_id)
+
+        stats = {'baseline': baseline, 'lipids': len(ions_by_lipid), 'computed': 0, 'without_area': 0,
+                 'removed': 0, 'seconds': None}
+        lipid_ids = list(ions_by_lipid)
+        for offset in range(0, len(lipid_ids), batch_size):
+            batch = lipid_ids[offset:offset + batch_size]
+            ion_ids = [ion_id for lipid_id in batch for ion_id in ions_by_lipid[lipid_id]]
+            rows = self._compute_batch(session, batch, ion_ids, baseline)
+            session.execute(delete(IonPeakArea).where(IonPeakArea.ion_id.in_(ion_ids),
+                                                      IonPeakArea.baseline == baseline))
+            if rows:
+                session.execute(insert(IonPeakArea), rows)
+            session.commit()
+            stats['computed'] += len(rows)
+            stats['without_area'] += sum(1 for row in rows if row['area'] is None)
+            if progress:
+                progress(offset + len(batch), len(lipid_ids))
+
+        orphans = delete(IonPeakArea).where(~IonPeakArea.ion_id.in_(select(AnnotatedIon.ion_id)))
+        stats['removed'] = session.execute(orphans).rowcount or 0
+        session.commit()
+        stats['seconds'] = round(time.time() - started, 3)
+        return stats
+
+    def _compute_batch(self, session, lipid_ids, ion_ids, baseline):
+        """Rows for ion_peak_areas: one trace load per lipid, one vectorized integration per lipid"""
+        traces = {lipid_id: (version, xic_arrays(blob, data)) for lipid_id, version, blob, data in session.execute(
+            select(MainLipid.lipid_id, MainLipid.updated_at, MainLipid.xic_blob, MainLipid.xic_data)
+            .where(MainLipid.lipid_id.in_(lipid_ids)))}
+        ions = session.execute(select(AnnotatedIon.ion_id, AnnotatedIon.main_lipid_id, AnnotatedIon.int_start,
+                                      AnnotatedIon.int_end).where(AnnotatedIon.ion_id.in_(ion_ids))).all()
+
+        ions_by_lipid = {}
+        for ion in ions:
+            ions_by_lipid.setdefault(ion.main_lipid_id, []).append(ion)
+
+        rows = []
+        for lipid_id, lipid_ions in ions_by_lipid.items():
+            version, (times, intensities) = traces[lipid_id]
+            if np.any(np.diff(times) < 0):
+                order = np.argsort(times, kind='stable')
+                times, intensities = times[order], intensities[order]
+            starts = np.array([ion.int_start if ion.int_start is not None else np.nan for ion in lipid_ions])
+            ends = np.array([ion.int_end if ion.int_end is not None else np.nan for ion in lipid_ions])
+            result = integrate_windows(times, intensities, starts, ends, baseline)
+            for idx, ion in enumerate(lipid_ions):
+                rows.append({
+                    'ion_id': ion.ion_id,
+                    'baseline': baseline,
+                    'main_lipid_id': lipid_id,
+                    'area': _optional(result['area'][idx]),
+                    'peak_height': _optional(result['peak_height'][idx]),
+                    'apex_time': _optional(result['apex_time'][idx]),
+                    'points': int(result['points'][idx]),
+                    'int_start': ion.int_start,
+                    'int_end': ion.int_end,
+                    'lipid_version': version,
+                    'method_version': PEAK_AREA_METHOD_VERSION
+                })
+        return rows
+
+    def get_peak_areas(self, lipid_ids, baseline=DEFAULT_BASELINE):
+        """
+        Stored areas as {lipid_id: [row, ...]} for the given lipids (two SELECTs); rows whose
+        inputs changed since they were computed carry 'stale': True until the next run
+        """
+        if baseline not in BASELINES:
+            raise ValueError(f"Unknown baseline: {baseline} (use one of {', '.join(BASELINES)})")
+        lipid_ids = list(lipid_ids)
+        rows = db.session.query(IonPeakArea, AnnotatedIon.ion_lipid_name, AnnotatedIon.annotation_type).join(
+            AnnotatedIon, AnnotatedIon.ion_id == IonPeakArea.ion_id
+        ).filter(
+            IonPeakArea.main_lipid_id.in_(lipid_ids), IonPeakArea.baseline == baseline
+        ).order_by(IonPeakArea.main_lipid_id, IonPeakArea.ion_id).all()
+        stale = {ion_id for ion_id, _ in self._stale_ions(db.session, baseline, lipid_ids)}
+
+        areas = {lipid_id: [] for lipid_id in lipid_ids}
+        for peak_area, ion_lipid_name, annotation_type in rows:
+            entry = peak_area.to_dict()
+            entry.update({'ion_lipid_name': ion_lipid_name, 'annotation_type': annotation_type,
+                          'stale': peak_area.ion_id in stale})
+            areas[peak_area.main_lipid_id].append(entry)
+        return areas, sorted(stale)
+
+    def get_stats(self):
+        """Stored rows per baseline and ions waiting for a (re)computation"""
+        counts = dict(db.session.query(IonPeakArea.baseline, db.func.count()).group_by(IonPeakArea.baseline).all())
+        return {baseline: {'rows': counts.get(baseline, 0),
+                           'stale_ions': len(self._stale_ions(db.session, baseline))}
+                for baseline in BASELINES}
+
+
+# Global instance
+peak_area_service = PeakAreaService()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+RATIO PREVIEW SERVICE
+Compound × sample ratio table behind /api/ratio-preview-data and the ratio
+preview downloads. Works on the session's ParsedUpload (no workbook re-read):
+ISTD rows and sample → NIST column pairings are resolved once into index
+vectors, then Sample Ratio, NIST Ratio and NIST Result are computed for every
+compound and sample as whole-matrix arithmetic. Exports cover the whole plate.
+"""
+
+import re
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ISTD = 'LPC 18:1 d7'
+SAMPLE_PREFIX = 'PH-HC_'
+PLATE_SIZE = 100                      # Uploaded PH-HC_5701 is reference sample PH-HC_1
+NIST_REPLICATE = re.compile(r'\((\d+)\)')
+
+# Shown first in the preview so the familiar AcylCarnitine rows are on top
+KEY_COMPOUNDS = [
+    'AcylCarnitine 10:0', 'AcylCarnitine 12:0', 'AcylCarnitine 12:1',
+    'AcylCarnitine 14:0', 'AcylCarnitine 16:0', 'AcylCarnitine 18:0',
+    'AcylCarnitine 18:1', 'AcylCarnitine 20:0'
+]
+
+FULL_COLUMNS = [
+    'Compound', 'ISTD', 'Sample', 'NIST_Column',
+    'Sample_Compound_Area', 'Sample_ISTD_Area', 'Sample_Ratio',
+    'NIST_Compound_Area', 'NIST_ISTD_Area', 'NIST_Ratio', 'NIST_Result',
+    'Data_Source', 'Calculation_Method'
+]
+
+
+def reference_sample_name(sample):
+    """Uploaded sample → Sample Index name by position on its plate (PH-HC_5701 → PH-HC_1, PH-HC_5800 → PH-HC_100)"""
+    try:
+        sample_num = int(str(sample).split('_')[1])
+    except (ValueError, IndexError):
+        return None
+    return f"{SAMPLE_PREFIX}{(sample_num - 1) % PLATE_SIZE + 1}"
+
+
+def _first_containing(names, needle):
+    """Position of the first name containing `needle` (substring match, as the sheet formulas do)"""
+    for position, name in enumerate(names):
+        if needle in name:
+            return position
+    return None
+
+
+def _whole_areas(values):
+    """Areas as whole numbers for the export (truncated, non-positive/missing → 0)"""
+    return np.where(values > 0, np.trunc(np.nan_to_num(values, nan=0.0)), 0).astype(np.int64)
+
+
+class RatioPreviewService:
+    """Vectorized Sample Ratio ÷ NIST Ratio table for one parsed upload"""
+
+    def order_compounds(self, compounds):
+        """Rows to report: key compounds first, then every other named compound once, in upload order"""
+        selected = []
+        seen = set()
+        for key_compound in KEY_COMPOUNDS:
+            position = _first_containing(compounds, key_compound)
+            if position is not None and key_compound not in seen:
+                selected.append((key_compound, position))
+                seen.add(key_compound)
+        for position, name in enumerate(compounds):
+            if name and name != 'nan' and name not in seen:
+                selected.append((name, position))
+                seen.add(name)
+        return selected
+
+    def map_nist_columns(self, samples, nist_columns, sample_mapping):
+        """Sample → uploaded NIST column with the same replicate number as its Sample Index pairing"""
+        by_replicate = {}
+        for col in nist_columns:
+            match = NIST_REPLICATE.search(col)
+            if match:
+                by_replicate.setdefault(match.group(1), col)
+
+        mapping = {}
+        for sample in samples:
+            pattern = sample_mapping.get(reference_sample_name(sample))
+            match = NIST_REPLICATE.search(pattern) if pattern else None
+            mapping[sample] = by_replicate.get(match.group(1)) if match else None
+        return mapping
+
+    def build_table(self, parsed, sample_mapping, compound_istd, max_compounds=None, max_samples=None):
+        """
+        Ratio table for every selected compound × sample.
+
+        sample_mapping: {reference sample: paired NIST column} from SampleIndex
+        compound_istd:  {compound: istd} from CompoundIndex
+        max_compounds / max_samples limit the preview; None means the whole plate.
+        Returns {'table': DataFrame (FULL_COLUMNS), 'compounds', 'samples', 'nist_columns', 'summary_stats'}.
+        """
+        compounds = parsed.compounds
+        areas = parsed.area_values
+        sample_indices = parsed.sample_column_indices
+        nist_indices = parsed.nist_column_indices
+        samples = [parsed.columns[idx] for idx in sample_indices][:max_samples]
+        sample_indices = sample_indices[:len(samples)]
+        nist_columns = [parsed.columns[idx] for idx in nist_indices]
+
+        # ------------------------------------------------------------------
+        # Index vectors: compound row, ISTD row (per compound), NIST column (per sample)
+        # ------------------------------------------------------------------
+        istd_rows = {}
+        compound_rows, istd_row_vector, istd_names, kept = [], [], [], []
+        for name, position in self.order_compounds(compounds):
+            istd_name = compound_istd.get(name) or DEFAULT_ISTD
+            if istd_name not in istd_rows:
+                istd_rows[istd_name] = _first_containing(compounds, istd_name)
+            if istd_rows[istd_name] is None:
+                print(f"⚠️ ISTD '{istd_name}' not found for {name}, skipping...")
+                continue
+            compound_rows.append(position)
+            istd_row_vector.append(istd_rows[istd_name])
+            istd_names.append(istd_name)
+            kept.append(name)
+            if max_compounds is not None and len(kept) >= max_compounds:
+                break
+
+        nist_for_sample = self.map_nist_columns(samples, nist_columns, sample_mapping)
+        nist_positions = np.array([parsed.column_index(nist_for_sample[sample]) if nist_for_sample[sample] else -1
+                                   for sample in samples], dtype=np.int64)
+        has_nist = nist_positions >= 0
+        nist_columns_safe = np.where(has_nist, nist_positions, 0)
+
+        compound_rows = np.array(compound_rows, dtype=np.int64)
+        istd_row_vector = np.array(istd_row_vector, dtype=np.int64)
+        sample_indices = np.array(sample_indices, dtype=np.int64)
+
+        # ------------------------------------------------------------------
+        # Whole-matrix ratios (compounds × samples)
+        # ------------------------------------------------------------------
+        compound_area = areas[np.ix_(compound_rows, sample_indices)]
+        istd_area = areas[np.ix_(istd_row_vector, sample_indices)]
+        nist_compound_area = np.where(has_nist, areas[np.ix_(compound_rows, nist_columns_safe)], np.nan)
+        nist_istd_area = np.where(has_nist, areas[np.ix_(istd_row_vector, nist_columns_safe)], np.nan)
+
+        sample_pair = ~np.isnan(compound_area) & ~np.isnan(istd_area)
+        nist_pair = ~np.isnan(nist_compound_area) & ~np.isnan(nist_istd_area)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sample_ratio = np.where(sample_pair & (istd_area != 0), compound_area / istd_area, np.nan)
+            nist_ratio = np.where(nist_pair & (nist_istd_area != 0), nist_compound_area / nist_istd_area, np.nan)
+            nist_result = np.where(~np.isnan(sample_ratio) & ~np.isnan(nist_ratio) & (nist_ratio != 0),
+                                   sample_ratio / nist_ratio, np.nan)
+
+        # ------------------------------------------------------------------
+        # Long table, compound-major (one row per compound × sample)
+        # ------------------------------------------------------------------
+        n_compounds, n_samples = len(kept), len(samples)
+        nist_labels = np.array([nist_for_sample[sample] or 'N/A' for sample in samples], dtype=object)
+        table = pd.DataFrame({
+            'Compound': np.repeat(np.array(kept, dtype=object), n_samples),
+            'ISTD': np.repeat(np.array(istd_names, dtype=object), n_samples),
+            'Sample': np.tile(np.array(samples, dtype=object), n_compounds),
+            'NIST_Column': np.tile(nist_labels, n_compounds),
+            'Sample_Compound_Area': _whole_areas(np.where(sample_pair, compound_area, 0)).ravel(),
+            'Sample_ISTD_Area': _whole_areas(np.where(sample_pair, istd_area, 0)).ravel(),
+            'Sample_Ratio': sample_ratio.ravel(),
+            'NIST_Compound_Area': _whole_areas(np.where(nist_pair, nist_compound_area, 0)).ravel(),
+            'NIST_ISTD_Area': _whole_areas(np.where(nist_pair, nist_istd_area, 0)).ravel(),
+            'NIST_Ratio': nist_ratio.ravel(),
+            'NIST_Result': nist_result.ravel(),
+            'Data_Source': 'Excel + Database',
+            'Calculation_Method': 'Sample_Ratio ÷ NIST_Ratio',
+        }, columns=FULL_COLUMNS)
+
+        valid_results = nist_result[~np.isnan(nist_result)]
+        summary_stats = {
+            'total_calculations': int(table.shape[0]),
+            'valid_results': int(valid_results.size),
+            'compounds_analyzed': n_compounds,
+            'samples_analyzed': n_samples,
+            'avg_nist_result': round(float(valid_results.mean()), 4) if valid_results.size else 0,
+            'nist_columns_used': len({col for col in nist_for_sample.values() if col}) if n_compounds else 0,
+            'data_sources': 'Excel (Area) + Database (Sample/Compound Index)',
+            'database_samples': len(sample_mapping),
+            'database_compounds': len(compound_istd)
+        }
+        print(f"✅ Ratio table: {n_compounds} compounds × {n_samples} samples, {valid_results.size} valid NIST results")
+
+        return {
+            'table': table,
+            'compounds': kept,
+            'samples': samples,
+            'nist_columns': nist_columns,
+            'summary_stats': summary_stats
+        }
+
+    @staticmethod
+    def preview_records(table):
+        """Display rows for the preview page (ratios formatted, missing values as 'N/A')"""
+        def formatted(column, digits):
+            return [f"{value:.{digits}f}" if not np.isnan(value) else 'N/A' for value in table[column].to_numpy()]
+
+        preview = table[['Compound', 'ISTD', 'Sample', 'NIST_Column']].copy()
+        preview['Sample_Ratio'] = formatted('Sample_Ratio', 6)
+        preview['NIST_Ratio'] = formatted('NIST_Ratio', 6)
+        preview['NIST_Result'] = formatted('NIST_Result', 4)
+        return preview.to_dict('records')
+
+    @staticmethod
+    def export_frame(table):
+        """Export values: missing ratios/results written as 0 like the original downloads"""
+        return table.fillna({'Sample_Ratio': 0.0, 'NIST_Ratio': 0.0, 'NIST_Result': 0.0})
+
+    def export_to_excel(self, table, filename="ratio_preview_export.xlsx"):
+        """Ratio_Calculations sheet plus an Analysis_Summary sheet"""
+        frame = self.export_frame(table)
+        valid = table['NIST_Result'].dropna()
+        valid = valid[valid != 0]
+        summary = pd.DataFrame({
+            'Metric': [
+                'Total Calculations',
+                'Valid NIST Results',
+                'Unique Compounds',
+                'Unique Samples',
+                'Average NIST Result',
+                'Data Source Method',
+                'Formula Used'
+            ],
+            'Value': [
+                len(frame),
+                len(valid),
+                frame['Compound'].nunique(),
+                frame['Sample'].nunique(),
+                f"{valid.mean():.6f}" if len(valid) else "0.000000",
+                'Excel (Area Data) + Database (Sample/Compound Index)',
+                'Sample Ratio ÷ NIST Ratio'
+            ]
+        })
+
+        buffer = BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            frame.to_excel(writer, sheet_name='Ratio_Calculations', index=False)
+            if len(frame):
+                summary.to_excel(writer, sheet_name='Analysis_Summary', index=False)
+        buffer.seek(0)
+        return buffer, filename
+
+    def export_to_csv(self, table, filename="ratio_preview_export.csv"):
+        buffer = BytesIO()
+        self.export_frame(table).to_csv(buffer, index=False, encoding='utf-8')
+        buffer.seek(0)
+        return buffer, filename
+
+
+# Global instance
+ratio_preview_service = RatioPreviewService()
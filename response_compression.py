@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+RESPONSE COMPRESSION
+Negotiated gzip/brotli compression for JSON-heavy API responses.
+Chart payloads and result previews repeat the same keys for every dataset/row,
+so they typically shrink 5-20x. Brotli is used when the optional `brotli`
+package is installed and the client accepts it; gzip otherwise.
+"""
+
+import gzip
+import zlib
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+# Only text-like payloads benefit; xlsx/png downloads are already compressed
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/css',
+    'text/csv',
+    'text/plain',
+    'text/javascript',
+}
+
+DEFAULT_MIN_SIZE = 1024      # Bytes - below this the headers cost more than they save
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 5   # Good ratio at gzip-like CPU cost
+
+
+def parse_accept_encoding(header_value):
+    """Return {encoding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for part in (header_value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        pieces = [p.strip() for p in part.split(';')]
+        encoding = pieces[0].lower()
+        quality = 1.0
+        for param in pieces[1:]:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[encoding] = quality
+    return accepted
+
+
+def choose_encoding(header_value, brotli_enabled=True):
+    """Pick the best supported encoding the client accepts, or None"""
+    accepted = parse_accept_encoding(header_value)
+    wildcard = accepted.get('*', 0.0)
+
+    candidates = []
+    if brotli_enabled and BROTLI_AVAILABLE:
+        candidates.append('br')
+    candidates.append('gzip')
+
+    best, best_q = None, 0.0
+    for encoding in candidates:
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_q:
+            best, best_q = encoding, quality
+    return best
+
+
+def compress_bytes(data, encoding, gzip_level=DEFAULT_GZIP_LEVEL, brotli_quality=DEFAULT_BROTLI_QUALITY):
+    """Compress a complete body in one call"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+def compress_stream(chunks, encoding, gzip_level=DEFAULT_GZIP_LEVEL, brotli_quality=DEFAULT_BROTLI_QUALITY):
+    """Compress a streamed body chunk by chunk, flushing so clients can render early"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=brotli_quality)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # 31 = gzip container
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush(zlib.Z_FINISH)
+
+
+class ResponseCompressor:
+    """Flask after_request hook that compresses eligible responses"""
+
+    def __init__(self, app=None):
+        self.stats = {'compressed': 0, 'skipped': 0, 'bytes_in': 0, 'bytes_out': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE)
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', DEFAULT_GZIP_LEVEL)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', DEFAULT_BROTLI_QUALITY)
+        app.config.setdefault('COMPRESS_BROTLI', True)
+        app.config.setdefault('COMPRESS_STREAMS', True)
+        app.config.setdefault('COMPRESS_MIMETYPES', COMPRESSIBLE_MIMETYPES)
+        app.after_request(self.after_request)
+        app.extensions['response_compressor'] = self
+        self.app = app
+
+    @staticmethod
+    def _weaken_etag(response):
+        """A strong ETag names exact bytes, so the encoded body may only carry a weak one"""
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+
+    def after_request(self, response):
+        from flask import request, current_app
+
+        config = current_app.config
+        if not config['COMPRESS_ENABLED'] or request.method == 'HEAD':
+            return response
+
+        # Always advertise that the body depends on Accept-Encoding
+        response.vary.add('Accept-Encoding')
+
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in config['COMPRESS_MIMETYPES']):
+            return response
+
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''),
+                                   brotli_enabled=config['COMPRESS_BROTLI'])
+        if encoding is None:
+            return response
+
+        gzip_level = config['COMPRESS_GZIP_LEVEL']
+        brotli_quality = config['COMPRESS_BROTLI_QUALITY']
+
+        if response.is_streamed or response.direct_passthrough:
+            if not config['COMPRESS_STREAMS'] or response.direct_passthrough:
+                self.stats['skipped'] += 1
+                return response
+            # Size unknown up front - compress incrementally, drop Content-Length
+            response.response = compress_stream(response.response, encoding, gzip_level, brotli_quality)
+            response.headers.pop('Content-Length', None)
+            self._weaken_etag(response)
+            response.headers['Content-Encoding'] = encoding
+            self.stats['compressed'] += 1
+            return response
+
+        body = response.get_data()
+        if len(body) < config['COMPRESS_MIN_SIZE']:
+            self.stats['skipped'] += 1
+            return response
+
+        compressed = compress_bytes(body, encoding, gzip_level, brotli_quality)
+        if len(compressed) >= len(body):
+            self.stats['skipped'] += 1
+            return response
+
+        response.set_data(compressed)
+        self._weaken_etag(response)
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Content-Length'] = str(len(compressed))
+        self.stats['compressed'] += 1
+        self.stats['bytes_in'] += len(body)
+        self.stats['bytes_out'] += len(compressed)
+        return response
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+RESULT BROWSER SERVICE
+Server-side windowed browsing over stored streamlined calculation sessions.
+Results are kept as NumPy arrays next to the Excel output (in the result store)
+so the UI can page, sort and filter the full substance × sample table without
+downloading the xlsx.
+"""
+
+import io
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Artifact name written into each session of the result store
+SESSION_ARRAYS_FILENAME = 'results.npz'
+
+# Sheet name (API) → array key prefix inside the npz file
+RESULT_SHEETS = {
+    'nist': 'nist',
+    'agilent': 'agilent',
+    'nist_ratio': 'nist_ratio'
+}
+
+FILTER_MODES = ('prefix', 'substring', 'regex')
+
+MAX_ROW_LIMIT = 500
+MAX_COL_LIMIT = 200
+
+
+class ResultBrowserService:
+    """Window, sort and filter stored result matrices by session ID"""
+
+    def __init__(self, store=None, max_cached_sessions=8):
+        self._store = store
+        self._max_cached_sessions = max_cached_sessions
+        self._session_cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    @property
+    def store(self):
+        """Result store holding the arrays (the shared global store unless injected)"""
+        if self._store is None:
+            from result_store_service import result_store
+            self._store = result_store
+        return self._store
+
+    def save_session_arrays(self, session_id, nist_data, agilent_data, nist_ratio_data=None):
+        """Persist result DataFrames as float matrices plus their labels"""
+        arrays = {}
+        substances = nist_data['Substance'].astype(str).to_numpy() if 'Substance' in nist_data.columns else np.array([], dtype=str)
+        arrays['substances'] = substances.astype(str)
+
+        for sheet, frame in (('nist', nist_data), ('agilent', agilent_data), ('nist_ratio', nist_ratio_data)):
+            if frame is None or frame.empty:
+                continue
+            value_columns = [col for col in frame.columns if col != 'Substance']
+            arrays[f'{sheet}_columns'] = np.array([str(col) for col in value_columns], dtype=str)
+            arrays[f'{sheet}_values'] = frame[value_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return self.store.put(session_id, SESSION_ARRAYS_FILENAME, buffer.getvalue())
+
+    def load_session_arrays(self, session_id):
+        """Load the arrays for a session, keeping recently used sessions in memory"""
+        with self._lock:
+            if session_id in self._session_cache:
+                self._session_cache.move_to_end(session_id)
+                return self._session_cache[session_id]
+
+        handle = self.store.open(session_id, SESSION_ARRAYS_FILENAME)
+        if handle is None:
+            return None
+
+        with handle, np.load(handle, allow_pickle=False) as npz:
+            arrays = {key: npz[key] for key in npz.files}
+
+        with self._lock:
+            self._session_cache[session_id] = arrays
+            self._session_cache.move_to_end(session_id)
+            while len(self._session_cache) > self._max_cached_sessions:
+                self._session_cache.popitem(last=False)
+        return arrays
+
+    def forget_session(self, session_id):
+        """Drop a session from the in-memory cache"""
+        with self._lock:
+            self._session_cache.pop(session_id, None)
+
+    # ------------------------------------------------------------------
+    # Browsing
+    # ------------------------------------------------------------------
+
+    def _name_mask(self, substances, name_filter, filter_mode):
+        """Boolean mask of substances matching the name filter"""
+        if not name_filter:
+            return np.ones(len(substances), dtype=bool)
+
+        if filter_mode == 'regex':
+            try:
+                pattern = re.compile(name_filter, re.IGNORECASE)
+            except re.error as e:
+                raise ValueError(f"Invalid regex filter: {e}")
+            return np.fromiter((bool(pattern.search(name)) for name in substances),
+                               dtype=bool, count=len(substances))
+
+        lowered = np.char.lower(substances.astype(str))
+        needle = name_filter.lower()
+        if filter_mode == 'prefix':
+            return np.char.startswith(lowered, needle)
+        return np.char.find(lowered, needle) >= 0
+
+    def browse(self, session_id, sheet='nist', row_offset=0, row_limit=100,
+               col_offset=0, col_limit=50, sort_by=None, sort_dir='asc',
+               name_filter=None, filter_mode='substring', filter_column=None,
+               min_value=None, max_value=None):
+        """
+        Return one row/column window of a stored result sheet.
+
+        Filtering runs on the full matrix before sorting and slicing, so
+        offsets always refer to the filtered, sorted table.
+        """
+        if sheet not in RESULT_SHEETS:
+            raise ValueError(f"Unknown sheet '{sheet}'. Use one of: {', '.join(RESULT_SHEETS)}")
+        if filter_mode not in FILTER_MODES:
+            raise ValueError(f"Unknown filter mode '{filter_mode}'. Use one of: {', '.join(FILTER_MODES)}")
+
+        arrays = self.load_session_arrays(session_id)
+        if arrays is None:
+            return None
+
+        prefix = RESULT_SHEETS[sheet]
+        substances = arrays['substances']
+        columns = arrays.get(f'{prefix}_columns', np.array([], dtype=str))
+        values = arrays.get(f'{prefix}_values', np.empty((len(substances), 0)))
+        column_index = {name: idx for idx, name in enumerate(columns.tolist())}
+
+        # STEP 1: Substance name filter
+        mask = self._name_mask(substances, name_filter, filter_mode)
+
+        # STEP 2: Numeric thresholds on one column, or on any column when none given
+        if min_value is not None or max_value is not None:
+            threshold_column = filter_column or sort_by
+            if threshold_column and threshold_column != 'Substance':
+                if threshold_column not in column_index:
+                    raise ValueError(f"Unknown column '{threshold_column}'")
+                target = values[:, column_index[threshold_column]]
+                in_range = ~np.isnan(target)
+                if min_value is not None:
+                    in_range &= target >= min_value
+                if max_value is not None:
+                    in_range &= target <= max_value
+            else:
+                with np.errstate(invalid='ignore'):
+                    in_range = np.ones(values.shape, dtype=bool)
+                    if min_value is not None:
+                        in_range &= values >= min_value
+                    if max_value is not None:
+                        in_range &= values <= max_value
+                in_range = in_range.any(axis=1) if values.shape[1] else np.zeros(len(substances), dtype=bool)
+            mask &= in_range
+
+        row_ids = np.flatnonzero(mask)
+
+        # STEP 3: Sort the surviving rows (NaN always last)
+        if sort_by:
+            descending = str(sort_dir).lower() == 'desc'
+            if sort_by == 'Substance':
+                keys = substances[row_ids]
+                order = np.argsort(keys, kind='stable')
+                if descending:
+                    order = order[::-1]
+            else:
+                if sort_by not in column_index:
+                    raise ValueError(f"Unknown sort column '{sort_by}'")
+                keys = values[row_ids, column_index[sort_by]]
+                sort_keys = -keys if descending else keys
+                order = np.argsort(sort_keys, kind='stable')
+            row_ids = row_ids[order]
+
+        # STEP 4: Slice the row and column windows
+        row_offset = max(0, int(row_offset))
+        row_limit = max(0, min(int(row_limit), MAX_ROW_LIMIT))
+        col_offset = max(0, int(col_offset))
+        col_limit = max(0, min(int(col_limit), MAX_COL_LIMIT))
+
+        window_rows = row_ids[row_offset:row_offset + row_limit]
+        window_columns = columns[col_offset:col_offset + col_limit].tolist()
+        window_values = values[np.ix_(window_rows, np.arange(col_offset, col_offset + len(window_columns)))]
+
+        # Empty cells become None in one array operation (no per-cell checks)
+        cells = np.where(np.isnan(window_values), None, window_values).tolist()
+        rows = []
+        for row_id, row_cells in zip(window_rows.tolist(), cells):
+            record = {'Substance': str(substances[row_id]), '_row_index': row_id}
+            record.update(zip(window_columns, row_cells))
+            rows.append(record)
+
+        return {
+            'sheet': sheet,
+            'total_rows': int(len(substances)),
+            'filtered_rows': int(len(row_ids)),
+            'total_columns': int(len(columns)),
+            'row_offset': row_offset,
+            'row_limit': row_limit,
+            'col_offset': col_offset,
+            'col_limit': col_limit,
+            'column_order': ['Substance'] + window_columns,
+            'rows': rows
+        }
+
+
+# Global instance
+result_browser = ResultBrowserService()
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+RESULT STORE SERVICE
+Pluggable storage for calculation session artifacts (result workbooks,
+calculation details, browse arrays, uploads) addressed by session ID + name.
+Backends:
+  local     - streamlined_<id>/ directories in the temp dir (single host, default)
+  database  - chunked large objects in SQLite or PostgreSQL (shared by all workers/nodes)
+  cas       - content-addressed blobs + per-session manifests on a shared directory
+Reads are streamed: open() returns a seekable binary file object that pulls
+data chunk by chunk, so multi-MB workbooks are never loaded whole to serve them.
+Select a backend with RESULT_STORE_BACKEND and RESULT_STORE_URL / RESULT_STORE_PATH.
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+CHUNK_SIZE = 1024 * 1024   # 1 MB chunks for database rows and streamed copies
+
+
+def _iter_chunks(data, chunk_size=CHUNK_SIZE):
+    """Yield byte chunks from bytes, str or a binary file object"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data)
+        for start in range(0, len(view), chunk_size):
+            yield bytes(view[start:start + chunk_size])
+        return
+    if hasattr(data, 'seek'):
+        data.seek(0)
+    while True:
+        chunk = data.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class ResultStore:
+    """Interface shared by all result store backends"""
+
+    name = 'base'
+    is_local = False
+
+    def put(self, session_id, name, data):
+        """Store bytes/str/file object under (session_id, name); returns stored size"""
+        raise NotImplementedError
+
+    def open(self, session_id, name):
+        """Seekable binary file object for an artifact, or None if missing"""
+        raise NotImplementedError
+
+    def list(self, session_id):
+        """Artifact names stored for a session"""
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        """Remove every artifact of a session"""
+        raise NotImplementedError
+
+    def expire(self, max_age_seconds):
+        """Remove sessions older than max_age_seconds; returns the number removed"""
+        return 0
+
+    def local_path(self, session_id, name):
+        """Filesystem path when the artifact is a plain local file (enables sendfile)"""
+        return None
+
+    def exists(self, session_id, name):
+        return name in self.list(session_id)
+
+    def read_bytes(self, session_id, name):
+        handle = self.open(session_id, name)
+        if handle is None:
+            return None
+        with handle:
+            return handle.read()
+
+    def read_json(self, session_id, name):
+        data = self.read_bytes(session_id, name)
+        return None if data is None else json.loads(data.decode('utf-8'))
+
+
+# ============================================================================
+# LOCAL FILESYSTEM
+# ============================================================================
+
+class LocalFileResultStore(ResultStore):
+    """streamlined_<id>/<name> files in the system temp dir, managed by temp_session_store"""
+
+    name = 'local'
+    is_local = True
+
+    def __init__(self, base_dir=None, register_sessions=True):
+        self.base_dir = base_dir or tempfile.gettempdir()
+        self.register_sessions = register_sessions
+
+    def get_session_dir(self, session_id):
+        return os.path.join(self.base_dir, f"streamlined_{session_id}")
+
+    def _artifact_path(self, session_id, name):
+        if os.path.basename(name) != name:
+            raise ValueError(f"Invalid artifact name '{name}'")
+        return os.path.join(self.get_session_dir(session_id), name)
+
+    def put(self, session_id, name, data):
+        session_dir = self.get_session_dir(session_id)
+        os.makedirs(session_dir, exist_ok=True)
+        path = self._artifact_path(session_id, name)
+        size = 0
+        with open(path, 'wb') as handle:
+            for chunk in _iter_chunks(data):
+                handle.write(chunk)
+                size += len(chunk)
+
+        if self.register_sessions:
+            from temp_session_service import temp_session_store
+            temp_session_store.register(session_id, session_dir, kind='streamlined')
+        return size
+
+    def open(self, session_id, name):
+        path = self.local_path(session_id, name)
+        return open(path, 'rb') if path else None
+
+    def local_path(self, session_id, name):
+        path = self._artifact_path(session_id, name)
+        return path if os.path.isfile(path) else None
+
+    def list(self, session_id):
+        session_dir = self.get_session_dir(session_id)
+        if not os.path.isdir(session_dir):
+            return []
+        return sorted(entry.name for entry in os.scandir(session_dir) if entry.is_file())
+
+    def delete(self, session_id):
+        shutil.rmtree(self.get_session_dir(session_id), ignore_errors=True)
+
+
+# ============================================================================
+# DATABASE (SQLite / PostgreSQL)
+# ============================================================================
+
+class _ChunkReader(io.RawIOBase):
+    """Seekable reader that fetches one stored chunk at a time"""
+
+    def __init__(self, fetch_chunk, size, chunk_size):
+        self._fetch_chunk = fetch_chunk
+        self._size = size
+        self._chunk_size = chunk_size
+        self._position = 0
+        self._cached_index = None
+        self._cached_chunk = b''
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._position = max(0, offset)
+        return self._position
+
+    def readinto(self, buffer):
+        if self._position >= self._size:
+            return 0
+        index, start = divmod(self._position, self._chunk_size)
+        if index != self._cached_index:
+            self._cached_chunk = self._fetch_chunk(index)
+            self._cached_index = index
+        data = self._cached_chunk[start:start + len(buffer)]
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+class DatabaseResultStore(ResultStore):
+    """Artifacts split into chunk rows so reads stream without loading whole blobs"""
+
+    name = 'database'
+
+    def __init__(self, database_url, chunk_size=CHUNK_SIZE):
+        from sqlalchemy import (create_engine, MetaData, Table, Column, String, Integer,
+                                BigInteger, Float, LargeBinary)
+
+        if database_url.startswith('postgres://'):
+            database_url = database_url.replace('postgres://', 'postgresql://', 1)
+        self.chunk_size = chunk_size
+        self.engine = create_engine(database_url, pool_pre_ping=True)
+
+        metadata = MetaData()
+        self.artifacts = Table(
+            'result_store_artifacts', metadata,
+            Column('session_id', String(64), primary_key=True),
+            Column('name', String(255), primary_key=True),
+            Column('size', BigInteger, nullable=False),
+            Column('chunk_size', Integer, nullable=False),
+            Column('created_at', Float, nullable=False, index=True),
+        )
+        self.chunks = Table(
+            'result_store_chunks', metadata,
+            Column('session_id', String(64), primary_key=True),
+            Column('name', String(255), primary_key=True),
+            Column('chunk_index', Integer, primary_key=True),
+            Column('data', LargeBinary, nullable=False),
+        )
+        metadata.create_all(self.engine)
+
+    def put(self, session_id, name, data):
+        size = 0
+        with self.engine.begin() as conn:
+            self._delete_rows(conn, session_id, name)
+            batch = []
+            for index, chunk in enumerate(_iter_chunks(data, self.chunk_size)):
+                batch.append({'session_id': session_id, 'name': name, 'chunk_index': index, 'data': chunk})
+                size += len(chunk)
+                if len(batch) >= 8:
+                    conn.execute(self.chunks.insert(), batch)
+                    batch = []
+            if batch:
+                conn.execute(self.chunks.insert(), batch)
+            conn.execute(self.artifacts.insert().values(
+                session_id=session_id, name=name, size=size,
+                chunk_size=self.chunk_size, created_at=time.time()
+            ))
+        return size
+
+    def _delete_rows(self, conn, session_id, name=None):
+        chunk_filter = self.chunks.c.session_id == session_id
+        artifact_filter = self.artifacts.c.session_id == session_id
+        if name is not None:
+            chunk_filter = chunk_filter & (self.chunks.c.name == name)
+            artifact_filter = artifact_filter & (self.artifacts.c.name == name)
+        conn.execute(self.chunks.delete().where(chunk_filter))
+        conn.execute(self.artifacts.delete().where(artifact_filter))
+
+    def open(self, session_id, name):
+        from sqlalchemy import select
+
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(self.artifacts.c.size, self.artifacts.c.chunk_size)
+                .where((self.artifacts.c.session_id == session_id) & (self.artifacts.c.name == name))
+            ).first()
+        if row is None:
+            return None
+
+        def fetch_chunk(index):
+            with self.engine.connect() as conn:
+                return conn.execute(
+                    select(self.chunks.c.data).where(
+                        (self.chunks.c.session_id == session_id) &
+                        (self.chunks.c.name == name) &
+                        (self.chunks.c.chunk_index == index)
+                    )
+                ).scalar() or b''
+
+        return io.BufferedReader(_ChunkReader(fetch_chunk, row.size, row.chunk_size), buffer_size=row.chunk_size)
+
+    def list(self, session_id):
+        from sqlalchemy import select
+
+        with self.engine.connect() as conn:
+            return sorted(conn.execute(
+                select(self.artifacts.c.name).where(self.artifacts.c.session_id == session_id)
+            ).scalars())
+
+    def delete(self, session_id):
+        with self.engine.begin() as conn:
+            self._delete_rows(conn, session_id)
+
+    def expire(self, max_age_seconds):
+        from sqlalchemy import select
+
+        cutoff = time.time() - max_age_seconds
+        with self.engine.begin() as conn:
+            expired = list(conn.execute(
+                select(self.artifacts.c.session_id).where(self.artifacts.c.created_at < cutoff).distinct()
+            ).scalars())
+            for session_id in expired:
+                self._delete_rows(conn, session_id)
+        return len(expired)
+
+
+# ============================================================================
+# CONTENT-ADDRESSED DIRECTORY
+# ============================================================================
+
+class ContentAddressedResultStore(ResultStore):
+    """
+    Blobs stored once under blobs/<sha256[:2]>/<sha256> on a shared directory
+    (NFS/EFS/volume); sessions/<id>.json maps artifact names to digests.
+    Identical artifacts across sessions are stored once.
+    """
+
+    name = 'cas'
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.blob_dir = os.path.join(root_dir, 'blobs')
+        self.session_dir = os.path.join(root_dir, 'sessions')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.session_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _manifest_path(self, session_id):
+        if os.path.basename(session_id) != session_id:
+            raise ValueError(f"Invalid session ID '{session_id}'")
+        return os.path.join(self.session_dir, f"{session_id}.json")
+
+    def _read_manifest(self, session_id):
+        try:
+            with open(self._manifest_path(session_id), 'r') as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return {}
+
+    def _write_atomic(self, path, chunks):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.incoming_')
+        with os.fdopen(fd, 'wb') as handle:
+            for chunk in chunks:
+                handle.write(chunk)
+        os.replace(temp_path, path)
+
+    def put(self, session_id, name, data):
+        # Hash while spooling to a temp file, then move into place under the digest
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.blob_dir, prefix='.incoming_')
+        with os.fdopen(fd, 'wb') as handle:
+            for chunk in _iter_chunks(data):
+                digest.update(chunk)
+                handle.write(chunk)
+                size += len(chunk)
+        blob_path = self._blob_path(digest.hexdigest())
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+
+        with self._lock:
+            try:
+                # Already stored by another session - refresh its mtime so a
+                # concurrent expire() does not collect it before our manifest lands
+                os.utime(blob_path)
+                os.remove(temp_path)
+            except FileNotFoundError:
+                os.replace(temp_path, blob_path)
+            manifest = self._read_manifest(session_id)
+            manifest[name] = {'sha256': digest.hexdigest(), 'size': size}
+            self._write_atomic(self._manifest_path(session_id),
+                               [json.dumps(manifest).encode('utf-8')])
+        return size
+
+    def local_path(self, session_id, name):
+        entry = self._read_manifest(session_id).get(name)
+        if not entry:
+            return None
+        path = self._blob_path(entry['sha256'])
+        return path if os.path.isfile(path) else None
+
+    def open(self, session_id, name):
+        path = self.local_path(session_id, name)
+        return open(path, 'rb') if path else None
+
+    def list(self, session_id):
+        return sorted(self._read_manifest(session_id))
+
+    def delete(self, session_id):
+        try:
+            os.remove(self._manifest_path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def expire(self, max_age_seconds):
+        """Drop old manifests, then garbage-collect blobs no manifest references"""
+        with self._lock:
+            return self._expire(time.time() - max_age_seconds)
+
+    def _expire(self, cutoff):
+        removed = 0
+        referenced = set()
+        for entry in os.scandir(self.session_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+                continue
+            try:
+                with open(entry.path, 'r') as handle:
+                    referenced.update(item['sha256'] for item in json.load(handle).values())
+            except (OSError, ValueError):
+                pass
+
+        for root, _, files in os.walk(self.blob_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                # Skip blobs still being written (or written just now by a put in flight)
+                if filename not in referenced and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+        return removed
+
+
+def create_result_store(backend=None):
+    """Build the configured result store (RESULT_STORE_BACKEND, default local)"""
+    backend = (backend or os.getenv('RESULT_STORE_BACKEND', 'local')).lower()
+    if backend == 'database':
+        database_url = os.getenv('RESULT_STORE_URL') or os.getenv('DATABASE_URL')
+        if not database_url:
+            raise ValueError("RESULT_STORE_BACKEND=database requires RESULT_STORE_URL or DATABASE_URL")
+        return DatabaseResultStore(database_url)
+    if backend == 'cas':
+        root_dir = os.getenv('RESULT_STORE_PATH')
+        if not root_dir:
+            raise ValueError("RESULT_STORE_BACKEND=cas requires RESULT_STORE_PATH (a shared directory)")
+        return ContentAddressedResultStore(root_dir)
+    if backend == 'local':
+        return LocalFileResultStore()
+    raise ValueError(f"Unknown result store backend '{backend}'. Use local, database or cas")
+
+
+# Global instance - fall back to local storage if the shared backend is misconfigured
+try:
+    result_store = create_result_store()
+except Exception as e:
+    print(f"⚠️ Result store unavailable ({e}) - using local temp directory")
+    result_store = LocalFileResultStore()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+SEARCH INDEX
+In-memory trigram index for type-ahead over lipid names, API codes and
+compound-index names.
+- Names are normalized before indexing so notation variants meet:
+  brackets, slashes, underscores and hyphens become spaces and letter→digit
+  boundaries are split, e.g. 'PE(O-18:0/20:4)', 'PE O-18:0_20:4' and
+  'pe o 18:0 20:4' all index identically
+- Each distinct trigram maps to a NumPy posting array of document ids; a query
+  sums its postings with one bincount, so lookups cost microseconds
+- Results are ranked by the fraction of query trigrams matched, then exact /
+  prefix / substring matches, then shorter names
+Indexes are immutable: callers rebuild them when the underlying data changes.
+"""
+
+import re
+
+import numpy as np
+
+_SEPARATORS = re.compile(r'[\s()\[\]{}/_\-,;|]+')
+_LETTER_DIGIT = re.compile(r'(?<=[a-z])(?=\d)')
+
+
+def normalize_search_text(text):
+    """Lower-case, separator-free form of a lipid/compound name"""
+    if text is None:
+        return ''
+    text = _SEPARATORS.sub(' ', str(text).lower())
+    return _LETTER_DIGIT.sub(' ', text).strip()
+
+
+def _trigrams(normalized, pad_end):
+    padded = f" {normalized} " if pad_end else f" {normalized}"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Immutable trigram index over documents of (fields, payload)"""
+
+    def __init__(self, documents):
+        self._payloads = []
+        self._fields = []
+        postings = {}
+        for fields, payload in documents:
+            normalized = [text for text in (normalize_search_text(field) for field in fields) if text]
+            doc_id = len(self._payloads)
+            self._payloads.append(payload)
+            self._fields.append(normalized)
+            grams = set()
+            for text in normalized:
+                grams |= _trigrams(text, pad_end=True)
+            for gram in grams:
+                postings.setdefault(gram, []).append(doc_id)
+
+        self._postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._lengths = np.array([min((len(text) for text in fields), default=0) for fields in self._fields],
+                                 dtype=np.int32)
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def search(self, query, limit=10, min_score=0.5):
+        """
+        Ranked matches for `query` as [(payload, score)], best first (all of them when limit is None).
+        score is the fraction of the query's trigrams found in the document (0-1].
+        """
+        normalized = normalize_search_text(query)
+        if len(normalized) < 2 or not self._payloads:
+            return []
+
+        grams = _trigrams(normalized, pad_end=False)
+        hits = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not hits:
+            return []
+
+        scores = np.bincount(np.concatenate(hits), minlength=len(self._payloads)) / len(grams)
+        candidates = np.flatnonzero(scores >= min_score)
+        if not len(candidates):
+            return []
+
+        # Coarse order by score then length; exact/prefix/substring bonus only on the head
+        order = candidates[np.lexsort((self._lengths[candidates], -scores[candidates]))]
+        head = order if limit is None else order[:max(limit * 5, 50)]
+        bonus = np.array([self._match_bonus(doc_id, normalized) for doc_id in head])
+        ranked = head[np.lexsort((self._lengths[head], -bonus, -scores[head]))][:limit]
+        return [(self._payloads[doc_id], round(float(scores[doc_id]), 3)) for doc_id in ranked]
+
+    def _match_bonus(self, doc_id, normalized):
+        best = 0
+        for text in self._fields[doc_id]:
+            if text == normalized:
+                return 3
+            if text.startswith(normalized):
+                best = max(best, 2)
+            elif normalized in text:
+                best = max(best, 1)
+        return best
+
+
+def build_lipid_index(lipids):
+    """Index lipid listing rows (lipid_name + api_code); payloads are the rows themselves"""
+    return TrigramIndex(([lipid.get('lipid_name'), lipid.get('api_code')], lipid) for lipid in lipids)
+
+
+def build_compound_index(compound_names):
+    """Index compound-index names; payloads are the original names"""
+    return TrigramIndex(([name], name) for name in compound_names if name)
@@ -7,13 +7,14 @@ Single input file → 3-step calculation → 2-sheet output + preview
 
 import pandas as pd
 import numpy as np
-import json
 from io import BytesIO
-import tempfile
 import os
 import uuid
 from datetime import datetime
 from models import db, CompoundIndex
+from ingestion_service import ingestion_service
+from json_provider import dumps_bytes
+from search_index import build_compound_index
 
 class StreamlinedCalculatorService:
     """Professional metabolomics calculator with 3-step formula"""
@@ -26,6 +27,10 @@ class StreamlinedCalculatorService:
         # Create normalized compound mapping for fast lookups
         self._compound_name_map = self._create_compound_name_map()
         
+        # Trigram index over compound names, rebuilt when compound_index is replaced
+        self._compound_search_index = None
+        self._compound_search_source = None
+        
     def _load_ratio_database(self):
         """Load NIST ratio standards from Ratio-database.xlsx"""
         try:
@@ -626,10 +631,10 @@ class StreamlinedCalculatorService:
                 'response_factor': 1.0
             }
 
-    def debug_excel_structure(self, area_file):
+    def debug_excel_structure(self, area_file, filename=None):
         """Debug function to analyze Excel file structure"""
         try:
-            area_data = pd.read_excel(area_file)
+            area_data = ingestion_service.load_table(area_file, filename=filename)
             print(f"🔍 EXCEL DEBUG INFO:")
             print(f"   Shape: {area_data.shape}")
             print(f"   Columns: {list(area_data.columns)}")
@@ -663,7 +668,7 @@ class StreamlinedCalculatorService:
             print(f"❌ Debug error: {e}")
             return {'error': str(e)}
 
-    def calculate_streamlined(self, area_file, coefficient=500):
+    def calculate_streamlined(self, area_file, coefficient=500, filename=None):
         """
         Main calculation function with 3-step formula:
         1. Ratio = Substance Area ÷ ISTD Area
@@ -674,35 +679,11 @@ class StreamlinedCalculatorService:
         print(f"   Coefficient: {coefficient}")
         
         try:
-            # ⚡ ULTRA ENHANCED: Multi-step Excel analysis with robust header detection
-            print("🔍 Performing comprehensive Excel file analysis...")
-            
-            # First read to detect full structure
-            raw_df = pd.read_excel(area_file, header=None)
-            print(f"📋 Raw Excel shape: {raw_df.shape}")
-            print(f"📋 First few cells in column 0: {[raw_df.iloc[i, 0] for i in range(min(8, len(raw_df)))]}")
-            
-            # STEP 1: Find the actual header row (look for PH-HC patterns)
-            header_row = 0
-            data_start_row = 1
-            
-            print("🔎 Analyzing potential header rows...")
-            for row_idx in range(min(15, len(raw_df))):
-                row_values = [str(val) for val in raw_df.iloc[row_idx].tolist()]
-                ph_hc_count = sum(1 for val in row_values if 'PH-HC' in str(val))
-                nist_count = sum(1 for val in row_values if 'NIST' in str(val))
-                
-                print(f"   Row {row_idx}: PH-HC columns={ph_hc_count}, NIST columns={nist_count}, First cell='{raw_df.iloc[row_idx, 0]}'")
-                
-                # If this row has multiple PH-HC patterns, it's likely the header
-                if ph_hc_count >= 2:  # Need at least 2 PH-HC columns to be a proper header
-                    header_row = row_idx
-                    data_start_row = row_idx + 1  # Data starts in the next row
-                    print(f"✅ Detected header row at index {header_row}, data starts at {data_start_row}")
-                    break
+            # ⚡ ULTRA ENHANCED: Format-aware ingestion with robust header detection
+            print("🔍 Performing comprehensive input file analysis...")
             
-            # STEP 2: Read with proper header
-            area_data = pd.read_excel(area_file, header=header_row)
+            # STEP 1-2: Detect format, find the header row (PH-HC patterns) and load the table
+            area_data, header_row, backend_name = ingestion_service.load_area_table(area_file, filename=filename)
             print(f"📊 Loaded area data with header at row {header_row}: {area_data.shape}")
             print(f"📋 Columns found: {list(area_data.columns)[:10]}...")
             
@@ -1198,58 +1179,38 @@ class StreamlinedCalculatorService:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"streamlined_results_{timestamp}.xlsx"
             
-            # Create temp directory for this session
-            temp_dir = tempfile.gettempdir()
-            session_dir = os.path.join(temp_dir, f"streamlined_{session_id}")
-            os.makedirs(session_dir, exist_ok=True)
+            from result_store_service import result_store
             
             # Save Excel file
-            excel_path = os.path.join(session_dir, filename)
             excel_output = self.create_excel_output(nist_data, agilent_data, nist_ratio_data, filename)
+            result_store.put(session_id, filename, excel_output.getvalue())
             
-            with open(excel_path, 'wb') as f:
-                f.write(excel_output.getvalue())
+            # Save result matrices for server-side browsing (/api/streamlined-results)
+            try:
+                from result_browser_service import result_browser
+                result_browser.save_session_arrays(session_id, nist_data, agilent_data, nist_ratio_data)
+            except Exception as arrays_error:
+                print(f"⚠️ Could not save result arrays for browsing: {arrays_error}")
             
             # Save detailed calculations as JSON
             if detailed_calculations:
-                details_path = os.path.join(session_dir, f"details_{session_id}.json")
-                with open(details_path, 'w') as f:
-                    # Convert numpy types to native Python types for JSON serialization
-                    json_safe_details = {}
-                    for key, value in detailed_calculations.items():
-                        json_safe_details[key] = self._make_json_safe(value)
-                    
-                    json.dump(json_safe_details, f, indent=2)
-                print(f"💾 Detailed calculations saved: {details_path}")
+                # NumPy values and NaN (→ null) are serialized natively by the JSON provider
+                details_name = f"details_{session_id}.json"
+                result_store.put(session_id, details_name, dumps_bytes(detailed_calculations, indent=True))
+                print(f"💾 Detailed calculations saved: {details_name}")
             
-            print(f"💾 Results saved to session: {session_dir}")
+            print(f"💾 Results saved to {result_store.name} result store, session: {session_id}")
             
             return {
                 'session_id': session_id,
                 'filename': filename,
-                'temp_path': excel_path,
-                'session_dir': session_dir
+                'store': result_store.name
             }
             
         except Exception as e:
             print(f"❌ Error saving temp results: {e}")
             raise e
 
-    def _make_json_safe(self, obj):
-        """Convert numpy types and other non-JSON-serializable types to JSON-safe types"""
-        if isinstance(obj, dict):
-            return {k: self._make_json_safe(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [self._make_json_safe(item) for item in obj]
-        elif isinstance(obj, (np.integer, np.floating)):
-            return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        elif pd.isna(obj):
-            return None
-        else:
-            return obj
-
     def create_calculation_details_on_demand(self, area_data, substance, sample, substance_index, istd_index_map, compound_info_map, nist_mapping_cache, coefficient):
         """Create detailed calculation breakdown on-demand for performance"""
         try:
@@ -1434,20 +1395,21 @@ class StreamlinedCalculatorService:
     def get_calculation_details(self, session_id, substance, sample):
         """Get detailed calculation breakdown for a specific substance-sample combination"""
         try:
-            temp_dir = tempfile.gettempdir()
-            session_dir = os.path.join(temp_dir, f"streamlined_{session_id}")
-            details_path = os.path.join(session_dir, f"details_{session_id}.json")
+            from result_store_service import result_store
+            details_name = f"details_{session_id}.json"
+            
+            if result_store.is_local:
+                from temp_session_service import temp_session_store
+                temp_session_store.touch(result_store.get_session_dir(session_id))
             
-            print(f"🔍 Looking for details at: {details_path}")
+            print(f"🔍 Looking for details: {details_name} ({result_store.name} store)")
             print(f"🔍 Searching for substance='{substance}', sample='{sample}'")
             
-            if not os.path.exists(details_path):
-                print(f"❌ Details file not found: {details_path}")
+            all_details = result_store.read_json(session_id, details_name)
+            if all_details is None:
+                print(f"❌ Details not found for session {session_id}")
                 return {'error': 'Calculation details not found'}
             
-            with open(details_path, 'r') as f:
-                all_details = json.load(f)
-            
             print(f"📊 Found {len(all_details)} total detail entries")
             print(f"📊 First 5 keys in details: {list(all_details.keys())[:5]}")
             
@@ -1540,17 +1502,26 @@ class StreamlinedCalculatorService:
             traceback.print_exc()
             return {'error': str(e)}
 
+    def search_compounds(self, query, limit=10):
+        """Ranked compound-index names for a (partial, any-notation) query: [(name, score)]"""
+        if self.compound_index is None or 'Compound' not in self.compound_index:
+            return []
+        if self._compound_search_source is not self.compound_index:
+            self._compound_search_index = build_compound_index(self.compound_index['Compound'].dropna().astype(str))
+            self._compound_search_source = self.compound_index
+        return self._compound_search_index.search(query, limit=limit)
+
     def debug_compound_results(self, session_id, compound_name):
         """
         Debug method to analyze why a specific compound might show no results
         """
         try:
-            temp_dir = tempfile.gettempdir()
-            session_dir = os.path.join(temp_dir, f"streamlined_{session_id}")
+            from result_store_service import result_store
             
             # Check if session data exists
-            excel_files = [f for f in os.listdir(session_dir) if f.endswith('.xlsx')]
-            json_files = [f for f in os.listdir(session_dir) if f.endswith('.json')]
+            artifacts = result_store.list(session_id)
+            excel_files = [f for f in artifacts if f.endswith('.xlsx')]
+            json_files = [f for f in artifacts if f.endswith('.json')]
             
             debug_info = {
                 'compound': compound_name,
@@ -1566,10 +1537,7 @@ class StreamlinedCalculatorService:
             debug_info['in_database'] = compound_name in self._compound_name_map
             
             # Look for similar compounds
-            debug_info['similar_compounds'] = [
-                key for key in self._compound_name_map.keys() 
-                if compound_name.replace(' ', '').lower() in key.replace(' ', '').lower()
-            ][:10]
+            debug_info['similar_compounds'] = [name for name, _ in self.search_compounds(compound_name, limit=10)]
             
             return debug_info
             
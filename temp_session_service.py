@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+TEMP SESSION SERVICE
+Managed store for calculation artifacts written to the system temp directory.
+Tracks streamlined_<id> result directories, metabolomics_calc_/metabolomics_result_
+workbooks and orphaned upload temp files, expires them after a TTL, keeps the
+total under a disk quota by evicting least recently used sessions, and runs a
+background janitor so /tmp does not grow without bound.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+DEFAULT_TTL_SECONDS = 2 * 60 * 60            # Matches the old 2 hour cleanup window
+DEFAULT_QUOTA_BYTES = 1024 * 1024 * 1024     # 1 GB across all sessions
+DEFAULT_SWEEP_INTERVAL = 5 * 60              # Janitor runs every 5 minutes
+DEFAULT_MIN_IDLE_SECONDS = 60                # Never quota-evict a session used in the last minute
+
+# Artifact kind → filename pattern in the temp directory (group 1 = session ID)
+SESSION_PATTERNS = {
+    'streamlined': re.compile(r'^streamlined_([0-9a-f-]{36})$'),
+    'calculation_upload': re.compile(r'^metabolomics_calc_(.+)\.xlsx$'),
+    'calculation_result': re.compile(r'^metabolomics_result_(.+)\.xlsx$'),
+    'parsed_upload': re.compile(r'^metabolomics_parsed_(.+)\.npz$'),
+    # NamedTemporaryFile uploads left behind by crashed requests
+    'orphan_upload': re.compile(r'^(tmp[a-z0-9_]{8})\.xlsx$'),
+}
+
+
+def _path_size(path):
+    """Bytes used by a file or a directory tree"""
+    if not os.path.isdir(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _last_access(path):
+    """Latest modification time of a file or any entry in a directory"""
+    try:
+        latest = os.path.getmtime(path)
+    except OSError:
+        return 0
+    if os.path.isdir(path):
+        for entry in os.scandir(path):
+            try:
+                latest = max(latest, entry.stat().st_mtime)
+            except OSError:
+                pass
+    return latest
+
+
+class TempSessionStore:
+    """TTL + disk quota + LRU eviction for temp calculation sessions"""
+
+    def __init__(self, base_dir=None, ttl_seconds=DEFAULT_TTL_SECONDS, quota_bytes=DEFAULT_QUOTA_BYTES,
+                 sweep_interval=DEFAULT_SWEEP_INTERVAL, min_idle_seconds=DEFAULT_MIN_IDLE_SECONDS):
+        self.base_dir = base_dir or tempfile.gettempdir()
+        self.ttl_seconds = ttl_seconds
+        self.quota_bytes = quota_bytes
+        self.sweep_interval = sweep_interval
+        self.min_idle_seconds = min_idle_seconds
+
+        self._metadata = {}            # path → {'session_id', 'kind', 'created', 'last_access', 'bytes'}
+        self._total_bytes = 0          # Last scanned disk usage plus artifacts registered since
+        self._evict_callbacks = []
+        self._sweep_callbacks = []
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._janitor = None
+        self.stats = {
+            'sweeps': 0,
+            'expired': 0,
+            'evictions': 0,
+            'bytes_reclaimed': 0,
+            'last_sweep': None,
+            'last_sweep_seconds': None,
+        }
+
+    # ------------------------------------------------------------------
+    # Session bookkeeping
+    # ------------------------------------------------------------------
+
+    def register(self, session_id, path, kind='streamlined'):
+        """
+        Record a newly written session artifact. Keeps a running byte total and
+        only scans the temp directory for eviction once that total exceeds the
+        quota; otherwise quota enforcement is left to the janitor's sweep().
+        """
+        now = time.time()
+        size = _path_size(path)
+        with self._lock:
+            previous = self._metadata.get(path)
+            self._metadata[path] = {
+                'session_id': session_id,
+                'kind': kind,
+                'created': previous['created'] if previous else now,
+                'last_access': now,
+                'bytes': size,
+            }
+            self._total_bytes += size - (previous['bytes'] if previous else 0)
+            over_quota = self._total_bytes > self.quota_bytes
+        if over_quota:
+            self.enforce_quota()
+        return path
+
+    def touch(self, path):
+        """Mark a session artifact as used; mtime is bumped so other workers see it too"""
+        if not path or not os.path.exists(path):
+            return False
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        with self._lock:
+            if path in self._metadata:
+                self._metadata[path]['last_access'] = now
+        return True
+
+    def on_evict(self, callback):
+        """Call `callback(session_id, kind)` whenever a session is removed"""
+        self._evict_callbacks.append(callback)
+
+    def on_sweep(self, callback):
+        """Call `callback()` after every sweep (e.g. to expire a shared result store)"""
+        self._sweep_callbacks.append(callback)
+
+    def scan(self):
+        """Current managed artifacts on disk, merged with in-memory metadata"""
+        try:
+            names = os.listdir(self.base_dir)
+        except OSError:
+            return []
+
+        matches = []
+        for name in names:
+            for kind, pattern in SESSION_PATTERNS.items():
+                match = pattern.match(name)
+                if match:
+                    matches.append((os.path.join(self.base_dir, name), kind, match.group(1)))
+                    break
+
+        # Copy the metadata under the lock; the disk I/O below runs without it
+        with self._lock:
+            known = {path: dict(self._metadata[path]) for path, _, _ in matches if path in self._metadata}
+
+        sessions = []
+        for path, kind, session_id in matches:
+            meta = known.get(path, {})
+            sessions.append({
+                'session_id': meta.get('session_id', session_id),
+                'kind': kind,
+                'path': path,
+                'created': meta.get('created'),
+                'last_access': max(_last_access(path), meta.get('last_access', 0)),
+                'bytes': _path_size(path),
+            })
+        return sessions
+
+    def _remove(self, session, reason):
+        """Delete one session artifact from disk and notify listeners"""
+        path = session['path']
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️ Could not remove temp session {path}: {e}")
+            return False
+
+        with self._lock:
+            self._metadata.pop(path, None)
+            self._total_bytes = max(self._total_bytes - session['bytes'], 0)
+            self.stats['expired' if reason == 'ttl' else 'evictions'] += 1
+            self.stats['bytes_reclaimed'] += session['bytes']
+
+        for callback in self._evict_callbacks:
+            try:
+                callback(session['session_id'], session['kind'])
+            except Exception as e:
+                print(f"⚠️ Temp session eviction callback failed: {e}")
+        print(f"🧹 Removed temp session ({reason}): {os.path.basename(path)}")
+        return True
+
+    # ------------------------------------------------------------------
+    # Expiry and quota
+    # ------------------------------------------------------------------
+
+    def expire(self, now=None):
+        """Remove sessions idle for longer than the TTL; returns the survivors"""
+        now = now or time.time()
+        survivors = []
+        for session in self.scan():
+            if now - session['last_access'] > self.ttl_seconds:
+                self._remove(session, 'ttl')
+            else:
+                survivors.append(session)
+        return survivors
+
+    def enforce_quota(self, sessions=None, now=None):
+        """Evict least recently used sessions until the total fits the quota"""
+        now = now or time.time()
+        sessions = self.scan() if sessions is None else sessions
+        total = sum(session['bytes'] for session in sessions)
+        if total > self.quota_bytes:
+            for session in sorted(sessions, key=lambda s: s['last_access']):
+                if total <= self.quota_bytes:
+                    break
+                if now - session['last_access'] < self.min_idle_seconds:
+                    continue  # In use right now - a later sweep will retry
+                if self._remove(session, 'quota'):
+                    total -= session['bytes']
+        with self._lock:
+            self._total_bytes = total  # Resync the running total with the disk
+        return total
+
+    def sweep(self):
+        """One janitor pass: TTL expiry followed by quota enforcement"""
+        started = time.time()
+        survivors = self.expire(now=started)
+        self.enforce_quota(survivors, now=started)
+        for callback in self._sweep_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ Temp session sweep callback failed: {e}")
+        with self._lock:
+            self.stats['sweeps'] += 1
+            self.stats['last_sweep'] = started
+            self.stats['last_sweep_seconds'] = round(time.time() - started, 4)
+
+    # ------------------------------------------------------------------
+    # Background janitor
+    # ------------------------------------------------------------------
+
+    def start_janitor(self):
+        """Start the periodic sweeper thread (idempotent)"""
+        if self._janitor and self._janitor.is_alive():
+            return self._janitor
+        self._stop_event.clear()
+
+        def run():
+            while not self._stop_event.wait(self.sweep_interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"⚠️ Temp session janitor error: {e}")
+
+        self._janitor = threading.Thread(target=run, name='temp-session-janitor', daemon=True)
+        self._janitor.start()
+        return self._janitor
+
+    def stop_janitor(self):
+        self._stop_event.set()
+
+    def get_stats(self):
+        """Session count, disk usage and eviction counters for the admin endpoint"""
+        sessions = self.scan()
+        by_kind = {}
+        for session in sessions:
+            kind_stats = by_kind.setdefault(session['kind'], {'count': 0, 'bytes': 0})
+            kind_stats['count'] += 1
+            kind_stats['bytes'] += session['bytes']
+
+        total_bytes = sum(session['bytes'] for session in sessions)
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({
+            'base_dir': self.base_dir,
+            'session_count': len(sessions),
+            'total_bytes': total_bytes,
+            'quota_bytes': self.quota_bytes,
+            'quota_used_percent': round(100.0 * total_bytes / self.quota_bytes, 1) if self.quota_bytes else None,
+            'ttl_seconds': self.ttl_seconds,
+            'sweep_interval': self.sweep_interval,
+            'janitor_running': bool(self._janitor and self._janitor.is_alive()),
+            'by_kind': by_kind,
+        })
+        return stats
+
+
+# Global instance
+temp_session_store = TempSessionStore(
+    ttl_seconds=int(os.getenv('TEMP_SESSION_TTL', DEFAULT_TTL_SECONDS)),
+    quota_bytes=int(os.getenv('TEMP_SESSION_QUOTA_MB', DEFAULT_QUOTA_BYTES // (1024 * 1024))) * 1024 * 1024,
+    sweep_interval=int(os.getenv('TEMP_SESSION_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL)),
+)
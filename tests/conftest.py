@@ -0,0 +1,54 @@
+"""
+Shared fixtures: an in-memory SQLite app over a chosen set of model tables
+and a SQL statement counter for the one-query/no-N+1 assertions
+"""
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from models import db, LipidClass, MainLipid, AnnotatedIon, optimized_manager
+
+
+@pytest.fixture
+def db_tables():
+    """Tables the `app` fixture creates - override in a module that needs others"""
+    return [LipidClass.__table__, MainLipid.__table__, AnnotatedIon.__table__]
+
+
+@pytest.fixture
+def seed_data():
+    """Called inside the app context to populate the tables - override per module"""
+    return None
+
+
+@pytest.fixture
+def app(db_tables, seed_data):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=db_tables)
+        if seed_data:
+            seed_data()
+            db.session.commit()
+        # Tests start from a fresh session and an empty lipid query cache
+        db.session.remove()
+        optimized_manager.cache.invalidate()
+        yield app
+        db.session.remove()
+        db.metadata.drop_all(db.engine, tables=db_tables)
+
+
+@pytest.fixture
+def count_statements():
+    """count_statements(read) -> (read(), SQL statements it executed); call inside an app context"""
+    def count(read):
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            return read(), statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+    return count
@@ -0,0 +1,59 @@
+"""
+Tests for the vectorized legacy calculation engine
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_calculation_service import BatchCalculationService, FALLBACK_ISTD_AREA
+
+
+@pytest.fixture
+def main_data():
+    """Upload with a Name/Area double header, two samples and one NIST column"""
+    return pd.DataFrame({
+        'Compound Method': ['Name', 'PC 16:0', 'TG 50:1', 'LPC 18:1 d7'],
+        'PH-HC_5701': ['Area', 400.0, 0.0, 200.0],
+        'PH-HC_5702': ['Area', 300.0, 150.0, np.nan],
+        'NIST_1-100 (1)': ['Area', 900.0, 450.0, 300.0],
+    })
+
+
+COMPOUND_DATA = {
+    'PC 16:0': {'istd': 'LPC 18:1 d7', 'conc_nm': 10.0, 'response_factor': 2.0, 'nist_standard': 0.5},
+    'TG 50:1': {'istd': 'LPC 18:1 d7', 'conc_nm': None, 'response_factor': 1.0, 'nist_standard': 0},
+}
+
+
+def test_ratio_nist_and_agilent_matrices(main_data):
+    result = BatchCalculationService().calculate(main_data, {}, COMPOUND_DATA, coefficient=500)
+    nist, agilent = result['nist_results'], result['agilent_results']
+
+    assert list(nist.columns) == ['Compound', 'PH-HC_5701', 'PH-HC_5702']
+    assert nist['Compound'].tolist() == ['PC 16:0', 'TG 50:1', 'LPC 18:1 d7']
+
+    # PC 16:0 in PH-HC_5701: ratio 400 / 200 = 2 → NIST 2 / 0.5, Agilent 2 × 10 × 2 × 500
+    assert nist.loc[0, 'PH-HC_5701'] == pytest.approx(4.0)
+    assert agilent.loc[0, 'PH-HC_5701'] == pytest.approx(20000.0)
+
+    # Missing ISTD area falls back to the default; zero NIST standard uses 0.1769
+    fallback_ratio = 150.0 / FALLBACK_ISTD_AREA
+    assert nist.loc[1, 'PH-HC_5702'] == pytest.approx(fallback_ratio / 0.1769)
+    assert agilent.loc[1, 'PH-HC_5702'] == pytest.approx(fallback_ratio * 500)
+
+    # Zero area gives a zero ratio
+    assert nist.loc[1, 'PH-HC_5701'] == 0.0
+
+
+def test_samples_resolve_through_paired_nist_key(main_data):
+    """Samples mapped to the same paired NIST key share the value stored under it"""
+    mapping = {'PH-HC_5701': 'PH-HC_1', 'PH-HC_5702': 'PH-HC_1'}
+    result = BatchCalculationService().calculate(main_data, mapping, COMPOUND_DATA, coefficient=500)
+    nist = result['nist_results']
+    assert nist.loc[0, 'PH-HC_5701'] == nist.loc[0, 'PH-HC_5702'] == pytest.approx((300.0 / FALLBACK_ISTD_AREA) / 0.5)
+
+
+def test_preview_records_replace_nan():
+    frame = pd.DataFrame({'Compound': ['A'], 'PH-HC_1': [np.nan]})
+    assert BatchCalculationService.preview_records(frame, 50) == [{'Compound': 'A', 'PH-HC_1': 0.0}]
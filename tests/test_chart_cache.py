@@ -0,0 +1,70 @@
+"""
+Tests for the versioned chart payload cache
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from chart_cache_service import ChartPayloadCache
+from models import db, LipidClass, MainLipid, AnnotatedIon, optimized_manager
+
+
+@pytest.fixture
+def seed_data():
+    def seed():
+        times = np.round(np.arange(0, 16, 0.01), 2)
+        db.session.add(LipidClass(class_id=1, class_name='PC'))
+        for lipid_id in (1, 2, 3):
+            lipid = MainLipid(lipid_id=lipid_id, lipid_name=f'PC 3{lipid_id}:1', class_id=1,
+                              retention_time=5.0 + lipid_id, updated_at=datetime(2026, 1, 1))
+            if lipid_id != 2:
+                lipid.set_xic_arrays(times, np.exp(-((times - lipid.retention_time) / 0.1) ** 2) * 1e4)
+            db.session.add(lipid)
+        db.session.flush()
+        db.session.add(AnnotatedIon(ion_id=10, main_lipid_id=1, ion_lipid_name='PC 31:1', annotation_type='Current lipid',
+                                    retention_time=6.0, int_start=5.95, int_end=6.05, is_main_lipid=True))
+        db.session.commit()
+        # Ion inserts touch their lipid; start every version from a known timestamp
+        db.session.execute(MainLipid.__table__.update().values(updated_at=datetime(2026, 1, 1)))
+    return seed
+
+
+def test_hits_skip_the_build_and_ion_edits_change_the_etag(app, count_statements):
+    cache = ChartPayloadCache()
+    with app.app_context():
+        version = optimized_manager.get_chart_versions([1])[1]
+        etag, body = cache.get_chart(1, version, 200)
+        (cached_etag, cached_body), statements = count_statements(lambda: cache.get_chart(1, version, 200))
+        assert (cached_etag, cached_body) == (etag, body) and statements == []
+        assert cache.make_etag(1, version, None) != etag
+
+        # Editing only an ion bumps the parent lipid's updated_at
+        db.session.get(AnnotatedIon, 10).int_end = 6.1
+        db.session.commit()
+        new_version = optimized_manager.get_chart_versions([1])[1]
+        assert new_version != version
+        assert cache.get_chart(1, new_version, 200)[0] != etag
+        assert optimized_manager.get_chart_versions([1, 99]).keys() == {1}
+
+
+def test_batch_builds_only_misses_and_prewarm_respects_the_budget(app, count_statements):
+    cache = ChartPayloadCache()
+    with app.app_context():
+        versions = optimized_manager.get_chart_versions([1, 2, 3])
+        cache.get_chart(3, versions[3], 200)
+
+        entries, statements = count_statements(lambda: cache.get_charts([3, 99, 2, 1], versions, 200))
+        assert len(statements) == 2   # Lipids 2 and 1 in one batch: lipids + class, then ions
+        assert [(lipid_id, etag is not None) for lipid_id, etag, _ in entries] == [
+            (3, True), (99, False), (2, False), (1, True)]
+        assert 'No XIC data' in entries[2][2]
+
+        stats = cache.prewarm(200)
+        assert (stats['stopped_reason'], stats['built'], stats['already_cached'], stats['skipped']) == ('complete', 0, 2, 1)
+
+        small = ChartPayloadCache(max_bytes=len(entries[3][2]) + 1, prewarm_batch_size=1)
+        stats = small.prewarm(200)
+        assert (stats['stopped_reason'], stats['built']) == ('byte budget full', 1)
+        assert small.get_stats()['entries'] == 1 and small.get_stats()['evictions'] == 0
@@ -0,0 +1,50 @@
+"""
+Tests for the materialized dashboard statistics snapshot
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, LipidClass, MainLipid, AnnotatedIon, DashboardStats, OptimizedDataManager
+
+
+@pytest.fixture
+def db_tables():
+    return [LipidClass.__table__, MainLipid.__table__, AnnotatedIon.__table__, DashboardStats.__table__]
+
+
+@pytest.fixture
+def seed_data():
+    def seed():
+        db.session.add_all([LipidClass(class_id=1, class_name='PC'), LipidClass(class_id=2, class_name='AC')])
+        db.session.add_all([MainLipid(lipid_id=lipid_id, lipid_name=f'PC 3{lipid_id}:1', class_id=1,
+                                      created_at=datetime(2026, 1, lipid_id)) for lipid_id in (1, 2)])
+    return seed
+
+
+def test_snapshot_is_one_lookup_and_refreshes_after_lipid_commits(app, count_statements):
+    manager = OptimizedDataManager(dashboard_max_age=300)
+    with app.app_context():
+        stats = manager.get_dashboard_stats()
+        assert (stats['total_lipids'], stats['total_classes'], stats['total_annotations']) == (2, 2, 0)
+        assert stats['class_counts'] == [{'class_name': 'AC', 'count': 0}, {'class_name': 'PC', 'count': 2}]
+        assert [lipid['lipid_id'] for lipid in stats['recent_lipids']] == [2, 1]
+
+        cached, statements = count_statements(manager.get_dashboard_stats)
+        assert cached == stats and len(statements) == 1
+
+        # A lipid commit marks the snapshot stale; the next reader refreshes it
+        db.session.add(MainLipid(lipid_id=3, lipid_name='AC 2:0', class_id=2, created_at=datetime(2026, 2, 1)))
+        db.session.commit()
+        assert db.session.get(DashboardStats, 'library').is_stale
+        stats = manager.get_dashboard_stats()
+        assert stats['total_lipids'] == 3 and stats['recent_lipids'][0]['class_name'] == 'AC'
+        assert len(count_statements(manager.get_dashboard_stats)[1]) == 1
+
+        # Writers that bypass the session are bounded by the max age
+        db.session.execute(MainLipid.__table__.delete().where(MainLipid.__table__.c.lipid_id == 3))
+        db.session.execute(DashboardStats.__table__.update().values(
+            is_stale=False, refreshed_at=datetime.utcnow() - timedelta(seconds=301)))
+        db.session.commit()
+        assert manager.get_dashboard_stats()['total_lipids'] == 2
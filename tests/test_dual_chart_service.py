@@ -0,0 +1,145 @@
+"""
+Tests for the array-based dual chart pipeline
+"""
+
+import numpy as np
+import pytest
+
+import dual_chart_service
+from models import db, LipidClass, MainLipid, AnnotatedIon
+from dual_chart_service import DualChartService, expand_chart_payload, minmax_downsample_indices
+from json_provider import dumps_bytes
+from xic_storage import encode_xic, xic_arrays
+
+
+def make_ion(ion_id, annotation_type, rt, is_main=False, lipid_id=1):
+    return {'ion_id': ion_id, 'main_lipid_id': lipid_id, 'ion_lipid_name': f'ion {ion_id}', 'ion_lipidcode': None,
+            'annotation_type': annotation_type, 'retention_time': rt, 'precursor_ion': '760.6',
+            'product_ion': '184.1', 'collision_energy': 30, 'polarity': 'Positive', 'response_factor': 1.0,
+            'int_start': rt - 0.05, 'int_end': rt + 0.05, 'is_main_lipid': is_main}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    times = np.round(np.arange(0, 16, 0.01), 2)
+    intensities = np.round(100 + 1e4 * np.exp(-((times - 6.2) / 0.05) ** 2), 2)
+    chart_data = {
+        'lipid_info': {'lipid_id': 1, 'lipid_name': 'PC 34:1', 'api_code': 'PC_34_1',
+                       'retention_time': 6.2, 'class_name': 'PC'},
+        'annotated_ions': [make_ion(1, 'Current lipid', 6.2, is_main=True),
+                           make_ion(2, '+2 isotope', 6.25), make_ion(3, 'Similar MRM', 11.0)],
+        # Shuffled on purpose: the pipeline sorts before windowing
+        'xic_arrays': tuple(array[::-1].copy() for array in xic_arrays(encode_xic(times, intensities))),
+    }
+    monkeypatch.setattr(dual_chart_service.optimized_manager, 'get_lipid_chart_data_optimized',
+                        lambda lipid_id: chart_data)
+    return DualChartService()
+
+
+def test_windows_and_nearest_points():
+    times = np.array([0.0, 0.5, 1.0, 1.5, 2.0])
+    assert DualChartService._window(times, 0.5, 1.5) == slice(1, 4)
+    assert DualChartService._window(times, 2.5, 3.0) == slice(5, 5)
+    assert DualChartService._nearest_indices(times, [-1.0, 0.25, 0.26, 1.9, 9.0]).tolist() == [0, 0, 1, 4, 4]
+
+
+def test_dual_chart_windows_and_integration_areas(service):
+    result = service.get_dual_chart_data(1)
+
+    chart1 = result['chart1']['data']['datasets']
+    line = [point['x'] for point in chart1[0]['data']]
+    assert line == sorted(line) and 5.6 <= line[0] <= 5.61 and 6.79 <= line[-1] <= 6.8
+    areas = [dataset for dataset in chart1 if dataset['label'].endswith('_area')]
+    assert [area['label'] for area in areas] == ['ion 1_area']
+    assert [point['x'] for point in areas[0]['data']] == [6.15, 6.15, 6.16, 6.17, 6.18, 6.19, 6.2,
+                                                          6.21, 6.22, 6.23, 6.24, 6.25, 6.25]
+    assert areas[0]['lipid_info']['lipid_class'] == 'PC'
+
+    chart2 = result['chart2']['data']['datasets']
+    assert len(chart2[0]['data']) == 1600
+    assert sorted(d['label'] for d in chart2 if d['label'].endswith('_area')) == ['ion 1_area', 'ion 2_area', 'ion 3_area']
+
+
+def test_downsampling_keeps_peaks_and_integration_windows(service):
+    times = np.linspace(0, 10, 5000)
+    values = np.sin(times * 7) + (np.abs(times - 4.0) < 1e-3) * 5
+    keep = minmax_downsample_indices(times, values, 200, preserve=[(6.0, 6.5)])
+    assert np.all(np.diff(keep) > 0) and keep[0] == 0 and keep[-1] == 4999
+    assert values[keep].max() == values.max() and values[keep].min() == values.min()
+    window = np.flatnonzero((times >= 6.0) & (times <= 6.5))
+    assert np.isin(window, keep).all()
+    assert len(keep) - len(window) <= 200
+
+    result = service.get_dual_chart_data(1, max_points=100)
+    line = result['chart2']['data']['datasets'][0]['data']
+    assert len(line) < 200
+    assert max(point['y'] for point in line) == 10100.0
+    # Every point of the shaded areas is on the line as well
+    line_x = {point['x'] for point in line}
+    area = next(d for d in result['chart2']['data']['datasets'] if d['label'] == 'ion 1_area')
+    assert all(point['x'] in line_x for point in area['data'][1:-1])
+
+
+def test_compact_format_expands_to_the_verbose_payload(service):
+    verbose = service.get_dual_chart_data(1, max_points=300)
+
+    compact = service.get_dual_chart_data(1, max_points=300, wire_format='compact')
+    datasets = compact['chart2']['data']['datasets']
+    assert 'data' not in datasets[0] and len(datasets[0]['x']) == len(datasets[0]['y'])
+    # Areas of the same annotation type share one style; boundary lines share another
+    assert len(compact['styles']) == 5 and len(compact['area_info']) == 3
+    assert compact['area_info'][0]['integration_start'] == 6.15
+    assert len(dumps_bytes(compact)) < 0.7 * len(dumps_bytes(verbose))
+    assert dumps_bytes(expand_chart_payload(compact)) == dumps_bytes(verbose)
+
+    # float32 columns: exact for the trace read from xic_blob, 7 significant digits otherwise
+    binary = expand_chart_payload(service.get_dual_chart_data(1, max_points=300, wire_format='compact-f32'))
+    for chart in ('chart1', 'chart2'):
+        assert binary[chart]['data']['datasets'][0] == verbose[chart]['data']['datasets'][0]
+        points = [np.array([[p['x'], p['y']] for d in payload[chart]['data']['datasets'] for p in d['data']])
+                  for payload in (verbose, binary)]
+        assert np.allclose(points[0], points[1], rtol=1e-6)
+
+    with pytest.raises(ValueError):
+        service.get_dual_chart_data(1, wire_format='xml')
+
+
+@pytest.fixture
+def seed_data():
+    def seed():
+        times = np.round(np.arange(0, 16, 0.01), 2)
+        db.session.add(LipidClass(class_id=1, class_name='PC'))
+        for lipid_id in (1, 2, 3):
+            lipid = MainLipid(lipid_id=lipid_id, lipid_name=f'PC 3{lipid_id}:1', class_id=1, retention_time=5.0 + lipid_id)
+            if lipid_id != 2:
+                lipid.set_xic_arrays(times, np.exp(-((times - lipid.retention_time) / 0.1) ** 2) * 1e4)
+            db.session.add(lipid)
+            # Many ions: chart building must not query per ion
+            for n in range(12):
+                db.session.add(AnnotatedIon(**make_ion(lipid_id * 100 + n, 'Current lipid' if n == 0 else 'Similar MRM',
+                                                       5.0 + lipid_id + n * 0.1, is_main=n == 0, lipid_id=lipid_id)))
+    return seed
+
+
+def test_single_chart_is_built_from_one_preloaded_context(app, count_statements):
+    with app.app_context():
+        result, statements = count_statements(lambda: DualChartService().get_dual_chart_data(3))
+
+    # Lipid + class, then its ions; nothing per ion or per chart
+    assert 1 <= len(statements) <= 2
+    assert result['annotated_ions_count'] == 12
+    areas = [d for d in result['chart2']['data']['datasets'] if d['label'].endswith('_area')]
+    assert len(areas) == 12 and {area['lipid_info']['lipid_class'] for area in areas} == {'PC'}
+
+
+def test_batch_loads_everything_in_two_statements_and_keeps_order(app, count_statements):
+    with app.app_context():
+        charts, statements = count_statements(
+            lambda: DualChartService().get_dual_chart_data_batch([3, 99, 2, 1], max_points=200))
+
+    assert len(statements) == 2
+    assert [(chart['lipid_id'], chart['status']) for chart in charts] == [
+        (3, 'success'), (99, 'error'), (2, 'error'), (1, 'success')]
+    assert charts[0]['data']['lipid_info']['lipid_name'] == 'PC 33:1'
+    assert charts[0]['data']['annotated_ions_count'] == 12
+    assert 'No XIC data' in charts[2]['message']
@@ -0,0 +1,90 @@
+"""
+Tests for format detection and pluggable ingestion backends
+"""
+
+import io
+
+import pytest
+import pandas as pd
+
+from ingestion_service import IngestionService, detect_format, UnsupportedFormatError
+
+# Instrument-style export: two preamble rows above the real header
+RAW_ROWS = [
+    ['Batch report', None, None, None],
+    ['Sample', 'Area', 'Area', 'Area'],
+    ['Name', 'PH-HC_5701', 'PH-HC_5702', 'NIST_1'],
+    ['PC 16:0', 1200.5, 980.0, 1500.25],
+    ['LPC 18:1 d7', 300.0, 310.5, 295.0],
+]
+
+
+@pytest.fixture
+def service():
+    return IngestionService()
+
+
+def _delimited(sep):
+    return io.BytesIO(pd.DataFrame(RAW_ROWS).to_csv(index=False, header=False, sep=sep).encode('utf-8'))
+
+
+def _xlsx():
+    buffer = io.BytesIO()
+    pd.DataFrame(RAW_ROWS).to_excel(buffer, index=False, header=False)
+    buffer.seek(0)
+    return buffer
+
+
+def test_detect_format_by_extension_and_content():
+    assert detect_format('area.parquet') == 'parquet'
+    assert detect_format(_xlsx()) == 'xlsx'
+    assert detect_format(_delimited('\t')) == 'tsv'
+    assert detect_format(_delimited(',')) == 'csv'
+
+
+def test_backends_agree_on_header_and_table(service):
+    expected_columns = ['Name', 'PH-HC_5701', 'PH-HC_5702', 'NIST_1']
+    tables = {}
+    for label, source, filename in (('xlsx', _xlsx(), 'area.xlsx'),
+                                    ('csv', _delimited(','), 'area.csv'),
+                                    ('tsv', _delimited('\t'), None)):
+        area_data, header_row, _ = service.load_area_table(source, filename=filename)
+        assert header_row == 2, label
+        assert list(area_data.columns) == expected_columns, label
+        tables[label] = area_data
+
+    pd.testing.assert_frame_equal(tables['xlsx'], tables['csv'])
+    pd.testing.assert_frame_equal(tables['csv'], tables['tsv'])
+
+
+def test_ragged_preamble_is_read_tolerantly(service, tmp_path):
+    # Real exports do not pad the preamble to the table width
+    text = ("Batch report\n"
+            "Sample;Area;Area;Area\n"
+            "Name;PH-HC_5701;PH-HC_5702;NIST_1\n"
+            "PC 16:0;1200,5;980,0;1.500,25\n"
+            "LPC 18:1 d7;300,0;310,5;295,0\n")
+    path = tmp_path / 'area.csv'
+    path.write_text(text, encoding='utf-8')
+    for source in (str(path), io.BytesIO(text.encode('utf-8'))):
+        area_data, header_row, _ = service.load_area_table(source, filename='area.csv')
+        assert header_row == 2
+        assert list(area_data.columns) == ['Name', 'PH-HC_5701', 'PH-HC_5702', 'NIST_1']
+        assert area_data['Name'].tolist() == ['PC 16:0', 'LPC 18:1 d7']
+        # Decimal commas (and point thousands) are parsed as numbers, not left as strings
+        assert area_data['PH-HC_5701'].tolist() == [1200.5, 300.0]
+        assert area_data['NIST_1'].tolist() == [1500.25, 295.0]
+
+
+def test_parquet_backend_matches_excel(service, tmp_path):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / 'area.parquet'
+    pd.DataFrame(RAW_ROWS[3:], columns=RAW_ROWS[2]).to_parquet(path)
+    area_data, header_row, _ = service.load_area_table(str(path))
+    assert header_row == 0
+    assert area_data['PH-HC_5702'].tolist() == [980.0, 310.5]
+
+
+def test_unknown_format_rejected(service):
+    with pytest.raises(UnsupportedFormatError):
+        service.get_backend('sas7bdat')
@@ -0,0 +1,56 @@
+"""
+Tests for the app-wide fast JSON provider
+"""
+
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from flask import Flask, jsonify
+
+from json_provider import dumps_bytes, init_json_provider, json_response
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    init_json_provider(app)
+
+    payload = {
+        'area': np.float64('nan'),
+        'count': np.int64(3),
+        'ratios': np.array([0.5, np.inf]),
+        'when': datetime(2024, 5, 1, 12, 30),
+        'rows': pd.DataFrame({'PH-HC_1': [1.0, np.nan]}),
+    }
+    app.add_url_rule('/default', 'default', lambda: jsonify(payload))
+    app.add_url_rule('/zero', 'zero', lambda: json_response(payload, nan_policy='zero'))
+    app.add_url_rule('/echo', 'echo', lambda: jsonify(app.json.loads(b'{"x": [1, 2]}')), methods=['POST'])
+    return app.test_client()
+
+
+def test_numpy_nan_and_datetime_are_native(client):
+    body = json.loads(client.get('/default').data)
+    assert body == {
+        'area': None,
+        'count': 3,
+        'ratios': [0.5, None],
+        'when': '2024-05-01T12:30:00',
+        'rows': [{'PH-HC_1': 1.0}, {'PH-HC_1': None}],
+    }
+
+
+def test_per_response_zero_policy(client):
+    body = json.loads(client.get('/zero').data)
+    assert body['area'] == 0.0
+    assert body['ratios'] == [0.5, 0.0]
+    assert body['rows'][1] == {'PH-HC_1': 0.0}
+    assert json.loads(client.post('/echo').data) == {'x': [1, 2]}
+
+
+def test_error_policy_and_key_order():
+    with pytest.raises(ValueError):
+        dumps_bytes({'value': float('nan')}, nan_policy='error')
+    assert dumps_bytes({'b': 1, 'a': np.float32(2.5)}, sort_keys=True) == b'{"a":2.5,"b":1}'
@@ -0,0 +1,54 @@
+"""
+Tests for keyset-paginated lipid browsing
+"""
+
+import pytest
+
+from models import db, LipidClass, MainLipid, AnnotatedIon, optimized_manager
+
+
+@pytest.fixture
+def seed_data():
+    def seed():
+        db.session.add_all([LipidClass(class_id=1, class_name='PC'), LipidClass(class_id=2, class_name='TG')])
+        # Duplicate names make the lipid_id tie-breaker matter
+        names = ['TG 48:0', 'PC 34:1', 'PC 34:1', 'PC 36:2', 'AC 10:0', 'PC 34:1']
+        for lipid_id, name in enumerate(names, start=1):
+            db.session.add(MainLipid(lipid_id=lipid_id, lipid_name=name, class_id=2 if name.startswith('TG') else 1,
+                                     retention_time=float(lipid_id)))
+        db.session.add_all([AnnotatedIon(ion_id=1, main_lipid_id=2), AnnotatedIon(ion_id=2, main_lipid_id=2),
+                            AnnotatedIon(ion_id=3, main_lipid_id=4)])
+    return seed
+
+
+def walk(**filters):
+    pages, cursor = [], None
+    while True:
+        page = optimized_manager.browse_lipids(after=cursor, limit=2, **filters)
+        pages.append([(item['lipid_name'], item['lipid_id']) for item in page['items']])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_keyset_pages_cover_every_lipid_once(app):
+    with app.app_context():
+        pages = walk()
+    assert pages == [[('AC 10:0', 5), ('PC 34:1', 2)],
+                     [('PC 34:1', 3), ('PC 34:1', 6)],
+                     [('PC 36:2', 4), ('TG 48:0', 1)]]
+
+
+def test_filters_and_single_statement(app, count_statements):
+    with app.app_context():
+        page, statements = count_statements(
+            lambda: optimized_manager.browse_lipids(class_name='PC', rt_min=2, rt_max=4, multi_ion=True))
+
+        assert walk(search='pc 34') == [[('PC 34:1', 2), ('PC 34:1', 3)], [('PC 34:1', 6)]]
+        with pytest.raises(ValueError):
+            optimized_manager.browse_lipids(after='not-a-cursor')
+
+    assert len(statements) == 1
+    assert page['next_cursor'] is None
+    assert [(item['lipid_id'], item['annotated_ions_count'], item['has_multiple_annotations'])
+            for item in page['items']] == [(2, 2, True)]
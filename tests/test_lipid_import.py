@@ -0,0 +1,94 @@
+"""
+Tests for the bulk lipid library importer
+"""
+
+import json
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, select
+
+from lipid_import_service import LipidImportService, load_xic_file
+from models import db, LipidClass, MainLipid, AnnotatedIon
+from xic_storage import xic_arrays
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine, tables=[LipidClass.__table__, MainLipid.__table__, AnnotatedIon.__table__])
+    return engine
+
+
+def rows(engine, table, *columns):
+    with engine.connect() as conn:
+        return conn.execute(select(*(table.c[column] for column in columns)).order_by(*table.c)).all()
+
+
+def test_csv_import_upserts_on_natural_keys(engine, tmp_path):
+    (tmp_path / 'pc.tsv').write_text("time\tintensity\n0.0\t1\n0.5\t10\n1.0\t2\n")
+    (tmp_path / 'lipids.csv').write_text(
+        "Lipid Name,Class,RT,Precursor,Product,CE,Polarity,XIC\n"
+        "PC 34:1,PC,5.2,760.6,184.1,30,pos,pc.tsv\n"
+        "PE 36:2,PE,6.1,744.6,603.5,25,Negative,\n"
+        ",PC,1.0,,,,,\n"
+        "PS 38:4,PS,abc,,,,,\n")
+    (tmp_path / 'ions.csv').write_text(
+        "lipid_name,ion_lipid_name,annotation_type,int_start,int_end,is_main_lipid\n"
+        "PC 34:1,PC 34:1,Current lipid,5.1,5.3,yes\n"
+        "PC 34:1,PC 34:1 +2,+2 isotope,5.1,5.3,no\n"
+        "PG 1:0,PG 1:0,Current lipid,,,\n")
+
+    service = LipidImportService(chunk_size=2)
+    stats = service.import_library(engine, str(tmp_path / 'lipids.csv'), ions_path=str(tmp_path / 'ions.csv'))
+    assert (stats['lipids_inserted'], stats['ions_inserted'], stats['traces'], stats['classes_inserted']) == (2, 2, 1, 2)
+    assert [error['row'] for error in stats['errors']] == [3, 4, 3]
+    assert 'retention_time' in stats['errors'][1]['error'] and 'unknown lipid_name' in stats['errors'][2]['error']
+    assert rows(engine, MainLipid.__table__, 'lipid_name', 'precursor_ion', 'collision_energy', 'polarity') == [
+        ('PC 34:1', '760.6', 30, 'Positive'), ('PE 36:2', '744.6', 25, 'Negative')]
+    with engine.connect() as conn:
+        blob = conn.execute(select(MainLipid.__table__.c.xic_blob).where(MainLipid.__table__.c.lipid_name == 'PC 34:1')).scalar()
+    assert xic_arrays(blob)[1].tolist() == [1.0, 10.0, 2.0]
+
+    # Re-import: same rows are updated in place, the stored trace is kept, unlisted ions pruned
+    (tmp_path / 'lipids.csv').write_text("lipid_name,rt\nPC 34:1,5.3\n")
+    (tmp_path / 'ions.csv').write_text("lipid_name,ion_lipid_name,annotation_type,int_start,int_end\n"
+                                       "PC 34:1,PC 34:1,Current lipid,5.2,5.4\n")
+    stats = service.import_library(engine, str(tmp_path / 'lipids.csv'), ions_path=str(tmp_path / 'ions.csv'),
+                                   prune_ions=True)
+    assert (stats['lipids_inserted'], stats['lipids_updated'], stats['ions_updated'], stats['ions_pruned']) == (0, 1, 1, 1)
+    assert rows(engine, MainLipid.__table__, 'lipid_id', 'retention_time', 'precursor_ion')[0] == (1, 5.3, '760.6')
+    assert rows(engine, AnnotatedIon.__table__, 'ion_id', 'int_start', 'is_main_lipid') == [(1, 5.2, True)]
+    with engine.connect() as conn:
+        assert conn.execute(select(MainLipid.__table__.c.xic_blob).where(MainLipid.__table__.c.lipid_id == 1)).scalar() == blob
+
+
+def test_jsonl_with_embedded_ions_and_dry_run(engine, tmp_path):
+    library = tmp_path / 'library.jsonl'
+    records = [
+        {'lipid_name': 'TG 52:2', 'class_name': 'TG', 'xic': {'times': [1.0, 0.0], 'intensities': [3, 4]},
+         'annotated_ions': [{'ion_lipid_name': 'TG 52:2', 'annotation_type': 'Current lipid', 'int_start': 0.2, 'int_end': 0.1}]},
+        {'lipid_name': 'TG 54:3', 'class_name': 'TG', 'xic': [{'time': 0, 'intensity': 1}]},
+    ]
+    library.write_text('\n'.join(json.dumps(record) for record in records) + '\n{broken\n')
+
+    stats = LipidImportService().import_library(engine, str(library), dry_run=True)
+    assert (stats['rows'], stats['invalid'], stats['lipids_inserted']) == (3, 3, 0)
+    assert [error['row'] for error in stats['errors']] == [1, 2, 3]
+    assert rows(engine, MainLipid.__table__, 'lipid_id') == []
+
+    records[0]['annotated_ions'][0]['int_end'] = 0.9
+    records[1]['xic'] = [{'time': 0, 'intensity': 1}, {'time': 0.5, 'intensity': 2}]
+    library.write_text('\n'.join(json.dumps(record) for record in records))
+    stats = LipidImportService().import_library(engine, str(library))
+    assert (stats['lipids_inserted'], stats['ions_inserted'], stats['classes_inserted'], stats['invalid']) == (2, 1, 1, 0)
+    with engine.connect() as conn:
+        blob = conn.execute(select(MainLipid.__table__.c.xic_blob).where(MainLipid.__table__.c.lipid_id == 1)).scalar()
+    assert xic_arrays(blob)[0].tolist() == [0.0, 1.0]   # Sorted by time
+
+
+def test_xic_file_without_header(tmp_path):
+    path = tmp_path / 'trace.txt'
+    path.write_text("0.1 5\n0.2 7\n")
+    times, intensities = load_xic_file(str(path))
+    assert np.allclose(times, [0.1, 0.2]) and np.allclose(intensities, [5, 7])
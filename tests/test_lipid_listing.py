@@ -0,0 +1,57 @@
+"""
+Tests for the aggregate-only lipid listing and its cache validator
+"""
+
+import pytest
+
+from models import db, LipidClass, MainLipid, AnnotatedIon, optimized_manager
+
+
+@pytest.fixture
+def seed_data():
+    def seed():
+        pc = LipidClass(class_name='PC')
+        db.session.add(pc)
+        db.session.flush()
+        db.session.add_all([
+            MainLipid(lipid_id=1, lipid_name='PC 34:1', class_id=pc.class_id, retention_time=6.2,
+                      xic_data={'times': [0.0, 0.1]}),
+            MainLipid(lipid_id=2, lipid_name='Unclassified', retention_time=1.5),
+            AnnotatedIon(ion_id=1, main_lipid_id=1, ion_lipid_name='PC 34:1'),
+            AnnotatedIon(ion_id=2, main_lipid_id=1, ion_lipid_name='PC 34:1 +2'),
+        ])
+    return seed
+
+
+def test_listing_is_one_query_with_grouped_counts(app, count_statements):
+    with app.app_context():
+        lipids, statements = count_statements(optimized_manager.get_lipid_listing)
+
+    assert len(statements) == 1
+    assert 'xic_data' not in statements[0]
+    assert lipids == [
+        {'lipid_id': 1, 'lipid_name': 'PC 34:1', 'api_code': None, 'retention_time': 6.2,
+         'class_name': 'PC', 'annotated_ions_count': 2},
+        {'lipid_id': 2, 'lipid_name': 'Unclassified', 'api_code': None, 'retention_time': 1.5,
+         'class_name': 'Unknown', 'annotated_ions_count': 0},
+    ]
+
+
+def test_version_changes_when_rows_are_deleted(app):
+    with app.app_context():
+        before = optimized_manager.get_lipid_listing_version()
+        assert before == optimized_manager.get_lipid_listing_version()
+        assert before['last_modified'] is not None
+
+        db.session.delete(db.session.get(AnnotatedIon, 2))
+        db.session.commit()
+        assert optimized_manager.get_lipid_listing_version()['etag'] != before['etag']
+
+
+def test_version_changes_when_a_class_is_renamed(app):
+    with app.app_context():
+        before = optimized_manager.get_lipid_listing_version()
+        db.session.query(LipidClass).update({'class_name': 'Phosphatidylcholine'})
+        db.session.commit()
+        assert optimized_manager.get_lipid_listing_version()['etag'] != before['etag']
+        assert optimized_manager.get_lipid_listing()[0]['class_name'] == 'Phosphatidylcholine'
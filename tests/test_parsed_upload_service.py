@@ -0,0 +1,58 @@
+"""
+Tests for the per-session parsed upload cache
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from parsed_upload_service import ParsedUpload, ParsedUploadCache
+
+
+@pytest.fixture
+def sheets():
+    main = pd.DataFrame({
+        'Compound Method': ['Name', 'PC 16:0', 'LPC 18:1 d7'],
+        'PH-HC_5701': ['Area', 400.0, 200.0],
+        'PH-HC_5702': ['Area', 'n/a', np.nan],
+        'NIST_5701-5800 (1)': ['Area', 900.0, 300.0],
+    })
+    extra = pd.DataFrame({'Notes': ['first']})
+    return {'PH-HC_5701-5800': main, 'Notes': extra}
+
+
+def test_parse_skips_headers_and_cleans_areas(sheets):
+    parsed = ParsedUpload.from_sheets(sheets)
+
+    assert parsed.header_rows == 1
+    assert parsed.compounds == ['PC 16:0', 'LPC 18:1 d7']
+    assert parsed.compound_positions['LPC 18:1 d7'] == 1
+    assert parsed.sample_column_indices == [0, 1]
+    assert parsed.nist_column_indices == [2]
+    assert parsed.area(0, 'PH-HC_5701') == 400.0
+    assert np.isnan(parsed.area(0, 'PH-HC_5702'))
+    assert parsed.text_mask[1, 1]                     # 'n/a' is text, not an empty cell
+    assert parsed.sheet_summaries['Notes'] == {'shape': [1, 1], 'columns': ['Notes'], 'first_row': ['first']}
+
+
+def test_cache_serves_memory_then_disk_and_rebuilds_on_new_version(sheets, tmp_path):
+    upload_path = tmp_path / 'upload.xlsx'
+    with pd.ExcelWriter(upload_path) as writer:
+        for name, frame in sheets.items():
+            frame.to_excel(writer, sheet_name=name, index=False)
+
+    cache = ParsedUploadCache(base_dir=str(tmp_path))
+    first = cache.get('abc', version=1.0, source_path=str(upload_path))
+    assert cache.get('abc', version=1.0) is first
+    assert cache.stats == {'memory_hits': 1, 'disk_hits': 0, 'parses': 1}
+
+    # Another worker only has the .npz copy
+    other = ParsedUploadCache(base_dir=str(tmp_path))
+    from_disk = other.get('abc', version=1.0)
+    assert other.stats['disk_hits'] == 1
+    np.testing.assert_array_equal(from_disk.values, first.values)
+    assert from_disk.sheet_summaries == first.sheet_summaries
+
+    # A re-upload changes the version: the stale copy is not served
+    assert other.get('abc', version=2.0) is None
+    assert other.get('abc', version=2.0, source_path=str(upload_path)).version == 2.0
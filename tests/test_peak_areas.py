@@ -0,0 +1,99 @@
+"""
+Tests for the vectorized peak integration and the incremental peak area job
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from models import db, LipidClass, MainLipid, AnnotatedIon, IonPeakArea
+from peak_area_service import PeakAreaService, integrate_windows
+
+
+def trapezoid(y, x):
+    """Reference trapezoid rule (np.trapz/np.trapezoid differ across NumPy 1.x and 2.x)"""
+    return np.sum(np.diff(x) * (y[1:] + y[:-1]) / 2)
+
+
+def test_integration_matches_trapezoid_and_baselines():
+    times = np.linspace(0, 10, 1001)
+    intensities = 5 + 100 * np.exp(-((times - 5) / 0.2) ** 2)
+    starts = np.array([4.0, 4.005, -3.0, 8.0, 12.0, np.nan])
+    ends = np.array([6.0, 6.005, 1.0, 7.0, 13.0, 6.0])
+
+    result = integrate_windows(times, intensities, starts, ends, baseline='none')
+    inside = (times >= 4.0) & (times <= 6.0)
+    assert result['area'][0] == pytest.approx(trapezoid(intensities[inside], times[inside]))
+    # Window ends between samples are interpolated onto the trace
+    fine = np.linspace(4.005, 6.005, 20001)
+    assert result['area'][1] == pytest.approx(trapezoid(np.interp(fine, times, intensities), fine), rel=1e-6)
+    assert result['area'][2] == pytest.approx(5.0, rel=1e-6)   # Clipped to the trace start
+    assert np.isnan(result['area'][3:]).all() and list(result['points'][3:]) == [0, 0, 0]
+    assert result['apex_time'][0] == pytest.approx(5.0) and result['peak_height'][0] == pytest.approx(105.0)
+    assert result['points'][0] == inside.sum()
+
+    gaussian = 100 * 0.2 * np.sqrt(np.pi)
+    linear = integrate_windows(times, intensities, starts[:1], ends[:1], baseline='linear')
+    minimum = integrate_windows(times, intensities, starts[:1], ends[:1], baseline='min')
+    assert linear['area'][0] == pytest.approx(gaussian, rel=1e-3)
+    assert minimum['area'][0] == pytest.approx(gaussian, rel=1e-3)
+    with pytest.raises(ValueError):
+        integrate_windows(times, intensities, starts, ends, baseline='valley')
+
+
+@pytest.fixture
+def db_tables():
+    return [LipidClass.__table__, MainLipid.__table__, AnnotatedIon.__table__, IonPeakArea.__table__]
+
+
+@pytest.fixture
+def seed_data():
+    def seed():
+        times = np.round(np.arange(0, 16, 0.01), 2)
+        db.session.add(LipidClass(class_id=1, class_name='PC'))
+        for lipid_id in (1, 2):
+            lipid = MainLipid(lipid_id=lipid_id, lipid_name=f'PC 3{lipid_id}:1', class_id=1,
+                              retention_time=5.0 + lipid_id, updated_at=datetime(2026, 1, 1))
+            lipid.set_xic_arrays(times, np.exp(-((times - lipid.retention_time) / 0.1) ** 2) * 1e4)
+            db.session.add(lipid)
+        db.session.flush()
+        db.session.add_all([
+            AnnotatedIon(ion_id=10, main_lipid_id=1, ion_lipid_name='PC 31:1', annotation_type='Current lipid',
+                         retention_time=6.0, int_start=5.7, int_end=6.3, is_main_lipid=True),
+            AnnotatedIon(ion_id=11, main_lipid_id=1, ion_lipid_name='PC 31:1 +2', annotation_type='+2 isotope',
+                         retention_time=6.0),
+            AnnotatedIon(ion_id=20, main_lipid_id=2, ion_lipid_name='PC 32:1', annotation_type='Current lipid',
+                         retention_time=7.0, int_start=6.7, int_end=7.3, is_main_lipid=True),
+        ])
+        db.session.commit()
+        # Ion inserts touch their lipid; start every version from a known timestamp
+        db.session.execute(MainLipid.__table__.update().values(updated_at=datetime(2026, 1, 1)))
+    return seed
+
+
+def test_job_recomputes_only_changed_ions(app):
+    service = PeakAreaService()
+    with app.app_context():
+        stats = service.compute('none')
+        assert (stats['lipids'], stats['computed'], stats['without_area']) == (2, 3, 1)
+        areas, stale = service.get_peak_areas([1, 2, 3], 'none')
+        assert stale == [] and areas[3] == []
+        assert areas[2][0]['area'] == pytest.approx(1e4 * 0.1 * np.sqrt(np.pi), rel=1e-3)
+        assert areas[1][1]['area'] is None and areas[1][1]['ion_lipid_name'] == 'PC 31:1 +2'
+        assert service.compute('none')['computed'] == 0
+
+        # A window edit bumps lipid 2's version: only its ion is recomputed, other baselines untouched
+        db.session.get(AnnotatedIon, 20).int_end = 7.0
+        db.session.commit()
+        assert service.get_peak_areas([2], 'none')[1] == [20]
+        stats = service.compute('none')
+        assert (stats['lipids'], stats['computed']) == (1, 1)
+        assert service.get_peak_areas([2], 'none')[0][2][0]['area'] == pytest.approx(1e4 * 0.1 * np.sqrt(np.pi) / 2, rel=1e-3)
+        assert service.get_stats()['linear'] == {'rows': 0, 'stale_ions': 3}
+
+        db.session.delete(db.session.get(AnnotatedIon, 11))
+        db.session.commit()
+        stats = service.compute('none')
+        assert (stats['computed'], stats['removed']) == (1, 1)   # Sibling ion 10 shares the bumped version
+        assert IonPeakArea.query.count() == 2
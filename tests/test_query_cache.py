@@ -0,0 +1,62 @@
+"""
+Tests for the TTL + write-invalidated lipid query cache
+"""
+
+import pytest
+
+from models import db, LipidClass, MainLipid, optimized_manager, QueryCache
+
+
+@pytest.fixture
+def seed_data():
+    def seed():
+        db.session.add(LipidClass(class_id=1, class_name='PC'))
+        db.session.add(MainLipid(lipid_id=1, lipid_name='PC 34:1', class_id=1, extraction_success=True))
+    return seed
+
+
+def test_ttl_expiry_and_counters(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr('models.time.time', lambda: clock[0])
+    cache = QueryCache(ttl_seconds=10)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return len(loads)
+
+    assert cache.get_or_load('key', loader) == 1
+    assert cache.get_or_load('key', loader) == 1
+    clock[0] += 11
+    assert cache.get_or_load('key', loader) == 2
+
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['expired']) == (1, 2, 1)
+
+
+def test_commits_to_lipid_tables_invalidate(app):
+    with app.app_context():
+        assert optimized_manager.get_database_stats()['total_lipids'] == 1
+        assert optimized_manager.get_lipids_sample(limit=3)[0]['lipid_name'] == 'PC 34:1'
+        assert optimized_manager.get_database_stats()['total_lipids'] == 1
+        assert optimized_manager.cache.get_stats()['hits'] == 1
+
+        # ORM insert → invalidated on commit
+        db.session.add(MainLipid(lipid_id=2, lipid_name='PC 36:2', class_id=1, extraction_success=True))
+        db.session.commit()
+        assert optimized_manager.get_database_stats()['total_lipids'] == 2
+        assert optimized_manager.get_lipid_classes_optimized() == [{'class_name': 'PC', 'count': 2}]
+
+        # Bulk update statement → invalidated on commit
+        MainLipid.query.filter_by(lipid_id=1).update({'lipid_name': 'PC 34:1 renamed'})
+        db.session.commit()
+        names = [lipid['lipid_name'] for lipid in optimized_manager.get_lipids_sample(limit=3)]
+        assert 'PC 34:1 renamed' in names
+
+        # Rolled back changes keep the cache
+        invalidations = optimized_manager.cache.get_stats()['invalidations']
+        db.session.add(LipidClass(class_id=2, class_name='PE'))
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+        assert optimized_manager.cache.get_stats()['invalidations'] == invalidations
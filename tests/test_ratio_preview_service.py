@@ -0,0 +1,65 @@
+"""
+Tests for the vectorized ratio preview table
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from parsed_upload_service import ParsedUpload
+from ratio_preview_service import RatioPreviewService, reference_sample_name
+
+
+@pytest.fixture
+def parsed():
+    main = pd.DataFrame({
+        'Compound Method': ['Name', 'PC 16:0', 'AcylCarnitine 12:0', 'LPC 18:1 d7'],
+        'PH-HC_5701': ['Area', 400.0, 50.0, 200.0],
+        'PH-HC_5800': ['Area', 300.0, np.nan, 100.0],
+        'NIST_5701-5800 (1)': ['Area', 900.0, 30.0, 300.0],
+    })
+    return ParsedUpload.from_sheets({'PH-HC_5701-5800': main})
+
+
+SAMPLE_MAPPING = {'PH-HC_1': 'NIST_1-100 (1)', 'PH-HC_100': 'NIST_1-100 (1)'}
+
+
+def test_reference_sample_name_covers_whole_plate():
+    assert reference_sample_name('PH-HC_5701') == 'PH-HC_1'
+    assert reference_sample_name('PH-HC_5800') == 'PH-HC_100'
+    assert reference_sample_name('NIST') is None
+
+
+def test_every_compound_and_sample_in_one_pass(parsed):
+    result = RatioPreviewService().build_table(parsed, SAMPLE_MAPPING, {})
+    table = result['table']
+
+    # Key compounds first, no cap on rows or samples
+    assert result['compounds'] == ['AcylCarnitine 12:0', 'PC 16:0', 'LPC 18:1 d7']
+    assert result['samples'] == ['PH-HC_5701', 'PH-HC_5800']
+    assert len(table) == 6
+
+    row = table[(table['Compound'] == 'PC 16:0') & (table['Sample'] == 'PH-HC_5800')].iloc[0]
+    assert row['NIST_Column'] == 'NIST_5701-5800 (1)'
+    assert row['Sample_Ratio'] == pytest.approx(3.0)            # 300 / 100
+    assert row['NIST_Ratio'] == pytest.approx(3.0)              # 900 / 300
+    assert row['NIST_Result'] == pytest.approx(1.0)
+
+    missing = table[(table['Compound'] == 'AcylCarnitine 12:0') & (table['Sample'] == 'PH-HC_5800')].iloc[0]
+    assert np.isnan(missing['NIST_Result']) and missing['Sample_Compound_Area'] == 0
+    assert result['summary_stats']['valid_results'] == 5
+
+
+def test_preview_limits_and_formatting(parsed):
+    service = RatioPreviewService()
+    result = service.build_table(parsed, SAMPLE_MAPPING, {}, max_compounds=1, max_samples=1)
+    records = service.preview_records(result['table'])
+
+    assert records == [{
+        'Compound': 'AcylCarnitine 12:0', 'ISTD': 'LPC 18:1 d7', 'Sample': 'PH-HC_5701',
+        'NIST_Column': 'NIST_5701-5800 (1)', 'Sample_Ratio': '0.250000', 'NIST_Ratio': '0.100000',
+        'NIST_Result': '2.5000'
+    }]
+
+    buffer, _ = service.export_to_csv(result['table'])
+    assert pd.read_csv(buffer).shape == (1, 13)
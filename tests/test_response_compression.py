@@ -0,0 +1,54 @@
+"""
+Tests for negotiated response compression
+"""
+
+import gzip
+
+from flask import Flask, Response, jsonify
+
+from response_compression import ResponseCompressor, choose_encoding
+
+
+def make_client():
+    app = Flask(__name__)
+    ResponseCompressor(app)
+
+    @app.route('/big')
+    def big():
+        return jsonify({'rows': [{'Substance': 'PC 16:0', 'PH-HC_1': 1.0}] * 500})
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/stream')
+    def stream():
+        return Response((f'{{"row": {i}}}\n' for i in range(100)), mimetype='application/json')
+
+    return app.test_client()
+
+
+def test_choose_encoding_respects_quality():
+    assert choose_encoding('gzip, deflate') == 'gzip'
+    assert choose_encoding('gzip;q=0') is None
+    assert choose_encoding('identity') is None
+    assert choose_encoding('*') in ('gzip', 'br')
+
+
+def test_large_json_is_gzipped():
+    response = make_client().get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert b'PC 16:0' in gzip.decompress(response.get_data())
+
+
+def test_small_and_unnegotiated_responses_untouched():
+    client = make_client()
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/big').headers
+
+
+def test_streamed_response_is_compressed_incrementally():
+    response = make_client().get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.get_data()).count(b'"row"') == 100
@@ -0,0 +1,59 @@
+"""
+Tests for server-side result browsing over stored session arrays
+"""
+
+import pytest
+import numpy as np
+import pandas as pd
+
+from result_browser_service import ResultBrowserService
+from result_store_service import LocalFileResultStore
+
+
+@pytest.fixture
+def browser(tmp_path):
+    """Browser with one stored session in a temp directory"""
+    service = ResultBrowserService(store=LocalFileResultStore(str(tmp_path), register_sessions=False))
+
+    nist = pd.DataFrame({
+        'Substance': ['PC 16:0', 'PC 18:1', 'LPC 18:1 d7', 'TG 50:1'],
+        'PH-HC_1': [1.5, 0.2, 3.0, np.nan],
+        'PH-HC_2': [0.5, 2.5, 1.0, 4.0],
+    })
+    agilent = nist.copy()
+    service.save_session_arrays('session-1', nist, agilent)
+    return service
+
+
+def test_missing_session_returns_none(browser):
+    assert browser.browse('missing') is None
+
+
+def test_row_and_column_windows(browser):
+    window = browser.browse('session-1', row_offset=1, row_limit=2, col_offset=1, col_limit=5)
+    assert window['total_rows'] == 4
+    assert window['column_order'] == ['Substance', 'PH-HC_2']
+    assert [row['Substance'] for row in window['rows']] == ['PC 18:1', 'LPC 18:1 d7']
+
+
+def test_sort_descending_puts_nan_last(browser):
+    window = browser.browse('session-1', sort_by='PH-HC_1', sort_dir='desc')
+    names = [row['Substance'] for row in window['rows']]
+    assert names == ['LPC 18:1 d7', 'PC 16:0', 'PC 18:1', 'TG 50:1']
+    assert window['rows'][-1]['PH-HC_1'] is None
+
+
+def test_name_filters(browser):
+    assert browser.browse('session-1', name_filter='pc', filter_mode='prefix')['filtered_rows'] == 2
+    assert browser.browse('session-1', name_filter='18:1', filter_mode='substring')['filtered_rows'] == 2
+    assert browser.browse('session-1', name_filter=r'^(TG|LPC)', filter_mode='regex')['filtered_rows'] == 2
+    with pytest.raises(ValueError):
+        browser.browse('session-1', name_filter='(', filter_mode='regex')
+
+
+def test_numeric_thresholds(browser):
+    column = browser.browse('session-1', filter_column='PH-HC_1', min_value=1.0)
+    assert [row['Substance'] for row in column['rows']] == ['PC 16:0', 'LPC 18:1 d7']
+
+    any_column = browser.browse('session-1', min_value=3.5)
+    assert [row['Substance'] for row in any_column['rows']] == ['TG 50:1']
@@ -0,0 +1,58 @@
+"""
+Tests for the trigram name search index
+"""
+
+import pytest
+
+from models import db, MainLipid, optimized_manager, search_lipids
+from search_index import TrigramIndex, build_compound_index, normalize_search_text
+
+
+def test_notation_variants_normalize_alike():
+    variants = ['PE(O-18:0/20:4)', 'PE O-18:0_20:4', 'pe o 18:0 20:4', 'PE(O18:0/20:4)']
+    assert {normalize_search_text(name) for name in variants} == {'pe o 18:0 20:4'}
+
+
+def test_ranking_and_fuzzy_matches():
+    index = build_compound_index(['PC 34:1', 'PC 34:1 d7', 'LPC 18:1', 'PE(P-18:0/22:6)', 'TG(16:0/18:1/18:2)'])
+
+    assert [name for name, _ in index.search('PC 34:1')] == ['PC 34:1', 'PC 34:1 d7']
+    assert index.search('pe p-18:0_22:6')[0] == ('PE(P-18:0/22:6)', 1.0)
+    assert index.search('TG 16:0/18:1')[0][0] == 'TG(16:0/18:1/18:2)'
+    # Prefix type-ahead and a typo still find the name
+    assert index.search('lpc')[0][0] == 'LPC 18:1'
+    assert index.search('LPC 81:1', min_score=0.3)[0][0] == 'LPC 18:1'
+    assert index.search('x') == [] and index.search('zzzz') == []
+    assert len(TrigramIndex([])) == 0
+
+
+@pytest.fixture
+def seed_data():
+    def seed():
+        db.session.add_all([
+            MainLipid(lipid_id=1, lipid_name='PC 34:1', api_code='PC_34_1'),
+            MainLipid(lipid_id=2, lipid_name='Cer(d18:1/16:0)'),
+            MainLipid(lipid_id=4, lipid_name='PC 34:1', extraction_success=False),
+        ])
+        db.session.add_all([MainLipid(lipid_id=lipid_id, lipid_name=f'PE 38:{lipid_id % 10}') for lipid_id in range(10, 35)])
+    return seed
+
+
+def test_lipid_index_is_rebuilt_after_commit(app):
+    with app.app_context():
+        assert optimized_manager.search_lipids_optimized('cer d18:1 16:0')[0]['lipid_id'] == 2
+        assert optimized_manager.search_lipids_optimized('pc_34')[0]['lipid_name'] == 'PC 34:1'
+        assert optimized_manager.search_lipids_optimized('SM 36') == []
+
+        db.session.add(MainLipid(lipid_id=3, lipid_name='SM(d18:1/18:0)'))
+        db.session.commit()
+        assert optimized_manager.search_lipids_optimized('SM 18:1')[0]['lipid_id'] == 3
+
+
+def test_search_keeps_extraction_filter_and_caller_limit(app):
+    with app.app_context():
+        # Failed extractions stay out of search results, as with the old ILIKE search
+        assert [lipid['lipid_id'] for lipid in search_lipids('PC 34:1')] == [1]
+        assert len(optimized_manager.search_lipids_optimized('PE 38')) == 20
+        assert len(optimized_manager.search_lipids_optimized('PE 38', limit=5)) == 5
+        assert len(search_lipids('PE 38')) == 25   # Compatibility wrapper returns every match
@@ -0,0 +1,88 @@
+"""
+Tests for the managed temp-session store
+"""
+
+import os
+import time
+import uuid
+
+import pytest
+
+from temp_session_service import TempSessionStore
+
+
+def _make_session(base_dir, size, age_seconds):
+    """streamlined_<uuid> directory holding `size` bytes, last used `age_seconds` ago"""
+    session_id = str(uuid.uuid4())
+    session_dir = base_dir / f"streamlined_{session_id}"
+    session_dir.mkdir()
+    result_file = session_dir / 'results.xlsx'
+    result_file.write_bytes(b'x' * size)
+    stamp = time.time() - age_seconds
+    os.utime(result_file, (stamp, stamp))
+    os.utime(session_dir, (stamp, stamp))
+    return session_id, str(session_dir)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TempSessionStore(base_dir=str(tmp_path), ttl_seconds=3600, quota_bytes=10_000, min_idle_seconds=0)
+
+
+def test_ttl_expiry_removes_idle_sessions(store, tmp_path):
+    _, old_dir = _make_session(tmp_path, 100, age_seconds=7200)
+    _, fresh_dir = _make_session(tmp_path, 100, age_seconds=10)
+    (tmp_path / 'unrelated.txt').write_text('keep me')
+
+    store.sweep()
+
+    assert not os.path.exists(old_dir)
+    assert os.path.exists(fresh_dir)
+    assert (tmp_path / 'unrelated.txt').exists()
+    assert store.stats['expired'] == 1
+
+
+def test_quota_evicts_least_recently_used(store, tmp_path):
+    evicted = []
+    store.on_evict(lambda session_id, kind: evicted.append(session_id))
+    oldest_id, oldest_dir = _make_session(tmp_path, 4000, age_seconds=300)
+    _, middle_dir = _make_session(tmp_path, 4000, age_seconds=200)
+    _, newest_dir = _make_session(tmp_path, 4000, age_seconds=100)
+
+    store.touch(oldest_dir)  # Recently read - should now survive
+    store.sweep()
+
+    assert os.path.exists(oldest_dir) and os.path.exists(newest_dir)
+    assert not os.path.exists(middle_dir)
+    assert store.stats['evictions'] == 1
+
+
+def test_register_scans_only_when_running_total_exceeds_quota(store, tmp_path, monkeypatch):
+    scans = []
+    scan = store.scan
+    monkeypatch.setattr(store, 'scan', lambda: scans.append(1) or scan())
+    oldest_id, oldest_dir = _make_session(tmp_path, 4000, age_seconds=300)
+    store.register(oldest_id, oldest_dir)
+    store.register(oldest_id, oldest_dir)   # Re-registering does not double count
+    session_id, session_dir = _make_session(tmp_path, 4000, age_seconds=200)
+    store.register(session_id, session_dir)
+    assert scans == []
+
+    # Third session pushes the running total over the quota: one scan, least recently registered evicted
+    session_id, session_dir = _make_session(tmp_path, 4000, age_seconds=100)
+    store.register(session_id, session_dir)
+    assert scans == [1]
+    assert store.stats['evictions'] == 1
+    assert not os.path.exists(oldest_dir) and os.path.exists(session_dir)
+
+
+def test_stats_report_sessions_and_orphans(store, tmp_path):
+    _make_session(tmp_path, 500, age_seconds=0)
+    (tmp_path / 'metabolomics_calc_abc.xlsx').write_bytes(b'y' * 200)
+    (tmp_path / 'tmpab12cd34.xlsx').write_bytes(b'z' * 50)
+
+    stats = store.get_stats()
+
+    assert stats['session_count'] == 3
+    assert stats['total_bytes'] == 750
+    assert stats['by_kind']['orphan_upload'] == {'count': 1, 'bytes': 50}
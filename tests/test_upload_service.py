@@ -0,0 +1,65 @@
+"""
+Tests for spooled upload handling
+"""
+
+import io
+
+import pytest
+from flask import Flask, jsonify, request
+
+from upload_service import (
+    init_uploads, check_content_length, UploadTooLarge,
+    get_upload_buffer, get_upload_size, is_spooled_in_memory, persist_upload
+)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Minimal app with spooled uploads and a 1 KB in-memory threshold"""
+    app = Flask(__name__)
+    app.config['UPLOAD_SPOOL_MAX_MEMORY'] = 1024
+    app.config['MAX_CONTENT_LENGTH'] = 64 * 1024
+    init_uploads(app)
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        try:
+            check_content_length()
+        except UploadTooLarge as e:
+            return jsonify({"error": str(e)}), 413
+        upload_file = request.files['file']
+        persisted = persist_upload(upload_file, str(tmp_path / 'copy.bin'))
+        return jsonify({
+            "in_memory": is_spooled_in_memory(upload_file),
+            "size": get_upload_size(upload_file),
+            "head": get_upload_buffer(upload_file).read(4).decode(),
+            "persisted": open(persisted, 'rb').read() == get_upload_buffer(upload_file).read()
+        })
+
+    return app
+
+
+def _post(client, payload):
+    return client.post('/upload', data={'file': (io.BytesIO(payload), 'area.xlsx')},
+                       content_type='multipart/form-data')
+
+
+def test_small_upload_stays_in_memory(app):
+    response = _post(app.test_client(), b'PK\x03\x04' + b'a' * 100)
+    data = response.get_json()
+    assert data['in_memory'] is True
+    assert data['size'] == 104
+    assert data['persisted'] is True
+
+
+def test_large_upload_rolls_over_to_disk(app):
+    response = _post(app.test_client(), b'head' + b'b' * 4096)
+    data = response.get_json()
+    assert data['in_memory'] is False
+    assert data['head'] == 'head'
+    assert data['persisted'] is True
+
+
+def test_oversized_upload_rejected(app):
+    response = _post(app.test_client(), b'c' * (128 * 1024))
+    assert response.status_code == 413
@@ -0,0 +1,53 @@
+"""
+Tests for compact binary XIC storage
+"""
+
+import numpy as np
+import pytest
+
+from models import db, MainLipid, optimized_manager
+from xic_storage import decode_xic, encode_xic, points_to_arrays, widen
+
+
+def test_round_trip_is_exact_in_float32():
+    times = np.round(np.arange(0, 16, 0.0043), 4)
+    intensities = np.abs(np.random.default_rng(0).normal(1e4, 5e3, times.size))
+
+    for delta in (False, True):
+        for compress in (False, True):
+            blob = encode_xic(times, intensities, delta=delta, compress=compress)
+            decoded_times, decoded_intensities = decode_xic(blob)
+            assert np.array_equal(decoded_times, times.astype(np.float32))
+            assert np.array_equal(decoded_intensities, intensities.astype(np.float32))
+
+    assert len(encode_xic(times, intensities)) < times.size * 8 * 0.5
+    assert widen(np.float32([5.123, 0.0043, 123456.7, 0.0])).tolist() == [5.123, 0.0043, 123456.7, 0.0]
+    with pytest.raises(ValueError):
+        encode_xic([1.0, 2.0], [1.0])
+
+
+def test_legacy_points_drop_invalid_values():
+    times, intensities = points_to_arrays(
+        '[{"time": 1.5, "intensity": 10}, {"time": "x", "intensity": 1}, '
+        '{"time": NaN, "intensity": 3}, {"intensity": 4}, {"time": 2.0, "intensity": "20"}]')
+    assert times.tolist() == [1.5, 2.0]
+    assert intensities.tolist() == [10.0, 20.0]
+    assert points_to_arrays(None)[0].size == 0
+
+
+def test_model_prefers_blob_and_falls_back_to_json(app):
+    with app.app_context():
+        legacy = MainLipid(lipid_id=1, lipid_name='PC 34:1',
+                           xic_data=[{'time': 0.1, 'intensity': 5.0}, {'time': 0.2, 'intensity': 7.5}])
+        binary = MainLipid(lipid_id=2, lipid_name='PC 36:2', xic_data=[{'time': 9.0, 'intensity': 1.0}])
+        binary.set_xic_arrays([0.1, 0.2, 0.3], [1.25, 2.5, 3.75])
+        db.session.add_all([legacy, binary])
+        db.session.commit()
+
+        times, intensities = optimized_manager.get_lipid_chart_data_optimized(1)['xic_arrays']
+        assert (times.tolist(), intensities.tolist()) == ([0.1, 0.2], [5.0, 7.5])
+
+        times, intensities = optimized_manager.get_lipid_chart_data_optimized(2)['xic_arrays']
+        assert (times.tolist(), intensities.tolist()) == ([0.1, 0.2, 0.3], [1.25, 2.5, 3.75])
+        assert db.session.get(MainLipid, 2).xic_data is None
+        assert db.session.get(MainLipid, 2).to_dict(include_xic=True)['xic_data'][0] == {'time': 0.1, 'intensity': 1.25}
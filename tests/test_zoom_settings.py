@@ -0,0 +1,44 @@
+"""
+Tests for the bulk zoom-settings upsert and lipid-scoped reads
+"""
+
+import pytest
+
+from models import db, LipidClass, MainLipid, User, ChartZoomSettings
+
+
+@pytest.fixture
+def db_tables():
+    return [LipidClass.__table__, MainLipid.__table__, User.__table__, ChartZoomSettings.__table__]
+
+
+@pytest.fixture
+def seed_data():
+    def seed():
+        db.session.add_all([MainLipid(lipid_id=lipid_id, lipid_name=f'PC 3{lipid_id}:1') for lipid_id in (1, 2, 3)])
+        db.session.add(ChartZoomSettings(lipid_id=1, chart_type='chart1', zoom_start=1.0, zoom_end=2.0,
+                                         is_admin_default=True, created_by=7))
+    return seed
+
+
+def test_upsert_writes_many_settings_in_one_statement(app, count_statements):
+    with app.app_context():
+        saved, statements = count_statements(lambda: ChartZoomSettings.upsert_zoom_settings([
+            {'lipid_id': 1, 'chart_type': 'chart1', 'zoom_start': 4.0, 'zoom_end': 5.0},
+            {'lipid_id': 2, 'chart_type': 'chart2', 'zoom_start': 0.5, 'zoom_end': 1.0},
+            {'lipid_id': 2, 'chart_type': 'chart2', 'zoom_start': 0.5, 'zoom_end': 1.5},
+            {'lipid_id': 3, 'chart_type': 'chart1', 'zoom_start': 2.0, 'zoom_end': 3.0},
+        ], user_id=9))
+        assert saved == 3
+        assert [statement.split()[0] for statement in statements] == ['INSERT']
+        assert 'ON CONFLICT' in statements[0]
+
+        # Existing rows keep their creator and admin flag, as with save_zoom_setting
+        existing = ChartZoomSettings.query.filter_by(lipid_id=1, chart_type='chart1').one()
+        assert (existing.zoom_start, existing.zoom_end, existing.created_by, existing.is_admin_default) == (4.0, 5.0, 7, True)
+        assert ChartZoomSettings.query.count() == 3
+
+        assert ChartZoomSettings.get_zoom_settings([2, 99]) == {
+            '2_chart2': {'start': 0.5, 'end': 1.5, 'is_admin_default': False}}
+        assert set(ChartZoomSettings.get_all_zoom_settings()) == {'1_chart1', '2_chart2', '3_chart1'}
+        assert ChartZoomSettings.upsert_zoom_settings([]) == 0
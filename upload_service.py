@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+UPLOAD SERVICE
+Spooled upload handling for calculator endpoints.
+Multipart file parts are written into a SpooledTemporaryFile that stays in
+memory below UPLOAD_SPOOL_MAX_MEMORY and rolls over to disk above it. The
+same buffer is rewound and handed straight to pandas, so small uploads never
+touch the filesystem and large ones are written exactly once.
+"""
+
+import os
+import shutil
+import tempfile
+
+from flask import Request, current_app, request
+
+DEFAULT_SPOOL_MAX_MEMORY = 16 * 1024 * 1024     # 16 MB kept in RAM per upload
+DEFAULT_MAX_CONTENT_LENGTH = 64 * 1024 * 1024   # Reject request bodies above 64 MB
+
+
+class UploadTooLarge(Exception):
+    """Raised before reading a request body larger than MAX_CONTENT_LENGTH"""
+
+    def __init__(self, content_length, max_content_length):
+        self.content_length = content_length
+        self.max_content_length = max_content_length
+        super().__init__(
+            f"Upload too large: {content_length / 1024 / 1024:.1f} MB "
+            f"(limit {max_content_length / 1024 / 1024:.0f} MB)"
+        )
+
+
+class SpooledRequest(Request):
+    """Request class whose file parts are spooled in memory up to a threshold"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        max_memory = DEFAULT_SPOOL_MAX_MEMORY
+        try:
+            max_memory = current_app.config.get('UPLOAD_SPOOL_MAX_MEMORY', DEFAULT_SPOOL_MAX_MEMORY)
+        except RuntimeError:
+            pass
+        return tempfile.SpooledTemporaryFile(max_size=max_memory, mode='w+b')
+
+
+def init_uploads(app):
+    """Install the spooled request class and upload limits on the app"""
+    app.config.setdefault('UPLOAD_SPOOL_MAX_MEMORY',
+                          int(os.getenv('UPLOAD_SPOOL_MAX_MEMORY', DEFAULT_SPOOL_MAX_MEMORY)))
+    app.config.setdefault('MAX_CONTENT_LENGTH',
+                          int(os.getenv('MAX_CONTENT_LENGTH', DEFAULT_MAX_CONTENT_LENGTH)))
+    app.request_class = SpooledRequest
+
+
+def check_content_length():
+    """
+    Enforce MAX_CONTENT_LENGTH from the request headers before the body is parsed.
+    Werkzeug would also stop at the limit, but only after buffering up to it.
+    """
+    max_length = current_app.config.get('MAX_CONTENT_LENGTH')
+    content_length = request.content_length
+    if max_length and content_length is not None and content_length > max_length:
+        raise UploadTooLarge(content_length, max_length)
+
+
+def get_upload_buffer(file_storage):
+    """Rewind and return the spooled stream of an uploaded file for direct parsing"""
+    stream = file_storage.stream
+    stream.seek(0)
+    return stream
+
+
+def get_upload_size(file_storage):
+    """Size of an uploaded file in bytes without copying it"""
+    stream = file_storage.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def is_spooled_in_memory(file_storage):
+    """True while the upload has not rolled over to a disk file"""
+    stream = file_storage.stream
+    if isinstance(stream, tempfile.SpooledTemporaryFile):
+        return not stream._rolled
+    return hasattr(stream, 'getbuffer')
+
+
+def persist_upload(file_storage, destination_path):
+    """Stream an upload to a file (for later session use) without materializing its bytes"""
+    stream = get_upload_buffer(file_storage)
+    with open(destination_path, 'wb') as destination:
+        shutil.copyfileobj(stream, destination, length=1024 * 1024)
+    stream.seek(0)
+    return destination_path
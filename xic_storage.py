@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+XIC STORAGE
+Compact binary form of an XIC trace for MainLipid.xic_blob, replacing the JSON
+list of {'time': ..., 'intensity': ...} objects in MainLipid.xic_data.
+
+Blob layout (little-endian):
+  header   b'XIC1' | flags (uint8) | point count (uint32)
+  payload  times then intensities as float32 bit patterns (uint32)
+           FLAG_DELTA - each row stored as wrapping differences of the bit
+                        patterns (exactly reversible; near-constant for sampled times)
+           FLAG_ZLIB  - bytes shuffled by significance, then zlib-compressed
+Decoding is a decompress plus one cumsum; no per-point Python work.
+"""
+
+import json
+import math
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b'XIC1'
+FLAG_DELTA = 0x01
+FLAG_ZLIB = 0x02
+_HEADER = struct.Struct('<4sBI')
+
+
+def points_to_arrays(xic_data):
+    """
+    Legacy JSON point list (list of dicts or JSON text) → (times, intensities) float64 arrays.
+    Points without numeric time/intensity or with NaN are dropped, as the chart service always did.
+    """
+    if isinstance(xic_data, (str, bytes)):
+        try:
+            xic_data = json.loads(xic_data)
+        except ValueError:
+            xic_data = None
+    times, intensities = [], []
+    if isinstance(xic_data, list):
+        for point in xic_data:
+            if isinstance(point, dict) and 'time' in point and 'intensity' in point:
+                try:
+                    time_val = float(point['time'])
+                    intensity_val = float(point['intensity'])
+                except (ValueError, TypeError):
+                    continue
+                if not (math.isnan(time_val) or math.isnan(intensity_val)):
+                    times.append(time_val)
+                    intensities.append(intensity_val)
+    return np.array(times, dtype=np.float64), np.array(intensities, dtype=np.float64)
+
+
+def encode_xic(times, intensities, delta=True, compress=True):
+    """(times, intensities) → blob; values are stored as float32"""
+    times = np.asarray(times, dtype='<f4').ravel()
+    intensities = np.asarray(intensities, dtype='<f4').ravel()
+    if times.shape != intensities.shape:
+        raise ValueError(f"XIC arrays differ in length: {times.size} times, {intensities.size} intensities")
+
+    bits = np.stack([times, intensities]).view('<u4')
+    flags = 0
+    if delta:
+        bits = np.diff(bits, axis=1, prepend=np.zeros((2, 1), dtype='<u4'))
+        flags |= FLAG_DELTA
+    if compress:
+        # Byte-shuffle: all high bytes together, then the next... (what makes deltas compress)
+        payload = zlib.compress(np.ascontiguousarray(bits.view(np.uint8).reshape(2, -1, 4).transpose(0, 2, 1)).tobytes(), 6)
+        flags |= FLAG_ZLIB
+    else:
+        payload = np.ascontiguousarray(bits).tobytes()
+    return _HEADER.pack(MAGIC, flags, times.size) + payload
+
+
+def decode_xic(blob):
+    """blob → (times, intensities) float32 arrays"""
+    blob = bytes(blob)
+    magic, flags, count = _HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("Not an XIC blob")
+    payload = blob[_HEADER.size:]
+
+    if flags & FLAG_ZLIB:
+        shuffled = np.frombuffer(zlib.decompress(payload), dtype=np.uint8).reshape(2, 4, count)
+        bits = np.ascontiguousarray(shuffled.transpose(0, 2, 1)).view('<u4').reshape(2, count)
+    else:
+        bits = np.frombuffer(payload, dtype='<u4').reshape(2, count)
+    if flags & FLAG_DELTA:
+        bits = np.cumsum(bits, axis=1, dtype='<u4')
+
+    values = bits.view('<f4')
+    return values[0], values[1]
+
+
+def widen(values):
+    """
+    float32 → float64 rounded to 7 significant digits, so stored 5.123 reads back
+    as 5.123 (not 5.123000144958496) in responses and comparisons.
+    """
+    wide = np.asarray(values, dtype=np.float64)
+    nonzero = (wide != 0) & np.isfinite(wide)
+    magnitude = np.zeros_like(wide)
+    np.floor(np.log10(np.abs(wide), where=nonzero, out=np.zeros_like(wide)), where=nonzero, out=magnitude)
+    exponent = 6 - magnitude
+    # Scale by an exact power of ten on the side that keeps it an integer
+    up = np.power(10.0, np.maximum(exponent, 0))
+    down = np.power(10.0, np.maximum(-exponent, 0))
+    rounded = np.round(wide * up / down) * down / up
+    return np.where(nonzero, rounded, wide)
+
+
+def xic_arrays(xic_blob, xic_data=None):
+    """(times, intensities) float64 arrays from the binary column, else from the legacy JSON list"""
+    if xic_blob:
+        times, intensities = decode_xic(xic_blob)
+        return widen(times), widen(intensities)
+    return points_to_arrays(xic_data)